@@ -2,6 +2,7 @@ import traceback
 
 import streamlit as st
 
+from .metrics import start_metrics_server
 from .rag_pipeline import RAGPipeline
 
 
@@ -10,7 +11,9 @@ def get_pipeline() -> RAGPipeline:
     """
     Создаём RAG-пайплайн один раз и переиспользуем
     между запросами (экономит время и токены).
+    Здесь же (один раз) поднимается /metrics, если задан METRICS_PORT.
     """
+    start_metrics_server()
     return RAGPipeline(top_k=4)
 
 
@@ -52,17 +55,41 @@ def main():
             return
 
         try:
-            with st.spinner("Thinking..."):
+            with st.spinner("Searching the knowledge base..."):
                 pipeline = get_pipeline()
                 # при необходимости обновим top_k на лету
                 pipeline.top_k = top_k
 
-                result = pipeline.answer_question(question)
-                answer = result["answer"]
+                # документы находятся сразу, ответ дальше идёт потоком
+                result = pipeline.answer_question_stream(question, temperature=temperature)
                 docs = result["documents"]
 
             st.subheader("Answer")
-            st.markdown(answer)
+            st.write_stream(result["answer_stream"])
+
+            if result.get("cache_hit"):
+                st.caption(f"Answered from cache (similar question: \"{result['cached_question']}\")")
+            elif result.get("extractive"):
+                st.caption(f"Answer taken verbatim from FAQ {result['faq_source_id']} (no LLM call)")
+
+            timings = result.get("timings")
+            if timings:
+                st.caption(
+                    f"Time to first token: {timings['ttft_s']:.2f}s · "
+                    f"total: {timings['total_s']:.2f}s · "
+                    f"context: {result.get('context_tokens', 0)} tokens "
+                    f"in {len(result.get('context', docs))} fragments"
+                )
+                with st.expander("Timings"):
+                    st.table(
+                        [
+                            {"stage": name[:-2], "ms": round(value * 1000, 1)}
+                            for name, value in timings.items()
+                            if name.endswith("_s")
+                        ]
+                    )
+                    if timings.get("tokens"):
+                        st.json(timings["tokens"])
 
             st.subheader("Retrieved context")
             if not docs:
@@ -0,0 +1,101 @@
+"""
+Бенчмарк асинхронного API RAGPipeline на локальных заглушках.
+
+Запуск:
+    python -m src.bench_async --llm-latency 0.2 --concurrency 1 10 100
+
+Показывает пропускную способность (запросов/с) и задержки p50/p95
+при разном числе одновременных запросов в одном event loop.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from .clients import aclose_async_clients
+from .ingest import load_chunks
+from .rag_pipeline import RAGPipeline
+from .stubs import StubEmbeddingsClient, StubLLMClient, StubVectorDBClient
+
+
+def build_stub_pipeline(
+    embed_latency: float,
+    search_latency: float,
+    llm_latency: float,
+    vector_size: int = 256,
+) -> RAGPipeline:
+    emb_client = StubEmbeddingsClient(vector_size=vector_size, latency_s=embed_latency)
+    vec_client = StubVectorDBClient(vector_size=vector_size, latency_s=search_latency)
+
+    chunks = load_chunks()
+    vec_client.upsert_points(
+        ids=[c["id"] for c in chunks],
+        vectors=StubEmbeddingsClient(vector_size=vector_size).embed_batch([c["text"] for c in chunks]),
+        payloads=[c["metadata"] | {"text": c["text"], "chunk_id": c["id"]} for c in chunks],
+    )
+    pipeline = RAGPipeline(top_k=4, emb_client=emb_client, vec_client=vec_client, llm_client=StubLLMClient(llm_latency))
+    # бенчмарк повторяет несколько вопросов: с кэшем мерились бы попадания в него, а не конвейер
+    pipeline.semantic_cache = None
+    return pipeline
+
+
+async def run_level(pipeline: RAGPipeline, questions: List[str], concurrency: int, total: int) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await pipeline.aanswer_question(questions[i % len(questions)])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(total)))
+    finally:
+        # каждый уровень — свой asyncio.run: соединения закрываем до закрытия loop'а
+        await aclose_async_clients()
+    elapsed = time.perf_counter() - started
+
+    lat = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "elapsed_s": elapsed,
+        "throughput_rps": total / elapsed,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк aanswer_question на заглушках")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--requests-per-worker", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--search-latency", type=float, default=0.005)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    pipeline = build_stub_pipeline(args.embed_latency, args.search_latency, args.llm_latency)
+    questions = [
+        "How can I connect to corporate Wi-Fi on Windows?",
+        "My VPN connects but internal websites do not open.",
+        "How do I reset my password?",
+        "Outlook cannot connect from home",
+    ]
+
+    print(f"{'concurrency':>11} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for concurrency in args.concurrency:
+        total = max(concurrency * args.requests_per_worker, 10)
+        row = asyncio.run(run_level(pipeline, questions, concurrency, total))
+        print(
+            f"{row['concurrency']:>11} {row['requests']:>8} {row['throughput_rps']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Бенчмарк RAGPipeline.answer_batch против цикла answer_question на заглушках.
+
+Запуск:
+    python -m src.bench_batch --questions 1000 --llm-latency 0.05
+
+Вопросы уникальны (к шаблонам добавляется номер), семантический кэш выключен,
+чтобы сравнивать именно эмбеддинги, поиск и генерацию.
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from .bench_async import build_stub_pipeline
+from .config import ROOT_DIR
+
+
+def make_questions(n: int) -> List[str]:
+    templates = [
+        item["question"]
+        for name in ("queries.json", "queries_typos.json")
+        for item in json.load((ROOT_DIR / "data" / "eval" / name).open("r", encoding="utf-8"))
+    ]
+    return [f"{templates[i % len(templates)]} (ticket {i})" for i in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="answer_batch vs цикл answer_question")
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--loop-questions", type=int, default=100,
+                        help="сколько вопросов прогнать циклом (время экстраполируется)")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--search-latency", type=float, default=0.005)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    pipeline = build_stub_pipeline(args.embed_latency, args.search_latency, args.llm_latency)
+    pipeline.semantic_cache = None
+    questions = make_questions(args.questions)
+
+    loop_n = min(args.loop_questions, len(questions))
+    started = time.perf_counter()
+    for question in questions[:loop_n]:
+        pipeline.answer_question(question)
+    loop_qps = loop_n / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = pipeline.answer_batch(questions, concurrency=args.concurrency)
+    batch_s = time.perf_counter() - started
+    batch_qps = len(questions) / batch_s
+
+    print(f"loop  answer_question: {loop_qps:8.1f} q/s  ({loop_n} questions)")
+    print(f"batch answer_batch:    {batch_qps:8.1f} q/s  ({len(questions)} questions, {batch_s:.2f}s)")
+    print(f"speedup: {batch_qps / loop_qps:.1f}x")
+    stages = {k: round(v, 3) for k, v in results[0]["timings"].items() if k.endswith("_s")}
+    print(f"batch stages: {stages}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Набор микробенчмарков пути данных на заглушках (без OpenAI и Qdrant).
+
+Запуск:
+    python -m src.bench_suite --scales 1 10 100 --save local
+    python -m src.bench_suite --compare data/benchmarks/baseline.json
+
+Для каждого масштаба корпус data/raw размножается в scale раз
+(копии документов с уникальными ID) во временном каталоге, затем меряются:
+- normalize_question — мкс на вопрос (от корпуса не зависит, меряется один раз);
+- simple_chunk_text  — все документы корпуса;
+- build_chunks       — полная сборка и повторный запуск без изменений;
+- ingest             — конвейер run_pipeline: stub-эмбеддинги -> индекс в памяти;
+- retrieve           — RAGPipeline.retrieve на вопросах из data/eval;
+- retrieve_mmr       — то же с MMR-диверсификацией (MMR_CANDIDATES кандидатов с векторами);
+- answer_question    — полный цикл (stub LLM, семантический кэш выключен).
+
+Результаты сохраняются в data/benchmarks/<name>.json; --compare печатает
+отношение текущих времён к сохранённому baseline.
+"""
+import argparse
+import json
+import platform
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import yaml
+
+from .bm25_index import BM25Index
+from .config import ROOT_DIR, settings
+from .dataset_prep import (
+    RAW_DIR,
+    build_chunks,
+    discover_sources,
+    load_faq_file,
+    load_markdown_file,
+    simple_chunk_text,
+    ticket_to_document,
+)
+from .ingest import content_hash, iter_chunks, point_id_for_chunk, run_pipeline, token_batches
+from .rag_pipeline import RAGPipeline
+from .stubs import StubEmbeddingsClient, StubLLMClient, StubVectorDBClient
+from .text_utils import normalize_question
+
+
+BENCHMARKS_DIR = ROOT_DIR / "data" / "benchmarks"
+VECTOR_SIZE = 256
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    times: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return {"median_ms": float(np.median(times) * 1000), "min_ms": float(np.min(times) * 1000)}
+
+
+def _per_item(fn: Callable[[str], Any], items: List[str], repeat: int) -> Dict[str, float]:
+    times: List[float] = []
+    for _ in range(repeat):
+        for item in items:
+            started = time.perf_counter()
+            fn(item)
+            times.append(time.perf_counter() - started)
+    ms = np.array(times) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95))}
+
+
+def make_corpus(raw_dir: Path, scale: int) -> int:
+    """
+    Копирует data/raw в raw_dir, размножая каждый документ scale раз.
+    Возвращает число документов.
+    """
+    docs = 0
+    for path, source_type in discover_sources(RAW_DIR):
+        rel = path.relative_to(RAW_DIR)
+        target = raw_dir / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        if source_type == "faq":
+            items = yaml.safe_load(path.read_text(encoding="utf-8")) or []
+            copies = [item | {"id": f"{item['id']}_{i}"} for i in range(scale) for item in items]
+            target.write_text(yaml.safe_dump(copies, allow_unicode=True), encoding="utf-8")
+            docs += len(copies)
+        elif source_type == "ticket":
+            items = json.loads(path.read_text(encoding="utf-8"))
+            copies = [item | {"ticket_id": f"{item['ticket_id']}-{i}"} for i in range(scale) for item in items]
+            target.write_text(json.dumps(copies, ensure_ascii=False), encoding="utf-8")
+            docs += len(copies)
+        else:
+            for i in range(scale):
+                shutil.copyfile(path, target.with_name(f"{path.stem}_{i}{path.suffix}"))
+            docs += scale
+    return docs
+
+
+def _eval_questions() -> List[str]:
+    return [
+        item["question"]
+        for name in ("queries.json", "queries_typos.json")
+        for item in json.loads((ROOT_DIR / "data" / "eval" / name).read_text(encoding="utf-8"))
+    ]
+
+
+def run_scale(scale: int, repeat: int, questions: List[str]) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        raw_dir, processed_dir = Path(tmp) / "raw", Path(tmp) / "processed"
+        processed_dir.mkdir()
+        results["documents"] = make_corpus(raw_dir, scale)
+
+        texts = _load_texts(raw_dir)
+        results["simple_chunk_text"] = _timed(lambda: [simple_chunk_text(t) for t in texts], repeat)
+
+        results["build_chunks"] = _timed(
+            lambda: build_chunks(workers=1, force=True, raw_dir=raw_dir, processed_dir=processed_dir), repeat
+        )
+        results["build_chunks_noop"] = _timed(
+            lambda: build_chunks(workers=1, raw_dir=raw_dir, processed_dir=processed_dir), repeat
+        )
+
+        chunks = [chunk for _, chunk in iter_chunks(processed_dir / "chunks.jsonl")]
+        results["chunks"] = len(chunks)
+        items = []
+        for chunk in chunks:
+            chunk_hash = content_hash(chunk)
+            items.append({
+                "chunk": chunk,
+                "content_hash": chunk_hash,
+                "point_id": point_id_for_chunk(chunk, chunk_hash),
+                "run_id": "bench",
+            })
+
+        emb_client = StubEmbeddingsClient(vector_size=VECTOR_SIZE)
+        vec_client = StubVectorDBClient(vector_size=VECTOR_SIZE)
+
+        def ingest_once() -> None:
+            batches = token_batches(items, settings.ingest_batch_tokens, settings.ingest_batch_max_items)
+            run_pipeline(batches, emb_client, vec_client, settings.ingest_concurrency)
+
+        results["ingest"] = _timed(ingest_once, repeat)
+
+        # BM25 — по корпусу этого масштаба, а не из data/processed репозитория
+        bm25 = None
+        if settings.retrieval_mode != "dense":
+            bm25 = BM25Index.load(processed_dir / "bm25_index.npz", processed_dir / "bm25_meta.json")
+        pipeline = RAGPipeline(
+            top_k=4, emb_client=emb_client, vec_client=vec_client, llm_client=StubLLMClient(), bm25=bm25
+        )
+        pipeline.semantic_cache = None
+
+        results["retrieve"] = _per_item(pipeline.retrieve, questions, repeat)
+        pipeline.mmr_enabled = True
+        results["retrieve_mmr"] = _per_item(pipeline.retrieve, questions, repeat)
+        pipeline.mmr_enabled = settings.mmr_enabled
+        results["answer_question"] = _per_item(pipeline.answer_question, questions, repeat)
+    return results
+
+
+def _load_texts(raw_dir: Path) -> List[str]:
+    docs = []
+    for path, source_type in discover_sources(raw_dir):
+        if source_type == "faq":
+            docs.extend(load_faq_file(path))
+        elif source_type == "ticket":
+            docs.extend(ticket_to_document(item) for item in json.loads(path.read_text(encoding="utf-8")))
+        else:
+            docs.append(load_markdown_file(path, source_type))
+    return [doc.text for doc in docs]
+
+
+def run_suite(scales: List[int], repeat: int) -> Dict[str, Any]:
+    questions = _eval_questions()
+    report: Dict[str, Any] = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "retrieval_mode": settings.retrieval_mode,
+        "normalize_question": _per_item(normalize_question, questions, repeat * 20),
+        "scales": {},
+    }
+    for scale in scales:
+        print(f"\n--- scale x{scale} ---")
+        report["scales"][str(scale)] = run_scale(scale, repeat, questions)
+    return report
+
+
+def _rows(report: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Плоский вид {"<scale>/<бенчмарк>": основное время в мс} для таблиц и сравнения.
+    """
+    rows = {"normalize_question": report["normalize_question"]["p50_ms"]}
+    for scale, results in report["scales"].items():
+        for name, value in results.items():
+            if isinstance(value, dict):
+                rows[f"x{scale}/{name}"] = value.get("median_ms", value.get("p50_ms"))
+    return rows
+
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] | None = None) -> None:
+    current = _rows(report)
+    previous = _rows(baseline) if baseline else {}
+    print(f"\n{'benchmark':<32} {'ms':>10}" + (f" {'baseline':>10} {'ratio':>7}" if baseline else ""))
+    for name, value in current.items():
+        line = f"{name:<32} {value:>10.3f}"
+        if name in previous and previous[name]:
+            line += f" {previous[name]:>10.3f} {value / previous[name]:>6.2f}x"
+        print(line)
+    for scale, results in report["scales"].items():
+        print(f"x{scale}: {results['documents']} documents, {results['chunks']} chunks")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарки на заглушках")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", default=None, help="сохранить как data/benchmarks/<name>.json")
+    parser.add_argument("--compare", default=None, help="путь к сохранённому baseline")
+    args = parser.parse_args()
+
+    report = run_suite(args.scales, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save:
+        BENCHMARKS_DIR.mkdir(parents=True, exist_ok=True)
+        path = BENCHMARKS_DIR / f"{args.save}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import json
+import math
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = ROOT_DIR / "data" / "processed"
+BM25_INDEX_PATH = PROCESSED_DIR / "bm25_index.npz"
+BM25_META_PATH = PROCESSED_DIR / "bm25_meta.json"
+
+# Токены вида "inc-00123", "corp-wifi", "vpn.company.com" сохраняем целиком
+# и дополнительно индексируем их части ("corp", "wifi"). Буквы — любые Unicode
+# (кириллица в тикетах), без "_" внутри слова: он разделитель, как "-" и ".".
+# TOKENIZER_VERSION увеличивать при любом изменении tokenize: сохранённый индекс
+# построен прежними токенами и должен быть пересобран (см. dataset_prep.CHUNKER_CONFIG).
+TOKENIZER_VERSION = 2
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[-_.][^\W_]+)*")
+_PART_RE = re.compile(r"[-_.]")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in is it my no not "
+    "of on or so that the this to was what when where which with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if _PART_RE.search(token):
+            tokens.extend(p for p in _PART_RE.split(token) if p and p not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    Инвертированный индекс BM25 над текстами чанков.
+
+    Постинги хранятся компактно (CSR):
+    - offsets[t]:offsets[t+1] — диапазон постингов термина t;
+    - doc_ids — номера документов (int32);
+    - weights — готовый вклад BM25 (idf * нормированный tf, float32).
+
+    Поиск — сложение срезов weights по терминам запроса + argpartition,
+    без циклов по документам.
+    """
+
+    def __init__(
+        self,
+        terms: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        docs: List[Dict[str, Any]],
+    ) -> None:
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.docs = docs
+
+    @classmethod
+    def build(cls, docs: Sequence[Dict[str, Any]], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """
+        docs: payload чанков (обязательно поле "text"), порядок = номер документа.
+        """
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_len = np.zeros(len(docs), dtype=np.float32)
+        for doc_no, doc in enumerate(docs):
+            tokens = tokenize(doc["text"])
+            doc_len[doc_no] = len(tokens)
+            for token in tokens:
+                tf = postings.setdefault(token, {})
+                tf[doc_no] = tf.get(doc_no, 0) + 1
+
+        n_docs = len(docs)
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+
+        terms: Dict[str, int] = {}
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        doc_id_parts: List[np.ndarray] = []
+        weight_parts: List[np.ndarray] = []
+        for term_no, term in enumerate(sorted(postings)):
+            terms[term] = term_no
+            tf_by_doc = postings[term]
+            ids = np.fromiter(sorted(tf_by_doc), dtype=np.int32, count=len(tf_by_doc))
+            tf = np.array([tf_by_doc[i] for i in ids], dtype=np.float32)
+
+            df = len(ids)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1.0 - b + b * doc_len[ids] / (avgdl or 1.0))
+            weight_parts.append((idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32))
+            doc_id_parts.append(ids)
+            offsets[term_no + 1] = offsets[term_no] + df
+
+        doc_ids = np.concatenate(doc_id_parts) if doc_id_parts else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate(weight_parts) if weight_parts else np.zeros(0, dtype=np.float32)
+        return cls(terms, offsets, doc_ids, weights, list(docs))
+
+    def save(self, index_path: Path = BM25_INDEX_PATH, meta_path: Path = BM25_META_PATH) -> None:
+        np.savez(index_path, offsets=self.offsets, doc_ids=self.doc_ids, weights=self.weights)
+        with meta_path.open("w", encoding="utf-8") as f:
+            terms = sorted(self.terms, key=self.terms.get)
+            json.dump({"terms": terms, "docs": self.docs}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_path: Path = BM25_INDEX_PATH, meta_path: Path = BM25_META_PATH) -> "BM25Index":
+        arrays = np.load(index_path)
+        with meta_path.open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        terms = {term: i for i, term in enumerate(meta["terms"])}
+        return cls(terms, arrays["offsets"], arrays["doc_ids"], arrays["weights"], meta["docs"])
+
+    @classmethod
+    def load_if_exists(cls) -> "BM25Index | None":
+        if not (BM25_INDEX_PATH.exists() and BM25_META_PATH.exists()):
+            return None
+        return cls.load()
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[int, float]]:
+        """
+        Возвращает [(номер документа, score)] по убыванию score.
+        """
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        matched = False
+        for token in set(tokenize(query)):
+            term_no = self.terms.get(token)
+            if term_no is None:
+                continue
+            start, end = self.offsets[term_no], self.offsets[term_no + 1]
+            # в пределах одного термина doc_ids уникальны, поэтому += безопасен
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+            matched = True
+
+        if not matched or limit <= 0:
+            return []
+
+        candidates = np.flatnonzero(scores)
+        k = min(limit, candidates.size)
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
@@ -0,0 +1,132 @@
+"""
+Маршрутизация запроса по категории базы знаний по его эмбеддингу.
+
+- при ingest для каждой категории (payload "category") считается центроид —
+  нормализованное среднее нормализованных векторов чанков; центроиды
+  хранит бэкенд отдельно от метаданных коллекции (Qdrant — коллекция
+  "<collection>_centroids", локальный индекс — centroids.json), чтобы они
+  не приходили с каждым get_collection;
+- запрос классифицируется по уже посчитанному вектору запроса: косинус
+  с центроидами — одно умножение (C x dim) на вектор, без вызовов API;
+- категория выбирается, только если лучший косинус >= min_score и отрыв
+  от второй категории >= min_margin; иначе — None (поиск без фильтра).
+
+Запуск:
+    python -m src.category_router build   # пересчитать центроиды существующей коллекции
+    python -m src.category_router show    # центроиды и попарные косинусы
+"""
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+
+from .config import settings
+from .vector_backend import VectorBackend
+from .vector_db_client import create_vector_client
+
+
+@dataclass
+class Route:
+    category: str | None  # None — уверенности не хватило, поиск без фильтра
+    best: str
+    score: float
+    margin: float
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def compute_centroids(backend: VectorBackend, batch_size: int = 1024) -> Dict[str, List[float]]:
+    """
+    Центроиды категорий по всем векторам коллекции (потоково, суммы по категориям).
+    """
+    sums: Dict[str, np.ndarray] = {}
+    for vectors, payloads in backend.scroll_vectors(batch_size=batch_size, payload_keys=["category"]):
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        categories = np.array([p.get("category") or "" for p in payloads], dtype=object)
+        for category in set(categories.tolist()) - {""}:
+            block = matrix[categories == category].sum(axis=0)
+            sums[category] = sums[category] + block if category in sums else block
+    return {category: _normalize(total).tolist() for category, total in sorted(sums.items())}
+
+
+class CategoryRouter:
+    def __init__(
+        self,
+        centroids: Dict[str, List[float]],
+        min_score: float | None = None,
+        min_margin: float | None = None,
+    ) -> None:
+        self.categories = list(centroids)
+        self.centroids = _normalize(np.asarray(list(centroids.values()), dtype=np.float32))
+        self.min_score = settings.category_router_min_score if min_score is None else min_score
+        self.min_margin = settings.category_router_min_margin if min_margin is None else min_margin
+
+    @classmethod
+    def from_backend(cls, backend: VectorBackend) -> "CategoryRouter | None":
+        """
+        Роутер по сохранённым центроидам; None — их нет
+        (коллекция создана до роутера или в ней меньше двух категорий).
+        """
+        centroids = backend.get_centroids()
+        if not centroids or len(centroids) < 2:
+            return None
+        if len(next(iter(centroids.values()))) != backend.vector_size:
+            print("[CategoryRouter] Centroid dim does not match the collection, routing disabled.")
+            return None
+        return cls(centroids)
+
+    def route_batch(self, query_vectors: List[List[float]]) -> List[Route]:
+        if not query_vectors:
+            return []
+        queries = _normalize(np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1))
+        scores = queries @ self.centroids.T
+        top2 = np.argsort(-scores, axis=1)[:, :2]
+        routes: List[Route] = []
+        for row, (first, second) in zip(scores, top2):
+            score, margin = float(row[first]), float(row[first] - row[second])
+            confident = score >= self.min_score and margin >= self.min_margin
+            best = self.categories[first]
+            routes.append(Route(best if confident else None, best, score, margin))
+        return routes
+
+    def route(self, query_vector: List[float]) -> Route:
+        return self.route_batch([query_vector])[0]
+
+
+def build_centroids(backend: VectorBackend) -> Dict[str, List[float]]:
+    """
+    Пересчитывает центроиды коллекции и сохраняет их в бэкенде (вызывается из ingest).
+    """
+    centroids = compute_centroids(backend)
+    backend.set_centroids(centroids)
+    print(f"[CategoryRouter] Saved centroids for {len(centroids)} categories: {', '.join(centroids)}")
+    return centroids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Центроиды категорий для маршрутизации запросов")
+    parser.add_argument("command", choices=["build", "show"])
+    args = parser.parse_args()
+
+    backend = create_vector_client()
+    if args.command == "build":
+        build_centroids(backend)
+        backend.flush()
+        return
+
+    router = CategoryRouter.from_backend(backend)
+    if router is None:
+        print("No category centroids stored, run: python -m src.category_router build")
+        return
+    similarity = router.centroids @ router.centroids.T
+    print(f"{'':<12}" + "".join(f"{c[:8]:>9}" for c in router.categories))
+    for category, row in zip(router.categories, similarity):
+        print(f"{category:<12}" + "".join(f"{v:>9.3f}" for v in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Чанкер с учётом структуры документа и размера в токенах.
+
+Стратегии (выбираются по source_type, см. STRATEGY_BY_SOURCE):
+- "markdown" — секции по заголовкам (#, ##, ...), внутри секции — абзацы
+  и пункты списков вместе с вложенными строками (шаг runbook не режется);
+- "faq"      — пара вопрос/ответ; если ответ не влезает, каждый чанк
+  начинается с "Question: ...";
+- "ticket"   — секции Description / Resolution; заголовок тикета
+  повторяется в каждом чанке;
+- "simple"   — прежний simple_chunk_text (окно символов с перекрытием).
+
+Чанки не перекрываются. Разбор идёт один раз по строкам (префиксные суммы
+длин строк), без регулярных выражений с откатами — время линейно по размеру текста.
+"""
+import argparse
+from typing import Callable, Dict, List, Tuple
+
+from .config import settings
+from .text_utils import estimate_tokens
+
+
+STRATEGY_BY_SOURCE: Dict[str, str] = {
+    "faq": "faq",
+    "ticket": "ticket",
+    "runbook": "markdown",
+    "policy": "markdown",
+}
+
+_BULLETS = ("- ", "* ", "+ ")
+_TICKET_SECTIONS = ("Description:", "Resolution:")
+
+# (начало, конец, префикс для продолжений секции)
+Section = Tuple[int, int, str]
+
+
+def _is_list_item(stripped: str) -> bool:
+    if stripped.startswith(_BULLETS):
+        return True
+    # "1. ", "12) " — цифры, затем точка/скобка и пробел
+    i = 0
+    while i < len(stripped) and i < 4 and stripped[i].isdigit():
+        i += 1
+    return 0 < i < len(stripped) - 1 and stripped[i] in ".)" and stripped[i + 1] == " "
+
+
+class _Packer:
+    """
+    Упаковывает последовательные диапазоны строк в чанки не больше max_tokens.
+    Токены диапазона считаются за O(1) по префиксным суммам длин строк.
+    """
+
+    def __init__(self, lines: List[str], max_tokens: int) -> None:
+        self.lines = lines
+        self.max_tokens = max_tokens
+        self.cum = [0]
+        for line in lines:
+            self.cum.append(self.cum[-1] + len(line) + 1)
+        self.chunks: List[str] = []
+
+    def tokens(self, start: int, end: int) -> int:
+        return max(1, (self.cum[end] - self.cum[start] + 3) // 4)
+
+    def text(self, start: int, end: int) -> str:
+        return "\n".join(self.lines[start:end]).strip()
+
+    def emit(self, start: int, end: int, prefix: str = "") -> None:
+        body = self.text(start, end)
+        if body:
+            self.chunks.append(f"{prefix}\n{body}" if prefix else body)
+
+    def blocks(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Атомарные блоки секции: абзац, заголовок или пункт списка
+        вместе со всеми вложенными (с отступом) строками.
+        """
+        blocks: List[Tuple[int, int]] = []
+        block_start = None
+        for i in range(start, end):
+            line = self.lines[i]
+            stripped = line.lstrip()
+            if not stripped:
+                if block_start is not None:
+                    blocks.append((block_start, i))
+                    block_start = None
+                continue
+            indented = len(line) != len(stripped)
+            new_block = stripped.startswith("#") or (not indented and _is_list_item(stripped))
+            if block_start is None:
+                block_start = i
+            elif new_block:
+                blocks.append((block_start, i))
+                block_start = i
+        if block_start is not None:
+            blocks.append((block_start, end))
+        return blocks
+
+    def pack(self, sections: List[Section]) -> List[str]:
+        current: Tuple[int, int] | None = None
+        current_prefix = ""
+
+        def flush() -> None:
+            nonlocal current
+            if current is not None:
+                self.emit(current[0], current[1], current_prefix)
+                current = None
+
+        for start, end, prefix in sections:
+            if self.tokens(start, end) <= self.max_tokens:
+                # секция целиком: дописываем к текущему чанку, если влезает
+                if current is not None and self.tokens(current[0], end) + estimate_tokens(current_prefix) <= self.max_tokens:
+                    current = (current[0], end)
+                else:
+                    flush()
+                    current, current_prefix = (start, end), ""
+                continue
+
+            # большая секция: режем по блокам, продолжения начинаем с префикса секции
+            flush()
+            budget = max(1, self.max_tokens - estimate_tokens(prefix)) if prefix else self.max_tokens
+            for b_start, b_end in self.blocks(start, end):
+                if current is not None and self.tokens(current[0], b_end) <= (budget if current_prefix else self.max_tokens):
+                    current = (current[0], b_end)
+                    continue
+                flush()
+                # первый чанк секции уже начинается с её заголовка
+                chunk_prefix = "" if b_start == start else prefix
+                limit = budget if chunk_prefix else self.max_tokens
+                if self.tokens(b_start, b_end) <= limit:
+                    current, current_prefix = (b_start, b_end), chunk_prefix
+                else:
+                    self._split_lines(b_start, b_end, chunk_prefix, limit)
+            flush()
+
+        flush()
+        return self.chunks
+
+    def _split_lines(self, start: int, end: int, prefix: str, limit: int) -> None:
+        """
+        Блок больше лимита: режем по строкам, а слишком длинные строки — по словам.
+        """
+        chunk_start = None
+        for i in range(start, end):
+            if self.tokens(i, i + 1) > limit:
+                if chunk_start is not None:
+                    self.emit(chunk_start, i, prefix)
+                    chunk_start = None
+                for part in _split_words(self.lines[i], limit):
+                    self.chunks.append(f"{prefix}\n{part}" if prefix else part)
+                continue
+            if chunk_start is not None and self.tokens(chunk_start, i + 1) > limit:
+                self.emit(chunk_start, i, prefix)
+                chunk_start = None
+            if chunk_start is None:
+                chunk_start = i
+        if chunk_start is not None:
+            self.emit(chunk_start, end, prefix)
+
+
+def _split_words(text: str, max_tokens: int) -> List[str]:
+    parts: List[str] = []
+    current: List[str] = []
+    current_chars = 0
+    for word in text.split():
+        if current and (current_chars + len(word) + 1 + 3) // 4 > max_tokens:
+            parts.append(" ".join(current))
+            current, current_chars = [], 0
+        current.append(word)
+        current_chars += len(word) + 1
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+# ---------- разметка секций для каждого типа источника ----------
+
+def _markdown_sections(lines: List[str]) -> List[Section]:
+    sections: List[Section] = []
+    start = 0
+    in_code = False
+    for i, line in enumerate(lines):
+        if line.startswith("```"):
+            in_code = not in_code
+        elif not in_code and line.startswith("#") and i > start:
+            sections.append((start, i, lines[start] if lines[start].startswith("#") else ""))
+            start = i
+    sections.append((start, len(lines), lines[start] if lines and lines[start].startswith("#") else ""))
+    return sections
+
+
+def _faq_sections(lines: List[str]) -> List[Section]:
+    # "Question: ...", пусто, "Answer:", текст ответа
+    answer_at = next((i for i, line in enumerate(lines) if line.strip() == "Answer:"), None)
+    if answer_at is None:
+        return [(0, len(lines), "")]
+    header = "\n".join(lines[: answer_at + 1]).strip()
+    return [(0, answer_at + 1, ""), (answer_at + 1, len(lines), header)]
+
+
+def _ticket_sections(lines: List[str]) -> List[Section]:
+    starts = [i for i, line in enumerate(lines) if line.strip() in _TICKET_SECTIONS]
+    if not starts:
+        return [(0, len(lines), "")]
+    header = "\n".join(lines[: starts[0]]).strip()
+    sections: List[Section] = [(0, starts[0], "")]
+    for n, start in enumerate(starts):
+        end = starts[n + 1] if n + 1 < len(starts) else len(lines)
+        sections.append((start, end, header))
+    return sections
+
+
+_SECTIONERS: Dict[str, Callable[[List[str]], List[Section]]] = {
+    "markdown": _markdown_sections,
+    "faq": _faq_sections,
+    "ticket": _ticket_sections,
+}
+
+
+def structured_chunk_text(text: str, strategy: str, max_tokens: int) -> List[str]:
+    """
+    Режет текст по структуре (strategy: markdown / faq / ticket),
+    каждый чанк не больше max_tokens (оценка text_utils.estimate_tokens).
+    """
+    text = text.strip()
+    if not text:
+        return []
+    lines = text.splitlines()
+    packer = _Packer(lines, max_tokens)
+    return packer.pack(_SECTIONERS[strategy](lines))
+
+
+def parse_strategy_overrides(spec: str) -> Dict[str, str]:
+    """
+    "ticket=simple,runbook=markdown" -> {"ticket": "simple", "runbook": "markdown"}
+    """
+    overrides: Dict[str, str] = {}
+    for item in spec.split(","):
+        if "=" in item:
+            source_type, strategy = item.split("=", 1)
+            overrides[source_type.strip()] = strategy.strip()
+    return overrides
+
+
+def strategy_for(source_type: str) -> str:
+    if settings.chunker == "simple":
+        return "simple"
+    overrides = parse_strategy_overrides(settings.chunk_strategies)
+    return overrides.get(source_type, STRATEGY_BY_SOURCE.get(source_type, "markdown"))
+
+
+def compare(top_k: int = 4) -> None:
+    """
+    Сравнивает прежний simple_chunk_text и структурный чанкер на data/raw:
+    число чанков, токены, дублирование текста и оценку токенов контекста в промпте.
+    """
+    # импорт здесь: dataset_prep сам импортирует этот модуль
+    from .dataset_prep import (
+        load_faqs,
+        load_markdown_dir,
+        load_tickets,
+        simple_chunk_text,
+    )
+
+    docs = load_faqs() + load_tickets() + load_markdown_dir("runbooks", "runbook") + load_markdown_dir("policies", "policy")
+    source_tokens = sum(estimate_tokens(d.text.strip()) for d in docs)
+
+    rows = []
+    for name, fn in (
+        ("simple", lambda d: simple_chunk_text(d.text, max_chars=700, overlap=100)),
+        ("structured", lambda d: structured_chunk_text(
+            d.text, STRATEGY_BY_SOURCE.get(d.metadata["source_type"], "markdown"), settings.chunk_max_tokens
+        )),
+    ):
+        chunks = [c for d in docs for c in fn(d)]
+        tokens = [estimate_tokens(c) for c in chunks]
+        avg = sum(tokens) / len(tokens) if tokens else 0.0
+        rows.append((name, len(chunks), sum(tokens), avg, max(tokens, default=0)))
+
+    print(f"Documents: {len(docs)}, source tokens: {source_tokens}, max_tokens={settings.chunk_max_tokens}")
+    print(f"{'chunker':<11} {'chunks':>7} {'tokens':>7} {'dup %':>6} {'avg tok':>8} {'max tok':>8} {'prompt@' + str(top_k):>10}")
+    for name, n_chunks, total, avg, max_tok in rows:
+        dup = (total / source_tokens - 1) * 100 if source_tokens else 0.0
+        print(f"{name:<11} {n_chunks:>7} {total:>7} {dup:>6.1f} {avg:>8.1f} {max_tok:>8} {avg * top_k:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение чанкеров на data/raw")
+    parser.add_argument("--top-k", type=int, default=4)
+    args = parser.parse_args()
+    compare(top_k=args.top_k)
@@ -0,0 +1,180 @@
+"""
+Общие сетевые клиенты процесса.
+
+- Все OpenAI-совместимые клиенты (эмбеддинги, LLM, eval-скрипты) работают
+  через один httpx.Client / httpx.AsyncClient с keep-alive пулом:
+  соединения и TLS-сессии переиспользуются между запросами и между клиентами,
+  а не создаются в каждом OpenAI(...) заново.
+- OpenAI / AsyncOpenAI кэшируются по (api_key, base_url): EmbeddingsClient
+  и LLMClient с одинаковыми учётными данными получают один и тот же объект.
+- QdrantClient / AsyncQdrantClient кэшируются по (host, port); транспорт —
+  REST (6333) или gRPC (6334) по QDRANT_PREFER_GRPC.
+- Асинхронные клиенты (httpx.AsyncClient, AsyncOpenAI, AsyncQdrantClient)
+  привязаны к event loop, в котором открыли соединения, поэтому кэшируются
+  ещё и по текущему loop и берутся только внутри корутины: asyncio.run на
+  каждый вызов (bench_async, обёртки в Streamlit) получает свежие клиенты,
+  а не "Event loop is closed".
+- Соединения асинхронных клиентов закрываются только внутри их loop'а:
+  корутина, переданная в asyncio.run, должна в конце (в finally) вызвать
+  await aclose_async_clients(). Клиенты уже закрытых loop'ов кэш просто
+  забывает — корректно закрыть их сокеты после asyncio.run нельзя.
+
+Размер пула, keep-alive и таймауты — в Settings (HTTP_*, QDRANT_*).
+"""
+import asyncio
+import math
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from .config import settings
+
+
+_lock = threading.Lock()
+_http_client: httpx.Client | None = None
+_openai_clients: Dict[Tuple[str, str | None], OpenAI] = {}
+_qdrant_clients: Dict[Tuple[str, int], QdrantClient] = {}
+# асинхронные клиенты — по (event loop, ...)
+_async_http_clients: Dict[Tuple[asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+_async_openai_clients: Dict[Tuple[asyncio.AbstractEventLoop, str, str | None], AsyncOpenAI] = {}
+_async_qdrant_clients: Dict[Tuple[asyncio.AbstractEventLoop, str, int], AsyncQdrantClient] = {}
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_pool_size,
+        max_keepalive_connections=settings.http_pool_size,
+        keepalive_expiry=settings.http_keepalive_s,
+    )
+
+
+def http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.http_timeout_s, connect=settings.http_connect_timeout_s)
+
+
+def get_http_client() -> httpx.Client:
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=http_limits(), timeout=http_timeout())
+        return _http_client
+
+
+def _running_loop() -> asyncio.AbstractEventLoop:
+    """
+    Текущий event loop (RuntimeError вне корутины); заодно забывает
+    клиенты закрытых loop'ов. Вызывается под _lock.
+    """
+    loop = asyncio.get_running_loop()
+    for cache in (_async_http_clients, _async_openai_clients, _async_qdrant_clients):
+        for key in [key for key in cache if key[0].is_closed()]:
+            del cache[key]
+    return loop
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    httpx.AsyncClient текущего event loop (вызывать внутри корутины).
+    """
+    with _lock:
+        key = (_running_loop(),)
+        client = _async_http_clients.get(key)
+        if client is None:
+            client = _async_http_clients[key] = httpx.AsyncClient(limits=http_limits(), timeout=http_timeout())
+        return client
+
+
+async def aclose_async_clients() -> None:
+    """
+    Закрывает асинхронные клиенты текущего event loop и убирает их из кэша
+    (следующий вызов get_async_* в этом loop'е создаст новые).
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = [
+            cache.pop(key)
+            # AsyncOpenAI закрывает и общий httpx.AsyncClient, поэтому он последний
+            for cache in (_async_qdrant_clients, _async_openai_clients, _async_http_clients)
+            for key in [key for key in cache if key[0] is loop]
+        ]
+    for client in clients:
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            await client.close()
+
+
+def get_openai_client(api_key: str, base_url: str | None = None) -> OpenAI:
+    """
+    OpenAI-клиент на общем пуле соединений (один на пару api_key/base_url).
+    """
+    http_client = get_http_client()
+    with _lock:
+        client = _openai_clients.get((api_key, base_url))
+        if client is None:
+            client = _openai_clients[(api_key, base_url)] = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                timeout=http_timeout(),
+                max_retries=settings.http_max_retries,
+            )
+        return client
+
+
+def get_async_openai_client(api_key: str, base_url: str | None = None) -> AsyncOpenAI:
+    """
+    AsyncOpenAI текущего event loop (вызывать внутри корутины).
+    """
+    http_client = get_async_http_client()
+    with _lock:
+        key = (_running_loop(), api_key, base_url)
+        client = _async_openai_clients.get(key)
+        if client is None:
+            client = _async_openai_clients[key] = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                timeout=http_timeout(),
+                max_retries=settings.http_max_retries,
+            )
+        return client
+
+
+def _qdrant_kwargs() -> Dict[str, Any]:
+    return {
+        "grpc_port": settings.qdrant_grpc_port,
+        "prefer_grpc": settings.qdrant_prefer_grpc,
+        # таймаут qdrant-client целочисленный: округляем вверх, чтобы 0.5 не стало 0
+        "timeout": math.ceil(settings.qdrant_timeout_s),
+    }
+
+
+def get_qdrant_client(host: str, port: int) -> QdrantClient:
+    """
+    QdrantClient на (host, port); при QDRANT_PREFER_GRPC=true запросы идут
+    по gRPC на QDRANT_GRPC_PORT (один долгоживущий HTTP/2-канал).
+    """
+    with _lock:
+        client = _qdrant_clients.get((host, port))
+        if client is None:
+            client = _qdrant_clients[(host, port)] = QdrantClient(host=host, port=port, **_qdrant_kwargs())
+        return client
+
+
+def get_async_qdrant_client(host: str, port: int) -> AsyncQdrantClient:
+    """
+    AsyncQdrantClient текущего event loop (вызывать внутри корутины).
+    """
+    with _lock:
+        key = (_running_loop(), host, port)
+        client = _async_qdrant_clients.get(key)
+        if client is None:
+            client = _async_qdrant_clients[key] = AsyncQdrantClient(
+                host=host, port=port, **_qdrant_kwargs()
+            )
+        return client
+
@@ -1,7 +1,15 @@
 from dataclasses import dataclass
+from pathlib import Path
 import os
 
 
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
 @dataclass
 class Settings:
     """
@@ -11,10 +19,155 @@ class Settings:
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
+    # Размерность эмбеддингов — одна на весь проект: запросы к API, коллекция, поиск.
+    # EMBEDDING_DIM_MODE: "api" — укороченные векторы считает API (параметр dimensions
+    # моделей text-embedding-3); "truncate" — API возвращает полные векторы модели
+    # (EMBEDDING_MODEL_DIM), а мы обрезаем их до EMBEDDING_DIM с перенормировкой
+    # (Matryoshka): кэш полных векторов обслуживает любую размерность
+    embedding_dim: int = int(os.getenv("EMBEDDING_DIM", "1536"))
+    embedding_dim_mode: str = os.getenv("EMBEDDING_DIM_MODE", "api")
+    embedding_model_dim: int = int(os.getenv("EMBEDDING_MODEL_DIM", "1536"))
+
     # Параметры Qdrant
     qdrant_host: str = os.getenv("QDRANT_HOST", "localhost")
     qdrant_port: int = int(os.getenv("QDRANT_PORT", "6333"))
     collection_name: str = os.getenv("QDRANT_COLLECTION", "it_support_kb")
+    # gRPC (порт 6334 в docker-compose) вместо REST и таймаут запросов (секунды)
+    qdrant_prefer_grpc: bool = _env_bool("QDRANT_PREFER_GRPC", "false")
+    qdrant_grpc_port: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    qdrant_timeout_s: float = float(os.getenv("QDRANT_TIMEOUT_S", "10"))
+
+    # Раскладка коллекции Qdrant (см. CollectionLayout, миграция — python -m src.qdrant_layout):
+    # HNSW-граф, ef при поиске (0 — по умолчанию Qdrant), квантизация "none" / "int8" / "binary"
+    # с oversampling и пересчётом по исходным векторам, исходные векторы на диске
+    # и payload-индексы (keyword) для фильтров
+    qdrant_hnsw_m: int = int(os.getenv("QDRANT_HNSW_M", "16"))
+    qdrant_hnsw_ef_construct: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+    qdrant_search_ef: int = int(os.getenv("QDRANT_SEARCH_EF", "0"))
+    qdrant_quantization: str = os.getenv("QDRANT_QUANTIZATION", "none")
+    qdrant_quantization_oversampling: float = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
+    qdrant_quantization_rescore: bool = _env_bool("QDRANT_QUANTIZATION_RESCORE", "true")
+    qdrant_on_disk_vectors: bool = _env_bool("QDRANT_ON_DISK_VECTORS", "false")
+    qdrant_payload_indexes: str = os.getenv("QDRANT_PAYLOAD_INDEXES", "category,source_id")
+
+    # Общий HTTP-пул OpenAI-совместимых клиентов (см. clients.py):
+    # число соединений, время жизни простаивающего keep-alive соединения и таймауты (секунды)
+    http_pool_size: int = int(os.getenv("HTTP_POOL_SIZE", "32"))
+    http_keepalive_s: float = float(os.getenv("HTTP_KEEPALIVE_S", "60"))
+    http_timeout_s: float = float(os.getenv("HTTP_TIMEOUT_S", "60"))
+    http_connect_timeout_s: float = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+    http_max_retries: int = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+
+    # Векторное хранилище: "qdrant", "local" (NumPy-индекс в процессе, на диске)
+    # или "memory" (тот же индекс только в памяти, для бенчмарков и офлайн-прогонов)
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "qdrant")
+    local_index_dir: str = os.getenv("LOCAL_INDEX_DIR", str(ROOT_DIR / "data" / "index"))
+
+    # Бэкенды моделей: "openai" или "stub" (детерминированные заглушки без сети, см. stubs.py)
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "openai")
+    llm_backend: str = os.getenv("LLM_BACKEND", "openai")
+    # имитация задержки заглушек (секунды)
+    stub_embed_latency_s: float = float(os.getenv("STUB_EMBED_LATENCY_S", "0"))
+    stub_llm_latency_s: float = float(os.getenv("STUB_LLM_LATENCY_S", "0"))
+    stub_search_latency_s: float = float(os.getenv("STUB_SEARCH_LATENCY_S", "0"))
+
+    # Микробатчинг embed_text из параллельных запросов (см. embedding_batcher.py): запросы копятся
+    # до WINDOW_MS миллисекунд после первого или до MAX_ITEMS текстов и уходят одним embed_batch,
+    # одинаковые тексты "в полёте" отправляются один раз; CONCURRENCY — пачек в полёте одновременно
+    embed_batching_enabled: bool = _env_bool("EMBED_BATCHING_ENABLED", "false")
+    embed_batch_window_ms: float = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+    embed_batch_max_items: int = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "64"))
+    embed_batch_concurrency: int = int(os.getenv("EMBED_BATCH_CONCURRENCY", "4"))
+
+    # Кэш эмбеддингов (LRU в памяти + SQLite на диске)
+    embedding_cache_enabled: bool = _env_bool("EMBEDDING_CACHE_ENABLED", "true")
+    embedding_cache_path: str = os.getenv(
+        "EMBEDDING_CACHE_PATH", str(ROOT_DIR / "data" / "cache" / "embeddings.sqlite")
+    )
+    embedding_cache_memory_items: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+
+    # Конвейер ingest: сколько запросов эмбеддингов держим "в полёте"
+    # и сколько (оценочных) токенов кладём в один запрос
+    ingest_concurrency: int = int(os.getenv("INGEST_CONCURRENCY", "4"))
+    ingest_batch_tokens: int = int(os.getenv("INGEST_BATCH_TOKENS", "8000"))
+    ingest_batch_max_items: int = int(os.getenv("INGEST_BATCH_MAX_ITEMS", "256"))
+    # checkpoint (и flush локального индекса) раз в N записанных батчей
+    ingest_checkpoint_every: int = int(os.getenv("INGEST_CHECKPOINT_EVERY", "1"))
+
+    # Чанкинг: "structured" (по структуре документа, размер в токенах) или "simple" (окно символов)
+    chunker: str = os.getenv("CHUNKER", "structured")
+    chunk_max_tokens: int = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+    # переопределение стратегии по типу источника, например "ticket=simple,runbook=markdown"
+    chunk_strategies: str = os.getenv("CHUNK_STRATEGIES", "")
+
+    # Нормализация опечаток в вопросах: словарь "<опечатка>\t<исправление>"
+    # и (опционально) SymSpell по словам базы знаний для опечаток вне словаря
+    typo_dictionary_path: str = os.getenv(
+        "TYPO_DICTIONARY_PATH", str(ROOT_DIR / "data" / "dictionaries" / "typos.tsv")
+    )
+    typo_symspell_enabled: bool = _env_bool("TYPO_SYMSPELL_ENABLED", "false")
+    typo_symspell_max_distance: int = int(os.getenv("TYPO_SYMSPELL_MAX_DISTANCE", "1"))
+    # более короткие слова SymSpell не трогает (слишком много ложных исправлений)
+    typo_symspell_min_length: int = int(os.getenv("TYPO_SYMSPELL_MIN_LENGTH", "5"))
+    # сколько исправлений SymSpell помнить (LRU): слова запросов не ограничены словарём
+    typo_symspell_memo_size: int = int(os.getenv("TYPO_SYMSPELL_MEMO_SIZE", "10000"))
+
+    # Режим поиска: "dense", "lexical" (BM25) или "hybrid" (оба + Reciprocal Rank Fusion)
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "hybrid")
+    # сколько кандидатов берём из каждого поиска перед слиянием
+    hybrid_candidates: int = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    rrf_k: int = int(os.getenv("RRF_K", "60"))
+
+    # Маршрутизация запроса по категории (центроиды категорий в метаданных коллекции):
+    # фильтр по категории включается, только если косинус с лучшим центроидом >= MIN_SCORE
+    # и отрыв от второй категории >= MIN_MARGIN, иначе поиск без фильтра
+    category_router_enabled: bool = _env_bool("CATEGORY_ROUTER_ENABLED", "true")
+    category_router_min_score: float = float(os.getenv("CATEGORY_ROUTER_MIN_SCORE", "0.3"))
+    category_router_min_margin: float = float(os.getenv("CATEGORY_ROUTER_MIN_MARGIN", "0.05"))
+
+    # Диверсификация выдачи (MMR, см. diversify.py): из MMR_CANDIDATES кандидатов векторного
+    # поиска выбираются top_k с балансом релевантность / новизна MMR_LAMBDA (1.0 — только
+    # релевантность) и не больше MMR_MAX_PER_SOURCE чанков одного документа (0 — без ограничения)
+    mmr_enabled: bool = _env_bool("MMR_ENABLED", "false")
+    mmr_candidates: int = int(os.getenv("MMR_CANDIDATES", "30"))
+    mmr_lambda: float = float(os.getenv("MMR_LAMBDA", "0.7"))
+    mmr_max_per_source: int = int(os.getenv("MMR_MAX_PER_SOURCE", "2"))
+
+    # Сборка контекста для LLM: бюджет токенов (0 — без ограничения)
+    # и порог сходства (Jaccard по шинглам), выше которого фрагмент считается дубликатом
+    context_max_tokens: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+    context_dedup_threshold: float = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+    # Пакетные ответы (RAGPipeline.answer_batch): сколько вопросов в одном запросе
+    # эмбеддингов и сколько генераций LLM идёт параллельно
+    answer_batch_embed_size: int = int(os.getenv("ANSWER_BATCH_EMBED_SIZE", "256"))
+    answer_batch_concurrency: int = int(os.getenv("ANSWER_BATCH_CONCURRENCY", "16"))
+
+    # Лимит времени на один запрос в асинхронном API (секунды, 0 — без лимита)
+    request_timeout_s: float = float(os.getenv("REQUEST_TIMEOUT_S", "30"))
+
+    # Семантический кэш ответов (похожие вопросы -> готовый ответ)
+    semantic_cache_enabled: bool = _env_bool("SEMANTIC_CACHE_ENABLED", "true")
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    semantic_cache_max_size: int = int(os.getenv("SEMANTIC_CACHE_MAX_SIZE", "1000"))
+    semantic_cache_ttl_s: float = float(os.getenv("SEMANTIC_CACHE_TTL_S", "3600"))
+    # как часто (секунды) сверять версию базы знаний с Qdrant (get_collection —
+    # сетевой запрос). До N секунд после ingest кэш ещё отдаёт ответы, собранные
+    # по старой базе. 0 — сверять перед каждым поиском в кэше: ответ по старой
+    # базе не отдаётся ни разу, но это лишний запрос к Qdrant на каждый вопрос.
+    semantic_cache_version_check_s: float = float(os.getenv("SEMANTIC_CACHE_VERSION_CHECK_S", "30"))
+
+    # Экстрактивный ответ из FAQ без LLM (см. faq_fastpath.py): первый документ — FAQ
+    # с косинусом >= MIN_SCORE и отрывом >= MIN_MARGIN от документа другого источника;
+    # порог подбирается на data/eval: python -m src.faq_fastpath
+    faq_fastpath_enabled: bool = _env_bool("FAQ_FASTPATH_ENABLED", "false")
+    faq_fastpath_min_score: float = float(os.getenv("FAQ_FASTPATH_MIN_SCORE", "0.85"))
+    faq_fastpath_min_margin: float = float(os.getenv("FAQ_FASTPATH_MIN_MARGIN", "0.05"))
+
+    # Метрики: порт HTTP /metrics в формате Prometheus (0 — не поднимать)
+    # и путь JSONL-лога запросов (пусто — не писать)
+    metrics_port: int = int(os.getenv("METRICS_PORT", "0"))
+    request_log_path: str = os.getenv("REQUEST_LOG_PATH", "")
 
 
 settings = Settings()
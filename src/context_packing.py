@@ -0,0 +1,177 @@
+"""
+Сборка контекста для LLM из найденных чанков.
+
+- соседние (chunk_000, chunk_001, ...) и перекрывающиеся чанки одного source_id
+  склеиваются в один фрагмент, повторённый текст (перекрытие окна simple-чанкера,
+  заголовок тикета/вопроса FAQ в продолжениях) выкидывается;
+- почти дубликаты (Jaccard по шинглам из слов >= dedup_threshold, либо текст
+  целиком содержится в уже выбранном) отбрасываются;
+- фрагменты добавляются по убыванию score, пока помещаются в max_tokens.
+"""
+from typing import Any, Dict, List, Set, Tuple
+
+from .text_utils import estimate_tokens
+
+
+# самое длинное перекрытие, которое ищем между соседними чанками (символы)
+MAX_OVERLAP_CHARS = 400
+SHINGLE_SIZE = 3
+
+
+def _chunk_position(doc: Dict[str, Any]) -> Tuple[str, int] | None:
+    """
+    ("faq_wifi_001", 0) из chunk_id "faq_wifi_001_chunk_000"; None, если формат другой.
+    """
+    chunk_id = doc["metadata"].get("chunk_id") or ""
+    source_id, sep, idx = chunk_id.rpartition("_chunk_")
+    if not sep or not idx.isdigit():
+        return None
+    return doc["metadata"].get("source_id") or source_id, int(idx)
+
+
+def _join_texts(first: str, second: str) -> str:
+    """
+    Склеивает текст соседних чанков без повторов:
+    - общие начальные строки (заголовок, повторённый в продолжении) убираются из second;
+    - суффикс first, совпадающий с началом second (перекрытие окна), не дублируется.
+    """
+    first_lines = first.splitlines()
+    second_lines = second.splitlines()
+    common = 0
+    while (
+        common < min(len(first_lines), len(second_lines))
+        and first_lines[common] == second_lines[common]
+        and first_lines[common].strip()
+    ):
+        common += 1
+    if common:
+        second = "\n".join(second_lines[common:]).lstrip("\n")
+
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def merge_adjacent(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Склеивает идущие подряд чанки одного документа.
+    Результат стоит на месте лучшего из склеенных чанков и получает его score;
+    ID исходных чанков — в metadata["merged_chunk_ids"].
+    """
+    runs: Dict[str, List[Tuple[int, int]]] = {}
+    for order, doc in enumerate(docs):
+        position = _chunk_position(doc)
+        if position is not None:
+            runs.setdefault(position[0], []).append((position[1], order))
+
+    merged_into: Dict[int, int] = {}
+    merged_docs: Dict[int, Dict[str, Any]] = {}
+    for positions in runs.values():
+        positions.sort()
+        run = [positions[0]]
+        for idx, order in positions[1:] + [(None, None)]:
+            if idx is not None and idx == run[-1][0] + 1:
+                run.append((idx, order))
+                continue
+            if len(run) > 1:
+                best = max(run, key=lambda item: docs[item[1]]["score"])[1]
+                text = docs[run[0][1]]["text"]
+                for _, part in run[1:]:
+                    text = _join_texts(text, docs[part]["text"])
+                chunk_ids = [docs[o]["metadata"].get("chunk_id") for _, o in run]
+                merged_docs[best] = docs[best] | {
+                    "text": text,
+                    "metadata": docs[best]["metadata"] | {"merged_chunk_ids": chunk_ids},
+                }
+                for _, o in run:
+                    merged_into[o] = best
+            run = [(idx, order)]
+
+    result: List[Dict[str, Any]] = []
+    for order, doc in enumerate(docs):
+        target = merged_into.get(order)
+        if target is None:
+            result.append(doc)
+        elif target == order:
+            result.append(merged_docs[order])
+    return result
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i: i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def pack_context(
+    docs: List[Dict[str, Any]],
+    max_tokens: int,
+    dedup_threshold: float = 0.8,
+) -> List[Dict[str, Any]]:
+    """
+    Возвращает фрагменты для промпта (формат как у docs), по убыванию score.
+    max_tokens <= 0 — без ограничения. Первый фрагмент берётся всегда
+    (если он сам больше бюджета — обрезается по строкам).
+    """
+    candidates = sorted(merge_adjacent(docs), key=lambda d: d["score"], reverse=True)
+
+    packed: List[Dict[str, Any]] = []
+    packed_shingles: List[Set[Tuple[str, ...]]] = []
+    used_tokens = 0
+    for doc in candidates:
+        text = doc["text"].strip()
+        if not text:
+            continue
+
+        shingles = _shingles(text)
+        duplicate = any(
+            text in chosen["text"]
+            or len(shingles & other) / len(shingles | other) >= dedup_threshold
+            for chosen, other in zip(packed, packed_shingles)
+        )
+        if duplicate:
+            continue
+
+        tokens = estimate_tokens(text)
+        if max_tokens > 0 and used_tokens + tokens > max_tokens:
+            if packed:
+                # не помещается — пробуем следующие (они могут быть короче)
+                continue
+            text = _truncate(text, max_tokens)
+            tokens = estimate_tokens(text)
+            doc = doc | {"text": text}
+
+        packed.append(doc)
+        packed_shingles.append(shingles)
+        used_tokens += tokens
+    return packed
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    kept: List[str] = []
+    used = 0
+    for line in text.splitlines():
+        used += estimate_tokens(line + "\n")
+        if used > max_tokens:
+            if not kept:
+                # первая строка сама длиннее бюджета — режем её по словам
+                kept.append(_cut_line(line, max_tokens))
+            break
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _cut_line(line: str, max_tokens: int) -> str:
+    """
+    Начало строки, укладывающееся в max_tokens: по границе слова,
+    а если в пределах лимита пробела нет — по символам.
+    """
+    limit = max(1, max_tokens * 4 - 1)  # estimate_tokens(line + "\n") <= max_tokens
+    head = line[:limit]
+    if len(line) > limit and not line[limit].isspace():
+        cut = head.rstrip().rfind(" ")
+        if cut > 0:
+            head = head[:cut]
+    return head.rstrip()
@@ -1,10 +1,19 @@
+import argparse
+import hashlib
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 
 import yaml
 
+from .bm25_index import BM25Index, BM25_INDEX_PATH, BM25_META_PATH, TOKENIZER_VERSION
+from .chunking import strategy_for, structured_chunk_text
+from .config import settings
+
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 RAW_DIR = ROOT_DIR / "data" / "raw"
@@ -12,6 +21,27 @@ PROCESSED_DIR = ROOT_DIR / "data" / "processed"
 PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
 CHUNKS_PATH = PROCESSED_DIR / "chunks.jsonl"
+MANIFEST_PATH = PROCESSED_DIR / "manifest.json"
+
+# Версия кода, который строит чанки (загрузчики источников, chunk_documents,
+# chunking.py): увеличивать при любом изменении текста или метаданных чанков,
+# иначе неизменённые источники сохранят чанки, собранные прежним кодом
+CHUNKER_VERSION = 1
+
+# Параметры чанкинга; при их смене кэшированные чанки недействительны
+# (версия токенизатора BM25 — здесь же: индекс пересобирается вместе с чанками)
+CHUNKER_CONFIG = {
+    "version": CHUNKER_VERSION,
+    "bm25_tokenizer": TOKENIZER_VERSION,
+    "chunker": settings.chunker,
+    "max_tokens": settings.chunk_max_tokens,
+    "strategies": settings.chunk_strategies,
+    "max_chars": 700,
+    "overlap": 100,
+}
+
+# Сколько тикетов обрабатывает одна задача пула процессов
+TICKETS_PER_SHARD = 500
 
 
 @dataclass
@@ -21,13 +51,9 @@ class Document:
     metadata: Dict[str, Any]
 
 
-def load_faqs() -> List[Document]:
-    path = RAW_DIR / "faqs.yaml"
-    if not path.exists():
-        return []
-
+def load_faq_file(path: Path) -> List[Document]:
     with path.open("r", encoding="utf-8") as f:
-        faqs = yaml.safe_load(f)
+        faqs = yaml.safe_load(f) or []
 
     docs: List[Document] = []
     for item in faqs:
@@ -42,11 +68,37 @@ def load_faqs() -> List[Document]:
             "category": item.get("category", "other"),
             "title": question,
             "language": "en",
+            # готовый ответ для экстрактивного быстрого пути (faq_fastpath.py)
+            "answer": answer,
         }
         docs.append(Document(id=doc_id, text=text, metadata=metadata))
     return docs
 
 
+def load_faqs() -> List[Document]:
+    path = RAW_DIR / "faqs.yaml"
+    if not path.exists():
+        return []
+    return load_faq_file(path)
+
+
+def ticket_to_document(item: Dict[str, Any]) -> Document:
+    doc_id = item["ticket_id"]
+    title = item.get("title", "")
+    description = item.get("description", "")
+    resolution = item.get("resolution", "")
+
+    text = f"Ticket ID: {doc_id}\nTitle: {title}\n\nDescription:\n{description}\n\nResolution:\n{resolution}"
+    metadata = {
+        "source_type": "ticket",
+        "source_id": doc_id,
+        "category": item.get("category", "other"),
+        "title": title,
+        "language": "en",
+    }
+    return Document(id=doc_id, text=text, metadata=metadata)
+
+
 def load_tickets() -> List[Document]:
     path = RAW_DIR / "tickets.json"
     if not path.exists():
@@ -55,23 +107,35 @@ def load_tickets() -> List[Document]:
     with path.open("r", encoding="utf-8") as f:
         tickets = json.load(f)
 
-    docs: List[Document] = []
-    for item in tickets:
-        doc_id = item["ticket_id"]
-        title = item.get("title", "")
-        description = item.get("description", "")
-        resolution = item.get("resolution", "")
+    return [ticket_to_document(item) for item in tickets]
 
-        text = f"Ticket ID: {doc_id}\nTitle: {title}\n\nDescription:\n{description}\n\nResolution:\n{resolution}"
-        metadata = {
-            "source_type": "ticket",
-            "source_id": doc_id,
-            "category": item.get("category", "other"),
-            "title": title,
-            "language": "en",
-        }
-        docs.append(Document(id=doc_id, text=text, metadata=metadata))
-    return docs
+
+def load_markdown_file(path: Path, source_type: str) -> Document:
+    with path.open("r", encoding="utf-8") as f:
+        content = f.read()
+
+    # Заголовок берём из первой строки с "# ", если есть
+    title = path.stem
+    for line in content.splitlines():
+        if line.startswith("# "):
+            title = line.lstrip("# ").strip()
+            break
+
+    # Категорию грубо берём из имени файла (wifi, vpn, password, sla и т.п.)
+    category = path.stem.split("_")[0].lower()
+
+    doc_id = f"{source_type}_{path.stem}"
+
+    metadata = {
+        "source_type": source_type,
+        "source_id": doc_id,
+        "category": category,
+        "title": title,
+        "language": "en",
+        "filename": path.name,
+    }
+
+    return Document(id=doc_id, text=content, metadata=metadata)
 
 
 def load_markdown_dir(subdir: str, source_type: str) -> List[Document]:
@@ -83,36 +147,7 @@ def load_markdown_dir(subdir: str, source_type: str) -> List[Document]:
     if not base_dir.exists():
         return []
 
-    docs: List[Document] = []
-
-    for path in base_dir.glob("*.md"):
-        with path.open("r", encoding="utf-8") as f:
-            content = f.read()
-
-        # Заголовок берём из первой строки с "# ", если есть
-        title = path.stem
-        for line in content.splitlines():
-            if line.startswith("# "):
-                title = line.lstrip("# ").strip()
-                break
-
-        # Категорию грубо берём из имени файла (wifi, vpn, password, sla и т.п.)
-        category = path.stem.split("_")[0].lower()
-
-        doc_id = f"{source_type}_{path.stem}"
-
-        metadata = {
-            "source_type": source_type,
-            "source_id": doc_id,
-            "category": category,
-            "title": title,
-            "language": "en",
-            "filename": path.name,
-        }
-
-        docs.append(Document(id=doc_id, text=content, metadata=metadata))
-
-    return docs
+    return [load_markdown_file(path, source_type) for path in base_dir.glob("*.md")]
 
 
 def simple_chunk_text(text: str, max_chars: int = 700, overlap: int = 100) -> List[str]:
@@ -143,35 +178,235 @@ def simple_chunk_text(text: str, max_chars: int = 700, overlap: int = 100) -> Li
     return chunks
 
 
-def build_chunks() -> None:
+def chunk_documents(docs: List[Document]) -> List[Dict[str, Any]]:
     """
-    Собирает все документы, режет на чанки и сохраняет в chunks.jsonl
+    Режет документы на чанки; возвращает записи для chunks.jsonl.
+    Стратегия выбирается по source_type (см. chunking.strategy_for).
     """
-    docs: List[Document] = []
-    docs.extend(load_faqs())
-    docs.extend(load_tickets())
-    docs.extend(load_markdown_dir("runbooks", "runbook"))
-    docs.extend(load_markdown_dir("policies", "policy"))
-
-    print(f"Loaded documents: {len(docs)}")
-
-    with CHUNKS_PATH.open("w", encoding="utf-8") as out_f:
-        count_chunks = 0
-        for doc in docs:
-            chunks = simple_chunk_text(doc.text, max_chars=700, overlap=100)
-            for idx, chunk in enumerate(chunks):
-                chunk_id = f"{doc.id}_chunk_{idx:03d}"
-
-                record = {
-                    "id": chunk_id,
+    records: List[Dict[str, Any]] = []
+    for doc in docs:
+        strategy = strategy_for(doc.metadata["source_type"])
+        if strategy == "simple":
+            chunks = simple_chunk_text(doc.text, max_chars=CHUNKER_CONFIG["max_chars"], overlap=CHUNKER_CONFIG["overlap"])
+        else:
+            chunks = structured_chunk_text(doc.text, strategy, CHUNKER_CONFIG["max_tokens"])
+        for idx, chunk in enumerate(chunks):
+            records.append(
+                {
+                    "id": f"{doc.id}_chunk_{idx:03d}",
                     "text": chunk,
                     "metadata": doc.metadata,
                 }
+            )
+    return records
+
+
+def discover_sources(raw_dir: Path = RAW_DIR) -> List[Tuple[Path, str]]:
+    """
+    Все исходные файлы data/raw в порядке сборки: (путь, тип источника).
+    """
+    sources: List[Tuple[Path, str]] = []
+    for name, source_type in (("faqs.yaml", "faq"), ("tickets.json", "ticket")):
+        path = raw_dir / name
+        if path.exists():
+            sources.append((path, source_type))
+    for subdir, source_type in (("runbooks", "runbook"), ("policies", "policy")):
+        base_dir = raw_dir / subdir
+        if base_dir.exists():
+            sources.extend((path, source_type) for path in base_dir.glob("*.md"))
+    return sources
+
+
+# ---------- задачи для пула процессов (должны быть на уровне модуля) ----------
+
+def _chunk_file(path: str, source_type: str) -> List[Dict[str, Any]]:
+    if source_type == "faq":
+        docs = load_faq_file(Path(path))
+    else:
+        docs = [load_markdown_file(Path(path), source_type)]
+    return chunk_documents(docs)
+
+
+def _chunk_ticket_shard(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return chunk_documents([ticket_to_document(item) for item in items])
+
+
+# ---------- манифест ----------
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("chunker") != CHUNKER_CONFIG:
+        print("Chunker version or settings changed, rebuilding all sources.")
+        return {}
+    return manifest
+
+
+def _source_state(path: Path, previous: Dict[str, Any] | None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Возвращает (запись манифеста, изменился ли файл).
+    Хэш содержимого считаем только если поменялись mtime/размер.
+    """
+    stat = path.stat()
+    state = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if previous and previous.get("mtime_ns") == state["mtime_ns"] and previous.get("size") == state["size"]:
+        return previous, False
+
+    state["sha256"] = _file_sha256(path)
+    changed = not previous or previous.get("sha256") != state["sha256"]
+    if not changed:
+        state["chunk_ids"] = previous["chunk_ids"]
+    return state, changed
+
+
+def _iter_existing_chunks(path: Path = CHUNKS_PATH) -> Iterator[Dict[str, Any]]:
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def build_chunks(
+    workers: int | None = None,
+    force: bool = False,
+    raw_dir: Path = RAW_DIR,
+    processed_dir: Path = PROCESSED_DIR,
+) -> None:
+    """
+    Собирает все документы, режет на чанки и сохраняет в chunks.jsonl,
+    рядом — лексический индекс BM25 (bm25_index.npz + bm25_meta.json).
+
+    Инкрементально: manifest.json хранит для каждого исходного файла
+    mtime, размер, sha256 и ID его чанков. Неизменённые файлы не читаются
+    повторно — их чанки берутся из прежнего chunks.jsonl; если их там нет
+    (файл правили вручную или прошлый запуск прервался), источник пересобирается.
+    Изменённые файлы обрабатываются в пуле процессов: задача на файл,
+    для tickets.json — задача на шард из TICKETS_PER_SHARD тикетов.
+    force=True — пересобрать всё.
+    raw_dir / processed_dir — другие каталоги (например, синтетический корпус бенчмарка).
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    chunks_path = processed_dir / CHUNKS_PATH.name
+    manifest_path = processed_dir / MANIFEST_PATH.name
+
+    previous = {} if force else load_manifest(manifest_path)
+    previous_sources: Dict[str, Any] = previous.get("sources", {})
+
+    sources = discover_sources(raw_dir)
+    states: Dict[str, Dict[str, Any]] = {}
+    changed: List[Tuple[Path, str]] = []
+    for path, source_type in sources:
+        rel = path.relative_to(raw_dir).as_posix()
+        state, is_changed = _source_state(path, previous_sources.get(rel))
+        states[rel] = state
+        if is_changed or not chunks_path.exists():
+            changed.append((path, source_type))
+
+    removed = set(previous_sources) - set(states)
+    print(f"Sources: {len(sources)}, changed: {len(changed)}, removed: {len(removed)}")
+    if not changed and not removed and chunks_path.exists():
+        # дешёвая сверка с манифестом: число строк chunks.jsonl (без разбора JSON)
+        expected = sum(len(state["chunk_ids"]) for state in states.values())
+        with chunks_path.open("rb") as f:
+            actual = sum(1 for line in f if line.strip())
+        if actual == expected:
+            print("Nothing changed, chunks.jsonl is up to date.")
+            return
+        print(f"{chunks_path.name} has {actual} chunks, manifest expects {expected}: checking sources.")
+
+    # 1. Чанки неизменённых источников берём из прежнего chunks.jsonl
+    changed_paths = {path for path, _ in changed}
+    reused_ids = {
+        chunk_id
+        for path, _ in sources
+        if path not in changed_paths
+        for chunk_id in states[path.relative_to(raw_dir).as_posix()]["chunk_ids"]
+    }
+    reused: Dict[str, Dict[str, Any]] = {
+        record["id"]: record for record in _iter_existing_chunks(chunks_path) if record["id"] in reused_ids
+    }
+    # манифест и chunks.jsonl могли разойтись (ручная правка, прерванный запуск):
+    # источник, чанков которого нет, пересобираем
+    for path, source_type in sources:
+        rel = path.relative_to(raw_dir).as_posix()
+        if path not in changed_paths and any(chunk_id not in reused for chunk_id in states[rel]["chunk_ids"]):
+            print(f"Chunks of {rel} are missing from {chunks_path.name}, rebuilding it.")
+            changed.append((path, source_type))
+            changed_paths.add(path)
+            for chunk_id in states[rel]["chunk_ids"]:
+                reused.pop(chunk_id, None)
+
+    # 2. Чанкуем изменённые источники (в пуле процессов)
+    tasks = []
+    for path, source_type in changed:
+        if source_type == "ticket":
+            with path.open("r", encoding="utf-8") as f:
+                tickets = json.load(f)
+            for start in range(0, len(tickets), TICKETS_PER_SHARD):
+                tasks.append((path, _chunk_ticket_shard, (tickets[start: start + TICKETS_PER_SHARD],)))
+        else:
+            tasks.append((path, _chunk_file, (str(path), source_type)))
+
+    fresh: Dict[Path, List[Dict[str, Any]]] = {path: [] for path, _ in changed}
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            futures = [(path, pool.submit(fn, *args)) for path, fn, args in tasks]
+            for path, future in futures:
+                fresh[path].extend(future.result())
+    else:
+        for path, fn, args in tasks:
+            fresh[path].extend(fn(*args))
+
+    # 3. Пишем chunks.jsonl в исходном порядке источников
+    bm25_docs: List[Dict[str, Any]] = []
+    tmp_path = chunks_path.with_suffix(".jsonl.tmp")
+    with tmp_path.open("w", encoding="utf-8") as out_f:
+        for path, _ in sources:
+            rel = path.relative_to(raw_dir).as_posix()
+            if path in changed_paths:
+                records = fresh[path]
+                states[rel]["chunk_ids"] = [record["id"] for record in records]
+            else:
+                records = [reused[chunk_id] for chunk_id in states[rel]["chunk_ids"]]
+
+            for record in records:
                 out_f.write(json.dumps(record, ensure_ascii=False) + "\n")
-                count_chunks += 1
+                # payload'ы чанков (как в Qdrant) — для лексического индекса BM25
+                bm25_docs.append(record["metadata"] | {"text": record["text"], "chunk_id": record["id"]})
+    os.replace(tmp_path, chunks_path)
+
+    print(f"Saved {len(bm25_docs)} chunks to {chunks_path} ({len(reused)} reused)")
+
+    bm25_index_path = processed_dir / BM25_INDEX_PATH.name
+    BM25Index.build(bm25_docs).save(bm25_index_path, processed_dir / BM25_META_PATH.name)
+    print(f"Saved BM25 index to {bm25_index_path}")
+
+    with manifest_path.open("w", encoding="utf-8") as f:
+        json.dump({"chunker": CHUNKER_CONFIG, "sources": states}, f, ensure_ascii=False, indent=2)
+
+    print(f"Done in {time.perf_counter() - started:.2f}s")
+
 
-    print(f"Saved {count_chunks} chunks to {CHUNKS_PATH}")
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Подготовка чанков из data/raw")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию = CPU)")
+    parser.add_argument("--force", action="store_true", help="игнорировать манифест и пересобрать всё")
+    args = parser.parse_args()
+    build_chunks(workers=args.workers, force=args.force)
 
 
 if __name__ == "__main__":
-    build_chunks()
+    main()
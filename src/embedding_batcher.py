@@ -0,0 +1,153 @@
+"""
+Микробатчинг и склейка запросов эмбеддингов вопросов.
+
+Под нагрузкой каждая сессия Streamlit вызывает embed_text отдельно:
+один HTTP-запрос на вопрос, а одинаковые вопросы, пришедшие одновременно,
+эмбеддятся по нескольку раз. BatchingEmbeddings оборачивает любой клиент
+эмбеддингов (как MatryoshkaEmbeddings):
+
+- embed_text / aembed_text кладут текст в очередь и ждут Future;
+- фоновый поток-диспетчер копит очередь до EMBED_BATCH_WINDOW_MS
+  миллисекунд после первого запроса или до EMBED_BATCH_MAX_ITEMS текстов
+  и отправляет их одним embed_batch исходного клиента (в пуле из
+  EMBED_BATCH_CONCURRENCY потоков, чтобы сбор следующей пачки не ждал ответа API);
+- одинаковые тексты "в полёте" (в очереди или в отправленной пачке) склеиваются:
+  второй вызов получает тот же Future, в API текст уходит один раз;
+- ошибка embed_batch передаётся всем, кто ждал тексты этой пачки.
+
+embed_batch / aembed_batch (ingest, eval, answer_batch) уже пакетные
+и идут в исходный клиент напрямую. Токены эмбеддингов из диспетчера
+попадают в общий счётчик, но не в трассу конкретного запроса.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from .config import settings
+from .metrics import record_embed_batch, record_embed_merged
+
+
+class BatchingEmbeddings:
+    def __init__(
+        self,
+        client,
+        window_ms: float | None = None,
+        max_items: int | None = None,
+        concurrency: int | None = None,
+    ) -> None:
+        self.client = client
+        self.window_s = (settings.embed_batch_window_ms if window_ms is None else window_ms) / 1000
+        self.max_items = max_items or settings.embed_batch_max_items
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency or settings.embed_batch_concurrency,
+            thread_name_prefix="embed-batch",
+        )
+
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, Future]] = []
+        self._inflight: Dict[str, Future] = {}
+        self._first_at = 0.0
+        self._closed = False
+        self.stats = {"texts": 0, "merged": 0, "batches": 0}
+
+        self._thread = threading.Thread(target=self._dispatch, name="embed-dispatcher", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    # ---------- очередь ----------
+
+    def submit(self, text: str) -> Future:
+        """
+        Future с вектором text; одинаковый текст в полёте — тот же Future.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchingEmbeddings is closed")
+            self.stats["texts"] += 1
+            future = self._inflight.get(text)
+            if future is not None:
+                self.stats["merged"] += 1
+                record_embed_merged()
+                return future
+            future = self._inflight[text] = Future()
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append((text, future))
+            self._cond.notify()
+            return future
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # окно считается от первого запроса пачки
+                deadline = self._first_at + self.window_s
+                while len(self._pending) < self.max_items and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_items]
+                # остаток очереди (больше max_items) уходит следующей пачкой без ожидания
+                del self._pending[: self.max_items]
+                self.stats["batches"] += 1
+            self._pool.submit(self._send, batch)
+
+    def _send(self, batch: List[Tuple[str, Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.client.embed_batch(texts)
+        except Exception as e:
+            self._resolve(batch, error=e)
+            return
+        self._resolve(batch, vectors=vectors)
+
+    def _resolve(
+        self,
+        batch: List[Tuple[str, Future]],
+        vectors: List[List[float]] | None = None,
+        error: Exception | None = None,
+    ) -> None:
+        with self._cond:
+            for text, _ in batch:
+                self._inflight.pop(text, None)
+        record_embed_batch(len(batch))
+        for i, (_, future) in enumerate(batch):
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(vectors[i])
+
+    def close(self) -> None:
+        """
+        Отправляет оставшуюся очередь и останавливает диспетчер.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    # ---------- интерфейс клиента эмбеддингов ----------
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed_batch(texts)
+
+    async def aembed_text(self, text: str) -> List[float]:
+        # shield: отмена одного запроса не должна отменять Future, который ждут другие
+        return await asyncio.shield(asyncio.wrap_future(self.submit(text)))
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self.client.aembed_batch(texts)
@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+
+class EmbeddingCache:
+    """
+    Двухуровневый кэш эмбеддингов:
+    - ограниченный LRU в памяти;
+    - постоянное хранилище на диске (SQLite, вектор хранится как float32 BLOB).
+
+    Ключ записи — (model, dimensions, sha256(text)), поэтому смена модели
+    или размерности никогда не вернёт "чужой" вектор.
+    """
+
+    # SQLite ограничивает число параметров в одном запросе
+    _SQL_CHUNK = 500
+
+    def __init__(self, path: str | None = None, max_memory_items: int = 10_000) -> None:
+        self.max_memory_items = max_memory_items
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn: sqlite3.Connection | None = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # соединение используется из нескольких потоков, доступ защищён self._lock
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " dimensions INTEGER NOT NULL,"
+                " vector BLOB NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_model ON embeddings(model)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, dimensions: int | None, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{dimensions or 0}:{digest}"
+
+    @staticmethod
+    def _encode(vector: Sequence[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes) -> List[float]:
+        values = array("f")
+        values.frombytes(blob)
+        return values.tolist()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Возвращает векторы для ключей в том же порядке; None — промах.
+        """
+        result: List[Optional[List[float]]] = [None] * len(keys)
+
+        with self._lock:
+            disk_lookup: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    result[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                missing = list(disk_lookup)
+                for start in range(0, len(missing), self._SQL_CHUNK):
+                    part = missing[start: start + self._SQL_CHUNK]
+                    placeholders = ",".join("?" * len(part))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        part,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = self._decode(blob)
+                        self._remember(key, vector)
+                        for i in disk_lookup.pop(key):
+                            result[i] = vector
+                            self.disk_hits += 1
+
+            self.misses += sum(len(positions) for positions in disk_lookup.values())
+
+        return result
+
+    def put_many(self, entries: Sequence[Tuple[str, str, int | None, List[float]]]) -> None:
+        """
+        entries: список (key, model, dimensions, vector).
+        """
+        if not entries:
+            return
+
+        with self._lock:
+            for key, _, _, vector in entries:
+                self._remember(key, vector)
+
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector) VALUES (?, ?, ?, ?)",
+                    [
+                        (key, model, dimensions or 0, self._encode(vector))
+                        for key, model, dimensions, vector in entries
+                    ],
+                )
+                self._conn.commit()
+
+    def invalidate(self, model: str | None = None) -> int:
+        """
+        Удаляет записи указанной модели (или все, если model=None).
+        Возвращает число удалённых записей на диске.
+        """
+        with self._lock:
+            if model is None:
+                self._memory.clear()
+            else:
+                prefix = f"{model}:"
+                for key in [k for k in self._memory if k.startswith(prefix)]:
+                    del self._memory[key]
+
+            if self._conn is None:
+                return 0
+
+            if model is None:
+                cur = self._conn.execute("DELETE FROM embeddings")
+            else:
+                cur = self._conn.execute("DELETE FROM embeddings WHERE model = ?", (model,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            disk_items = 0
+            if self._conn is not None:
+                disk_items = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hits": self.memory_hits + self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_items": disk_items,
+            }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Управление кэшем эмбеддингов")
+    parser.add_argument("--path", default=settings.embedding_cache_path)
+    parser.add_argument("--invalidate", metavar="MODEL", help="удалить записи модели")
+    parser.add_argument("--invalidate-all", action="store_true", help="очистить кэш целиком")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(path=args.path)
+    if args.invalidate_all:
+        print(f"Removed {cache.invalidate()} cached embeddings")
+    elif args.invalidate:
+        print(f"Removed {cache.invalidate(args.invalidate)} cached embeddings of model '{args.invalidate}'")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
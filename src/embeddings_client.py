@@ -1,16 +1,28 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 import os
 
-from openai import OpenAI
-# from .config import settings  # если не используется, можно оставить закомментированным
+import numpy as np
+from openai import AsyncOpenAI
+
+from .clients import get_async_openai_client, get_openai_client
+from .config import settings
+from .embedding_cache import EmbeddingCache
+from .metrics import record_tokens
 
 
 class EmbeddingsClient:
-    def __init__(self) -> None:
+    def __init__(self, cache: EmbeddingCache | None = None, dimensions: int | None = None) -> None:
         """
         Клиент эмбеддингов, который умеет работать:
         - либо напрямую с OpenAI (через OPENAI_API_KEY),
         - либо через EPAM ai-proxy (через AZURE_OPENAI_*).
+
+        Все запросы идут через кэш эмбеддингов (см. EmbeddingCache),
+        если он не выключен через EMBEDDING_CACHE_ENABLED=false.
+        HTTP-соединения — общий keep-alive пул процесса (см. clients.py).
+
+        dimensions — размерность векторов от API (параметр dimensions моделей
+        text-embedding-3); None или EMBEDDING_MODEL_DIM — полная размерность модели.
         """
 
         openai_key = os.getenv("OPENAI_API_KEY")
@@ -18,7 +30,8 @@ class EmbeddingsClient:
 
         if openai_key:
             # Вариант 1: обычный OpenAI
-            self.client = OpenAI(api_key=openai_key)
+            self.client = get_openai_client(openai_key)
+            self._async_credentials = (openai_key, None)
             # стандартная модель эмбеддингов
             self.model = "text-embedding-3-small"
             print("[EmbeddingsClient] Using direct OpenAI (text-embedding-3-small).")
@@ -27,10 +40,8 @@ class EmbeddingsClient:
             endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "https://ai-proxy.lab.epam.com")
             deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small-1")
 
-            self.client = OpenAI(
-                api_key=azure_key,
-                base_url=f"{endpoint}/v1",
-            )
+            self.client = get_openai_client(azure_key, base_url=f"{endpoint}/v1")
+            self._async_credentials = (azure_key, f"{endpoint}/v1")
             self.model = deployment
             print(f"[EmbeddingsClient] Using AI proxy: {endpoint}, deployment={deployment}")
         else:
@@ -39,30 +50,218 @@ class EmbeddingsClient:
                 "Set OPENAI_API_KEY for direct OpenAI or AZURE_OPENAI_API_KEY for ai-proxy."
             )
 
-    def embed_text(self, text: str) -> List[float]:
+        # None = размерность модели по умолчанию (параметр не передаётся в API)
+        self.dimensions: int | None = None
+        if dimensions and dimensions != settings.embedding_model_dim:
+            if "text-embedding-3" not in self.model:
+                raise ValueError(
+                    f"Model '{self.model}' does not support dimensions={dimensions}; "
+                    "use EMBEDDING_DIM_MODE=truncate or a text-embedding-3 model."
+                )
+            self.dimensions = dimensions
+
+        if cache is None and settings.embedding_cache_enabled:
+            cache = EmbeddingCache(
+                path=settings.embedding_cache_path,
+                max_memory_items=settings.embedding_cache_memory_items,
+            )
+        self.cache = cache
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # AsyncOpenAI привязан к event loop: берём клиент текущего loop (clients.py)
+        return get_async_openai_client(*self._async_credentials)
+
+    def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Прямой запрос к API без кэша. Порядок ответа = порядок texts.
+        """
         response = self.client.embeddings.create(
             model=self.model,
-            input=[text],
+            input=texts,
+            **self._dimensions_kwargs(),
+        )
+        record_tokens("embedding", response.usage)
+        return [item.embedding for item in response.data]
+
+    async def _arequest_embeddings(self, texts: List[str]) -> List[List[float]]:
+        response = await self.async_client.embeddings.create(
+            model=self.model,
+            input=texts,
+            **self._dimensions_kwargs(),
+        )
+        record_tokens("embedding", response.usage)
+        return [item.embedding for item in response.data]
+
+    def _dimensions_kwargs(self) -> Dict[str, Any]:
+        return {"dimensions": self.dimensions} if self.dimensions else {}
+
+    def _lookup_cache(
+        self, texts: List[str]
+    ) -> Tuple[List[str], List[Optional[List[float]]], Dict[str, str]]:
+        """
+        Ищет тексты в кэше. Возвращает ключи, найденные векторы (None — промах)
+        и уникальные промахи key -> text, которые нужно запросить у API.
+        """
+        keys = [EmbeddingCache.make_key(self.model, self.dimensions, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        return keys, vectors, missing
+
+    def _fill_from_api(
+        self,
+        keys: List[str],
+        vectors: List[Optional[List[float]]],
+        missing: Dict[str, str],
+        fresh: List[List[float]],
+    ) -> List[List[float]]:
+        fresh_by_key = dict(zip(missing.keys(), fresh))
+        self.cache.put_many(
+            [(key, self.model, self.dimensions, vec) for key, vec in fresh_by_key.items()]
         )
-        return response.data[0].embedding
+        return [
+            vec if vec is not None else fresh_by_key[key]
+            for key, vec in zip(keys, vectors)
+        ]
 
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
 
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
         """
         Получает эмбеддинги для списка текстов.
         Порядок эмбеддингов соответствует порядку текстов.
+
+        В API уходят только промахи кэша (и каждый уникальный текст — один раз).
         """
         if not texts:
             return []
 
-        # ВАЖНО: параметры должны быть такими же, как в твоём embed()
-        response = self.client.embeddings.create(
-            model=self.model,   # или deployment/engine — как у тебя в embed()
-            input=texts,
-        )
+        if self.cache is None:
+            return self._request_embeddings(texts)
 
-        return [item.embedding for item in response.data]
+        keys, vectors, missing = self._lookup_cache(texts)
+        if not missing:
+            return vectors
+        fresh = self._request_embeddings(list(missing.values()))
+        return self._fill_from_api(keys, vectors, missing, fresh)
+
+    async def aembed_text(self, text: str) -> List[float]:
+        return (await self.aembed_batch([text]))[0]
 
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Асинхронный вариант embed_batch (AsyncOpenAI), с тем же кэшем.
+        """
+        if not texts:
+            return []
+
+        if self.cache is None:
+            return await self._arequest_embeddings(texts)
+
+        keys, vectors, missing = self._lookup_cache(texts)
+        if not missing:
+            return vectors
+        fresh = await self._arequest_embeddings(list(missing.values()))
+        return self._fill_from_api(keys, vectors, missing, fresh)
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self.cache.stats() if self.cache is not None else {}
+
+    def invalidate_cache(self, model: str | None = None) -> int:
+        """
+        Сбрасывает кэш для модели (по умолчанию — текущей модели клиента).
+        """
+        if self.cache is None:
+            return 0
+        return self.cache.invalidate(model or self.model)
+
+
+def truncate_embeddings(vectors: List[List[float]], dim: int) -> List[List[float]]:
+    """
+    Matryoshka-усечение: первые dim координат, затем L2-нормировка
+    (косинус по усечённым векторам сохраняет смысл для моделей text-embedding-3).
+    """
+    if not vectors or len(vectors[0]) <= dim:
+        return vectors
+    matrix = np.asarray(vectors, dtype=np.float32)[:, :dim]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-12)).tolist()
+
+
+class MatryoshkaEmbeddings:
+    """
+    Обёртка над любым клиентом эмбеддингов: полные векторы клиента
+    (и его кэш) -> усечённые до dim. Остальные атрибуты — от исходного клиента.
+    """
+
+    def __init__(self, client, dim: int) -> None:
+        self.client = client
+        self.dim = dim
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return truncate_embeddings(self.client.embed_batch(texts), self.dim)
+
+    async def aembed_text(self, text: str) -> List[float]:
+        return (await self.aembed_batch([text]))[0]
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return truncate_embeddings(await self.client.aembed_batch(texts), self.dim)
+
+
+def create_embeddings_client(vector_size: int | None = None, batching: bool | None = None):
+    """
+    Клиент эмбеддингов по settings.embedding_backend:
+    - "openai" — EmbeddingsClient (по умолчанию);
+    - "stub"   — StubEmbeddingsClient (hashed bag-of-words).
+
+    Размерность — vector_size или settings.embedding_dim. При EMBEDDING_DIM_MODE=truncate
+    и размерности меньше полной клиент считает полные векторы (EMBEDDING_MODEL_DIM),
+    а MatryoshkaEmbeddings обрезает их.
+    batching=None — settings.embed_batching_enabled: embed_text из параллельных
+    запросов склеиваются в пачки (BatchingEmbeddings).
+    """
+    dim = vector_size or settings.embedding_dim
+    mode = settings.embedding_dim_mode.lower()
+    if mode not in ("api", "truncate"):
+        raise ValueError(f"Unknown EMBEDDING_DIM_MODE '{mode}', expected 'api' or 'truncate'")
+    truncate = mode == "truncate" and dim < settings.embedding_model_dim
+    client_dim = settings.embedding_model_dim if truncate else dim
+
+    backend = settings.embedding_backend.lower()
+    if backend == "openai":
+        client = EmbeddingsClient(dimensions=client_dim)
+    elif backend == "stub":
+        from .stubs import StubEmbeddingsClient
+
+        print(f"[EmbeddingsClient] Using stub embeddings (dim={client_dim}).")
+        client = StubEmbeddingsClient(vector_size=client_dim, latency_s=settings.stub_embed_latency_s)
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected 'openai' or 'stub'")
+
+    if truncate:
+        print(f"[EmbeddingsClient] Truncating {client_dim}-dim embeddings to {dim}.")
+        client = MatryoshkaEmbeddings(client, dim)
+
+    if settings.embed_batching_enabled if batching is None else batching:
+        from .embedding_batcher import BatchingEmbeddings
+
+        print(
+            f"[EmbeddingsClient] Micro-batching embed_text: window {settings.embed_batch_window_ms:g} ms, "
+            f"up to {settings.embed_batch_max_items} texts."
+        )
+        client = BatchingEmbeddings(client)
+    return client
 
 
 if __name__ == "__main__":
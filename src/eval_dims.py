@@ -0,0 +1,110 @@
+"""
+Hit@k в зависимости от размерности эмбеддингов (Matryoshka-усечение).
+
+Запуск:
+    python -m src.eval_dims --dims 256 512 1024 1536 --json dims.json
+
+Чанки из data/processed/chunks.jsonl и вопросы из data/eval эмбеддятся
+один раз в полной размерности модели (EMBEDDING_MODEL_DIM, через кэш
+эмбеддингов); для каждой размерности векторы обрезаются с перенормировкой
+(truncate_embeddings) и кладутся в индекс в памяти. Для каждой размерности:
+- Hit@k / MRR dense-поиска по normalize_question (EvalEngine);
+- задержка поиска p50/p95;
+- память индекса: float32-матрица и оценка для Qdrant (CollectionLayout из Settings).
+
+Параметр dimensions у text-embedding-3 делает то же усечение на стороне API,
+так что результат переносится на EMBEDDING_DIM_MODE=api.
+"""
+import argparse
+import json
+from typing import Any, Dict, List
+
+from .config import ROOT_DIR, settings
+from .embeddings_client import MatryoshkaEmbeddings, create_embeddings_client, truncate_embeddings
+from .eval_engine import EvalEngine, Strategy, write_json
+from .ingest import load_chunks
+from .local_vector_index import LocalVectorIndex
+from .text_utils import normalize_question
+from .vector_db_client import CollectionLayout
+
+
+def load_queries() -> List[Dict[str, Any]]:
+    return [
+        item
+        for name in ("queries.json", "queries_typos.json")
+        for item in json.loads((ROOT_DIR / "data" / "eval" / name).read_text(encoding="utf-8"))
+    ]
+
+
+def evaluate_dims(dims: List[int], k: int = 5, batch_size: int = 256) -> Dict[str, Any]:
+    chunks = load_chunks()
+    queries = load_queries()
+    full_dim = settings.embedding_model_dim
+    base = create_embeddings_client(vector_size=full_dim)
+
+    chunk_vectors: List[List[float]] = []
+    for i in range(0, len(chunks), batch_size):
+        chunk_vectors.extend(base.embed_batch([c["text"] for c in chunks[i: i + batch_size]]))
+    payloads = [c["metadata"] | {"text": c["text"], "chunk_id": c["id"]} for c in chunks]
+    layout = CollectionLayout()
+    top_ks = sorted({1, 3, k})
+
+    rows: List[Dict[str, Any]] = []
+    for dim in sorted(dims):
+        if dim > full_dim:
+            raise ValueError(f"dim {dim} is larger than EMBEDDING_MODEL_DIM={full_dim}")
+        index = LocalVectorIndex(index_dir=None, vector_size=dim)
+        index.upsert_points(
+            ids=[c["id"] for c in chunks],
+            vectors=truncate_embeddings(chunk_vectors, dim),
+            payloads=payloads,
+        )
+        engine = EvalEngine(
+            emb_client=MatryoshkaEmbeddings(base, dim),
+            vec_client=index,
+            top_ks=top_ks,
+            batch_size=batch_size,
+        )
+        report = engine.run(queries, [Strategy("dense", "dense", text=normalize_question)])
+        row = report["strategies"]["dense"]
+        rows.append({
+            "dim": dim,
+            **row["metrics"],
+            "p50_ms": row["latency_ms"]["p50"],
+            "p95_ms": row["latency_ms"]["p95"],
+            "index_bytes": len(chunks) * dim * 4,
+            "qdrant_ram_bytes": layout.estimate_memory(len(chunks), dim)["ram_bytes"],
+        })
+    return {"chunks": len(chunks), "queries": len(queries), "model_dim": full_dim, "k": k, "rows": rows}
+
+
+def print_chart(report: Dict[str, Any], width: int = 40) -> None:
+    k = report["k"]
+    print(
+        f"\n=== Hit@{k} vs embedding dim ({report['chunks']} chunks, {report['queries']} queries) ===\n"
+        f"{'dim':>6}{f'hit@{k}':>8}{'mrr':>7}{'p50 ms':>8}{'index KB':>10}{'qdrant KB':>11}  hit@{k}"
+    )
+    for row in report["rows"]:
+        bar = "#" * round(row[f"hit@{k}"] * width)
+        print(
+            f"{row['dim']:>6}{row[f'hit@{k}']:>8.3f}{row['mrr']:>7.3f}{row['p50_ms']:>8.2f}"
+            f"{row['index_bytes'] / 1024:>10.1f}{row['qdrant_ram_bytes'] / 1024:>11.1f}  {bar}"
+        )
+
+    best = max(row[f"hit@{k}"] for row in report["rows"])
+    smallest = next(row["dim"] for row in report["rows"] if row[f"hit@{k}"] >= best - 0.01)
+    print(f"Smallest dim within 0.01 of best hit@{k}: {smallest}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hit@k по размерностям эмбеддингов")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1024, 1536])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--json", dest="json_path", default=None, help="куда сохранить отчёт")
+    args = parser.parse_args()
+
+    report = evaluate_dims(args.dims, k=args.k, batch_size=args.batch_size)
+    print_chart(report)
+    if args.json_path:
+        write_json(report, args.json_path)
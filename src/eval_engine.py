@@ -0,0 +1,312 @@
+"""
+Общий движок оценки поиска для eval_rag и eval_typos.
+
+- тексты запросов всех стратегий (сырой вопрос, нормализованный, ...)
+  собираются в одно множество и эмбеддятся один раз, батчами;
+- векторы переиспользуются всеми стратегиями, поиск идёт пачками
+  (VectorBackend.search_batch);
+- метрики: Hit@k, MRR, nDCG@k (один gold source_id на запрос), среднее число
+  разных source_id в выдаче и задержка поиска на запрос p50/p95 для каждой стратегии;
+- отчёт — таблица в консоли и JSON (write_json).
+
+Задержка пакетного поиска делится поровну между запросами пачки,
+части, которые считаются по одному запросу (BM25, RRF), меряются отдельно.
+"""
+import json
+import math
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .bm25_index import BM25Index
+from .category_router import CategoryRouter
+from .config import settings
+from .diversify import mmr_select
+from .fusion import reciprocal_rank_fusion
+from .vector_backend import VectorBackend
+
+
+@dataclass
+class Strategy:
+    """
+    name     — имя в отчёте;
+    kind     — "dense", "lexical" или "hybrid";
+    text     — какой текст запроса искать (например, normalize_question);
+    category — фильтр по категории для dense-поиска (None — без фильтра);
+    routed   — категорию выбирает CategoryRouter по вектору запроса (как в RAGPipeline);
+    diversify — top-k выбирается MMR из mmr_candidates кандидатов (как в RAGPipeline
+               при MMR_ENABLED=true).
+    """
+    name: str
+    kind: str
+    text: Callable[[str], str]
+    category: Callable[[str], str | None] | None = None
+    routed: bool = False
+    diversify: bool = False
+
+
+def first_rank(retrieved_source_ids: Sequence[str | None], gold_source_id: str) -> int | None:
+    """
+    Позиция (с 1) первого чанка нужного документа или None.
+    """
+    for rank, source_id in enumerate(retrieved_source_ids, start=1):
+        if source_id == gold_source_id:
+            return rank
+    return None
+
+
+def query_metrics(rank: int | None, top_ks: Sequence[int]) -> Dict[str, float]:
+    """
+    Метрики одного запроса по позиции gold-документа.
+    Релевантный документ один, поэтому IDCG = 1 и nDCG@k = 1 / log2(rank + 1).
+    """
+    metrics: Dict[str, float] = {}
+    for k in top_ks:
+        hit = rank is not None and rank <= k
+        metrics[f"hit@{k}"] = 1.0 if hit else 0.0
+        metrics[f"ndcg@{k}"] = 1.0 / math.log2(rank + 1) if hit else 0.0
+    metrics["mrr"] = 1.0 / rank if rank is not None else 0.0
+    return metrics
+
+
+class EvalEngine:
+    def __init__(
+        self,
+        emb_client,
+        vec_client: VectorBackend,
+        bm25: BM25Index | None = None,
+        top_ks: Sequence[int] = (1, 3, 5),
+        batch_size: int = 256,
+        router: CategoryRouter | None = None,
+    ) -> None:
+        self.emb_client = emb_client
+        self.vec_client = vec_client
+        self.bm25 = bm25
+        self.router = router
+        self.top_ks = list(top_ks)
+        self.batch_size = batch_size
+
+    # ---------- эмбеддинги ----------
+
+    def embed_all(self, texts: Sequence[str]) -> Dict[str, List[float]]:
+        unique = list(dict.fromkeys(texts))
+        vectors: List[List[float]] = []
+        for i in range(0, len(unique), self.batch_size):
+            vectors.extend(self.emb_client.embed_batch(unique[i: i + self.batch_size]))
+        return dict(zip(unique, vectors))
+
+    # ---------- поиск ----------
+
+    def _dense(
+        self,
+        vectors: List[List[float]],
+        categories: List[str | None] | None,
+        limit: int,
+        with_vectors: bool = False,
+    ) -> Tuple[List[List[Dict[str, Any]]], List[float]]:
+        """
+        Пачками по batch_size; возвращает payload'ы хитов (плюс score и, с with_vectors,
+        vector) и задержку на запрос.
+        """
+        results: List[List[Dict[str, Any]]] = []
+        latencies: List[float] = []
+        for i in range(0, len(vectors), self.batch_size):
+            batch = vectors[i: i + self.batch_size]
+            started = time.perf_counter()
+            hits = self.vec_client.search_batch(
+                query_vectors=batch,
+                limit=limit,
+                categories=categories[i: i + self.batch_size] if categories else None,
+                with_vectors=with_vectors,
+            )
+            per_query = (time.perf_counter() - started) / len(batch)
+            for query_hits in hits:
+                results.append([
+                    (hit.payload or {})
+                    | {"chunk_id": (hit.payload or {}).get("chunk_id") or str(hit.id), "score": hit.score}
+                    | ({"vector": hit.vector} if with_vectors else {})
+                    for hit in query_hits
+                ])
+                latencies.append(per_query)
+        return results, latencies
+
+    def _lexical(self, texts: List[str], limit: int) -> Tuple[List[List[Dict[str, Any]]], List[float]]:
+        results: List[List[Dict[str, Any]]] = []
+        latencies: List[float] = []
+        for text in texts:
+            started = time.perf_counter()
+            results.append([self.bm25.docs[doc_no] for doc_no, _ in self.bm25.search(text, limit=limit)])
+            latencies.append(time.perf_counter() - started)
+        return results, latencies
+
+    @staticmethod
+    def _fuse(dense: List[Dict[str, Any]], lexical: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        by_chunk = {doc["chunk_id"]: doc for doc in dense + lexical}
+        fused = reciprocal_rank_fusion(
+            [[d["chunk_id"] for d in dense], [d["chunk_id"] for d in lexical]],
+            k=settings.rrf_k,
+        )
+        return [by_chunk[chunk_id] | {"score": score} for chunk_id, score in fused]
+
+    def _diversify(self, docs: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+        order = mmr_select(
+            relevance=[d["score"] for d in docs],
+            vectors=[d.get("vector") for d in docs],
+            k=k,
+            lambda_mult=settings.mmr_lambda,
+            groups=[d.get("source_id") for d in docs],
+            max_per_group=settings.mmr_max_per_source,
+        )
+        return [docs[i] for i in order]
+
+    def route(self, vectors: List[List[float]]) -> Tuple[List[str | None], List[float]]:
+        """
+        Категории CategoryRouter для запросов и время маршрутизации на запрос.
+        """
+        if self.router is None:
+            return [None] * len(vectors), [0.0] * len(vectors)
+        started = time.perf_counter()
+        categories = [route.category for route in self.router.route_batch(vectors)]
+        per_query = (time.perf_counter() - started) / max(len(vectors), 1)
+        return categories, [per_query] * len(vectors)
+
+    def retrieve(
+        self,
+        strategy: Strategy,
+        questions: List[str],
+        vectors: Dict[str, List[float]],
+    ) -> Tuple[List[List[Dict[str, Any]]], List[float]]:
+        texts = [strategy.text(q) for q in questions]
+        max_k = max(self.top_ks)
+
+        if strategy.kind == "lexical":
+            return self._lexical(texts, max_k)
+
+        categories = [strategy.category(q) for q in questions] if strategy.category else None
+        route_lat = [0.0] * len(texts)
+        if strategy.routed:
+            categories, route_lat = self.route([vectors[t] for t in texts])
+
+        dense_limit = max(max_k, settings.mmr_candidates) if strategy.diversify else max_k
+        if strategy.kind == "hybrid":
+            dense_limit = max(dense_limit, settings.hybrid_candidates)
+        dense, dense_lat = self._dense([vectors[t] for t in texts], categories, dense_limit, strategy.diversify)
+        dense_lat = [d + r for d, r in zip(dense_lat, route_lat)]
+
+        if strategy.kind == "dense":
+            if not strategy.diversify:
+                return dense, dense_lat
+            results: List[List[Dict[str, Any]]] = []
+            latencies: List[float] = []
+            for docs, d_lat in zip(dense, dense_lat):
+                started = time.perf_counter()
+                results.append(self._diversify(docs, max_k))
+                latencies.append(d_lat + time.perf_counter() - started)
+            return results, latencies
+
+        if strategy.kind == "hybrid":
+            lexical, lexical_lat = self._lexical(texts, max(max_k, settings.hybrid_candidates))
+            results = []
+            latencies = []
+            for d, l, d_lat, l_lat in zip(dense, lexical, dense_lat, lexical_lat):
+                started = time.perf_counter()
+                fused = self._fuse(d, l)
+                results.append(self._diversify(fused, max_k) if strategy.diversify else fused)
+                latencies.append(d_lat + l_lat + time.perf_counter() - started)
+            return results, latencies
+
+        raise ValueError(f"Unknown strategy kind '{strategy.kind}'")
+
+    # ---------- прогон ----------
+
+    def run(self, queries: List[Dict[str, Any]], strategies: List[Strategy]) -> Dict[str, Any]:
+        """
+        queries: [{"id", "question", "gold_source_id"}, ...]
+        Пропускает lexical/hybrid стратегии, если нет индекса BM25.
+        """
+        strategies = [s for s in strategies if s.kind == "dense" or self.bm25 is not None]
+        questions = [q["question"] for q in queries]
+
+        started = time.perf_counter()
+        texts = [s.text(q) for s in strategies if s.kind != "lexical" for q in questions]
+        vectors = self.embed_all(texts)
+        embed_s = time.perf_counter() - started
+
+        report: Dict[str, Any] = {
+            "queries": len(queries),
+            "top_ks": self.top_ks,
+            "embedded_texts": len(vectors),
+            "embed_s": embed_s,
+            "strategies": {},
+        }
+        for strategy in strategies:
+            started = time.perf_counter()
+            retrieved, latencies = self.retrieve(strategy, questions, vectors)
+            total_s = time.perf_counter() - started
+
+            # для отчёта: какую категорию выбрал роутер (детерминированно, те же векторы)
+            routed: List[str | None] = [None] * len(questions)
+            if strategy.routed:
+                routed, _ = self.route([vectors[strategy.text(q)] for q in questions])
+
+            per_query: List[Dict[str, Any]] = []
+            for query, docs, category in zip(queries, retrieved, routed):
+                source_ids = [d.get("source_id") for d in docs]
+                rank = first_rank(source_ids, query["gold_source_id"])
+                per_query.append({
+                    "id": query["id"],
+                    "rank": rank,
+                    "top_source_ids": source_ids[: max(self.top_ks)],
+                    **({"routed_category": category} if strategy.routed else {}),
+                    **query_metrics(rank, self.top_ks),
+                })
+
+            metric_names = [f"hit@{k}" for k in self.top_ks] + ["mrr"] + [f"ndcg@{k}" for k in self.top_ks]
+            lat_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+            report["strategies"][strategy.name] = {
+                "kind": strategy.kind,
+                "metrics": {
+                    name: float(np.mean([q[name] for q in per_query])) if per_query else 0.0
+                    for name in metric_names
+                },
+                "latency_ms": {
+                    "p50": float(np.percentile(lat_ms, 50)),
+                    "p95": float(np.percentile(lat_ms, 95)),
+                },
+                "total_s": total_s,
+                "distinct_sources": float(np.mean([len(set(q["top_source_ids"])) for q in per_query]))
+                if per_query else 0.0,
+                **({"routed_share": sum(c is not None for c in routed) / max(len(routed), 1)}
+                   if strategy.routed else {}),
+                "per_query": per_query,
+            }
+        return report
+
+
+def print_report(report: Dict[str, Any], title: str = "Retrieval metrics") -> None:
+    top_ks = report["top_ks"]
+    columns = [f"hit@{k}" for k in top_ks] + ["mrr", f"ndcg@{top_ks[-1]}"]
+    print(
+        f"\n=== {title} ({report['queries']} queries, "
+        f"{report['embedded_texts']} texts embedded in {report['embed_s']:.2f}s) ==="
+    )
+    header = (
+        f"{'strategy':<16}" + "".join(f"{c:>9}" for c in columns)
+        + f"{f'src@{top_ks[-1]}':>9}{'p50 ms':>9}{'p95 ms':>9}"
+    )
+    print(header)
+    for name, row in report["strategies"].items():
+        values = "".join(f"{row['metrics'][c]:>9.3f}" for c in columns)
+        print(
+            f"{name:<16}{values}{row['distinct_sources']:>9.2f}"
+            f"{row['latency_ms']['p50']:>9.2f}{row['latency_ms']['p95']:>9.2f}"
+        )
+
+
+def write_json(report: Dict[str, Any], path: str | Path) -> None:
+    with Path(path).open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Saved report to {path}")
@@ -1,9 +1,14 @@
+import argparse
 import json
+from collections import Counter
 from pathlib import Path
 from typing import List, Dict, Any
 
-from .embeddings_client import EmbeddingsClient
-from .vector_db_client import VectorDBClient
+from .bm25_index import BM25Index
+from .category_router import CategoryRouter
+from .embeddings_client import create_embeddings_client
+from .eval_engine import EvalEngine, Strategy, print_report, write_json
+from .vector_db_client import create_vector_client
 from .text_utils import normalize_question
 
 
@@ -58,148 +63,88 @@ def classify_category(question: str) -> str | None:
 
 
 
-def compute_hits_for_query(
-    question: str,
-    gold_source_id: str,
-    emb_client: EmbeddingsClient,
-    vec_client: VectorDBClient,
-    top_ks: List[int],
-) -> Dict[int, int]:
+def build_strategies() -> List[Strategy]:
     """
-    Возвращает словарь: {k: 0/1}, попал ли gold_source_id в top-k.
+    - baseline: dense по исходному вопросу, без фильтров;
+    - category: то же + фильтр по категории, если classify_category её распознал;
+    - lexical:  BM25 по нормализованному вопросу;
+    - hybrid:   dense + BM25 по нормализованному вопросу, слияние RRF
+      (как в RAGPipeline при retrieval_mode="hybrid");
+    - routed / hybrid_routed: категорию выбирает CategoryRouter по вектору
+      запроса (нужны центроиды в коллекции, иначе фильтра нет);
+    - dense / dense_mmr, hybrid_mmr: нормализованный вопрос без и с MMR-диверсификацией
+      (MMR_CANDIDATES, MMR_LAMBDA, MMR_MAX_PER_SOURCE).
     """
-    query_vector = emb_client.embed_text(question)
-    max_k = max(top_ks)
-
-    results = vec_client.search(
-        query_vector=query_vector,
-        limit=max_k,
-        with_payload=True,
-    )
-
-    retrieved_source_ids: List[str | None] = []
-    for hit in results:
-        payload = hit.payload or {}
-        retrieved_source_ids.append(payload.get("source_id"))
-
-    hits: Dict[int, int] = {}
-    for k in top_ks:
-        subset = retrieved_source_ids[:k]
-        hits[k] = 1 if gold_source_id in subset else 0
-
-    return hits
-
-
-def compute_hits_for_query_with_category(
-    question: str,
-    gold_source_id: str,
-    emb_client: EmbeddingsClient,
-    vec_client: VectorDBClient,
-    top_ks: List[int],
-) -> Dict[int, int]:
+    return [
+        Strategy("baseline", "dense", text=lambda q: q),
+        Strategy("dense", "dense", text=normalize_question),
+        Strategy("dense_mmr", "dense", text=normalize_question, diversify=True),
+        Strategy("category", "dense", text=lambda q: q, category=classify_category),
+        Strategy("routed", "dense", text=normalize_question, routed=True),
+        Strategy("lexical", "lexical", text=normalize_question),
+        Strategy("hybrid", "hybrid", text=normalize_question),
+        Strategy("hybrid_routed", "hybrid", text=normalize_question, routed=True),
+        Strategy("hybrid_mmr", "hybrid", text=normalize_question, diversify=True),
+    ]
+
+
+def evaluate(top_ks: List[int] = [1, 3, 5], json_path: str | None = None, batch_size: int = 256) -> Dict[str, Any]:
     """
-    То же самое, что compute_hits_for_query, но:
-    - сначала определяем категорию вопроса,
-    - если нашли category, делаем search_with_category,
-    - иначе fallback на обычный search().
-    """
-    query_vector = emb_client.embed_text(question)
-    max_k = max(top_ks)
-
-    category = classify_category(question)
-
-    if category:
-        results = vec_client.search_with_category(
-            query_vector=query_vector,
-            category=category,
-            limit=max_k,
-            with_payload=True,
-        )
-    else:
-        results = vec_client.search(
-            query_vector=query_vector,
-            limit=max_k,
-            with_payload=True,
-        )
-
-    retrieved_source_ids: List[str | None] = []
-    for hit in results:
-        payload = hit.payload or {}
-        retrieved_source_ids.append(payload.get("source_id"))
-
-    hits: Dict[int, int] = {}
-    for k in top_ks:
-        subset = retrieved_source_ids[:k]
-        hits[k] = 1 if gold_source_id in subset else 0
-
-    return hits
-
-
-
-def evaluate(top_ks: List[int] = [1, 3, 5]) -> None:
-    """
-    Сравнение:
-    - baseline retrieval (без фильтров);
-    - category-aware retrieval (с фильтром по категории, если она распознана).
+    Сравнение стратегий поиска (см. build_strategies) на data/eval/queries.json.
+    Эмбеддинги всех вариантов запросов считаются один раз, поиск — пачками.
     """
     queries = load_eval_queries()
     print(f"Loaded {len(queries)} eval queries")
 
-    emb_client = EmbeddingsClient()
-    vec_client = VectorDBClient(vector_size=1536)
-
-    # Для каждого k собираем список 0/1
-    stats_baseline: Dict[int, List[int]] = {k: [] for k in top_ks}
-    stats_category: Dict[int, List[int]] = {k: [] for k in top_ks}
-
-    for q in queries:
-        qid = q["id"]
-        question = q["question"]
-        gold_source_id = q["gold_source_id"]
-
-        baseline_hits = compute_hits_for_query(
-            question=question,
-            gold_source_id=gold_source_id,
-            emb_client=emb_client,
-            vec_client=vec_client,
-            top_ks=top_ks,
-        )
-
-        category_hits = compute_hits_for_query_with_category(
-            question=question,
-            gold_source_id=gold_source_id,
-            emb_client=emb_client,
-            vec_client=vec_client,
-            top_ks=top_ks,
-        )
-
-        print(f"\nQuery {qid}: {question}")
-        print(f"  gold_source_id = {gold_source_id}")
-        print(f"  predicted_category = {classify_category(question)}")
-        for k in top_ks:
-            print(f"  Baseline Hit@{k}: {baseline_hits[k]}")
-        for k in top_ks:
-            print(f"  Category-aware Hit@{k}: {category_hits[k]}")
-
-        for k in top_ks:
-            stats_baseline[k].append(baseline_hits[k])
-            stats_category[k].append(category_hits[k])
-
-    total = len(queries)
-
-    print("\n=== Retrieval Metrics (Baseline) ===")
-    for k in top_ks:
-        hit_sum = sum(stats_baseline[k])
-        hit_rate = hit_sum / total if total > 0 else 0.0
-        print(f"Hit@{k}: {hit_sum}/{total} = {hit_rate:.3f}")
-
-    print("\n=== Retrieval Metrics (Category-aware) ===")
-    for k in top_ks:
-        hit_sum = sum(stats_category[k])
-        hit_rate = hit_sum / total if total > 0 else 0.0
-        print(f"Hit@{k}: {hit_sum}/{total} = {hit_rate:.3f}")
-
+    bm25 = BM25Index.load_if_exists()
+    if bm25 is None:
+        print("BM25 index not found (run python -m src.dataset_prep), lexical/hybrid modes skipped")
+
+    vec_client = create_vector_client()
+    router = CategoryRouter.from_backend(vec_client)
+    if router is None:
+        print("No category centroids in the collection (run python -m src.category_router build)")
+
+    engine = EvalEngine(
+        emb_client=create_embeddings_client(),
+        vec_client=vec_client,
+        bm25=bm25,
+        top_ks=top_ks,
+        batch_size=batch_size,
+        router=router,
+    )
+    report = engine.run(queries, build_strategies())
+
+    baseline = report["strategies"]["baseline"]["per_query"]
+    category = report["strategies"]["category"]["per_query"]
+    for q, base, cat in zip(queries, baseline, category):
+        if base["rank"] != cat["rank"]:
+            print(
+                f"Query {q['id']}: category={classify_category(q['question'])} "
+                f"rank {base['rank']} -> {cat['rank']}"
+            )
+
+    print_report(report)
+    for name in ("routed", "hybrid_routed"):
+        if name in report["strategies"]:
+            routes = [q["routed_category"] for q in report["strategies"][name]["per_query"]]
+            print(f"{name}: routed {report['strategies'][name]['routed_share']:.0%} of queries, "
+                  f"categories {dict(Counter(c or 'none' for c in routes))}")
+    k = top_ks[-1]
+    for plain, mmr in (("dense", "dense_mmr"), ("hybrid", "hybrid_mmr")):
+        if mmr in report["strategies"]:
+            before, after = report["strategies"][plain], report["strategies"][mmr]
+            print(f"{mmr}: hit@{k} {before['metrics'][f'hit@{k}']:.3f} -> {after['metrics'][f'hit@{k}']:.3f}, "
+                  f"sources in top-{k} {before['distinct_sources']:.2f} -> {after['distinct_sources']:.2f}")
+    if json_path:
+        write_json(report, json_path)
+    return report
 
 
 if __name__ == "__main__":
-    evaluate()
+    parser = argparse.ArgumentParser(description="Оценка поиска на data/eval/queries.json")
+    parser.add_argument("--top-ks", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--json", dest="json_path", default=None, help="куда сохранить отчёт")
+    args = parser.parse_args()
+    evaluate(top_ks=args.top_ks, json_path=args.json_path, batch_size=args.batch_size)
@@ -1,9 +1,12 @@
+import argparse
 import json
 from pathlib import Path
 from typing import List, Dict, Any
 
-from .embeddings_client import EmbeddingsClient
-from .vector_db_client import VectorDBClient
+from .bm25_index import BM25Index
+from .embeddings_client import create_embeddings_client
+from .eval_engine import EvalEngine, Strategy, print_report, write_json
+from .vector_db_client import create_vector_client
 from .text_utils import normalize_question
 
 
@@ -16,95 +19,59 @@ def load_noisy_queries() -> List[Dict[str, Any]]:
         return json.load(f)
 
 
-def hit_at_k_for_query(
-    question: str,
-    gold_source_id: str,
-    emb_client: EmbeddingsClient,
-    vec_client: VectorDBClient,
-    k: int,
-    use_normalization: bool,
-) -> int:
+def build_strategies() -> List[Strategy]:
     """
-    Считает Hit@k для одного вопроса.
-    use_normalization=False  -> baseline (без нормализации)
-    use_normalization=True   -> improved (с normalize_question)
+    - baseline: dense по вопросу как есть (с опечатками);
+    - improved: dense по normalize_question;
+    - hybrid:   dense + BM25 по normalize_question (как в RAGPipeline);
+    - dense_mmr, hybrid_mmr: improved и hybrid с MMR-диверсификацией
+      (MMR_CANDIDATES, MMR_LAMBDA, MMR_MAX_PER_SOURCE).
     """
+    return [
+        Strategy("baseline", "dense", text=lambda q: q),
+        Strategy("improved", "dense", text=normalize_question),
+        Strategy("dense_mmr", "dense", text=normalize_question, diversify=True),
+        Strategy("hybrid", "hybrid", text=normalize_question),
+        Strategy("hybrid_mmr", "hybrid", text=normalize_question, diversify=True),
+    ]
 
-    if use_normalization:
-        q = normalize_question(question)
-    else:
-        q = question
-
-    query_vector = emb_client.embed_text(q)
-    results = vec_client.search(
-        query_vector=query_vector,
-        limit=k,
-        with_payload=True,
-    )
-
-    retrieved_source_ids: List[str] = []
-    for hit in results:
-        payload = hit.payload or {}
-        retrieved_source_ids.append(payload.get("source_id"))
-
-    return 1 if gold_source_id in retrieved_source_ids else 0
 
-
-def evaluate_typos(k: int = 1) -> None:
+def evaluate_typos(k: int = 1, json_path: str | None = None, batch_size: int = 256) -> Dict[str, Any]:
     queries = load_noisy_queries()
     print(f"Loaded {len(queries)} noisy queries from {TYPOS_PATH}")
 
-    emb_client = EmbeddingsClient()
-    vec_client = VectorDBClient(vector_size=1536)
-
-    baseline_hits = 0
-    improved_hits = 0
-
-    for q in queries:
-        qid = q["id"]
-        question = q["question"]
-        gold_source_id = q["gold_source_id"]
-
-        h_base = hit_at_k_for_query(
-            question=question,
-            gold_source_id=gold_source_id,
-            emb_client=emb_client,
-            vec_client=vec_client,
-            k=k,
-            use_normalization=False,
-        )
-
-        h_impr = hit_at_k_for_query(
-            question=question,
-            gold_source_id=gold_source_id,
-            emb_client=emb_client,
-            vec_client=vec_client,
-            k=k,
-            use_normalization=True,
-        )
-
-        baseline_hits += h_base
-        improved_hits += h_impr
-
-        print(f"\nQuery {qid}: {question}")
-        print(f"  gold_source_id = {gold_source_id}")
-        print(f"  Baseline Hit@{k}: {h_base}")
-        print(f"  Improved (normalized) Hit@{k}: {h_impr}")
-
-    total = len(queries)
-    base_rate = baseline_hits / total if total > 0 else 0.0
-    impr_rate = improved_hits / total if total > 0 else 0.0
-
-    print("\n=== Noisy Retrieval Metrics (Hit@1) ===")
-    print(f"Baseline: {baseline_hits}/{total} = {base_rate:.3f}")
-    print(f"Improved: {improved_hits}/{total} = {impr_rate:.3f}")
+    engine = EvalEngine(
+        emb_client=create_embeddings_client(),
+        vec_client=create_vector_client(),
+        bm25=BM25Index.load_if_exists(),
+        top_ks=sorted({1, k}),
+        batch_size=batch_size,
+    )
+    report = engine.run(queries, build_strategies())
+    print_report(report, title="Noisy retrieval metrics")
 
+    base_rate = report["strategies"]["baseline"]["metrics"][f"hit@{k}"]
+    impr_rate = report["strategies"]["improved"]["metrics"][f"hit@{k}"]
+    print(f"\nHit@{k}: baseline {base_rate:.3f}, improved {impr_rate:.3f}")
     if base_rate > 0:
         rel_gain = (impr_rate - base_rate) / base_rate * 100
         print(f"Relative improvement: {rel_gain:.1f}%")
     else:
         print("Baseline is 0, relative improvement cannot be computed.")
-        
+    for plain, mmr in (("improved", "dense_mmr"), ("hybrid", "hybrid_mmr")):
+        before, after = report["strategies"][plain], report["strategies"][mmr]
+        print(f"{mmr}: hit@{k} {before['metrics'][f'hit@{k}']:.3f} -> {after['metrics'][f'hit@{k}']:.3f}, "
+              f"sources in top-{k} {before['distinct_sources']:.2f} -> {after['distinct_sources']:.2f}")
+
+    if json_path:
+        write_json(report, json_path)
+    return report
+
 
 if __name__ == "__main__":
-    evaluate_typos(k=1)
+    parser = argparse.ArgumentParser(description="Оценка поиска на вопросах с опечатками")
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--json", dest="json_path", default=None, help="куда сохранить отчёт")
+    args = parser.parse_args()
+    evaluate_typos(k=args.k, json_path=args.json_path, batch_size=args.batch_size)
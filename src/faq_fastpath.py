@@ -0,0 +1,167 @@
+"""
+Экстрактивный ответ из FAQ без вызова LLM.
+
+Многие вопросы почти дословно повторяют вопрос из data/raw/faqs.yaml, а пересказ
+готового ответа через LLM стоит секунды. Если первый документ выдачи — чанк FAQ
+(source_type == "faq") с косинусом >= FAQ_FASTPATH_MIN_SCORE и отрывом
+>= FAQ_FASTPATH_MIN_MARGIN от лучшего документа другого источника, RAGPipeline
+возвращает сохранённый ответ (payload "answer", его кладёт dataset_prep) как есть,
+с result["extractive"] = True.
+
+Оценка — косинус векторного поиска: в hybrid-режиме doc["scores"]["dense"]
+(RRF-score для порога не годится), в lexical-режиме быстрого пути нет.
+
+Калибровка порога на data/eval/queries.json:
+    python -m src.faq_fastpath --min-precision 1.0 --json faq_calibration.json
+
+Каждый вопрос проходит RAGPipeline.retrieve (та же нормализация, режим поиска,
+маршрутизация и MMR, что при ответе); порог — наименьший, при котором доля
+верных экстрактивных ответов (FAQ == gold_source_id) не ниже --min-precision.
+"""
+import argparse
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .config import ROOT_DIR, settings
+
+
+@dataclass
+class FaqMatch:
+    source_id: str
+    answer: str
+    score: float   # косинус запроса с чанком FAQ
+    margin: float  # отрыв от лучшего документа другого источника
+
+
+def dense_score(doc: Dict[str, Any]) -> float | None:
+    """
+    Косинус векторного поиска для документа выдачи RAGPipeline;
+    None — документ нашёл только BM25.
+    """
+    if "scores" in doc:  # hybrid: исходные оценки до RRF
+        return doc["scores"].get("dense")
+    return doc["score"]
+
+
+def faq_candidate(docs: List[Dict[str, Any]]) -> FaqMatch | None:
+    """
+    Оценка и отрыв первого документа, если это FAQ с сохранённым ответом (без порогов).
+    """
+    if not docs:
+        return None
+    metadata = docs[0]["metadata"]
+    score = dense_score(docs[0])
+    if metadata.get("source_type") != "faq" or not metadata.get("answer") or score is None:
+        return None
+    # соседние чанки того же FAQ не конкуренты
+    others = [
+        other_score
+        for doc in docs[1:]
+        if doc["metadata"].get("source_id") != metadata.get("source_id")
+        and (other_score := dense_score(doc)) is not None
+    ]
+    return FaqMatch(
+        source_id=metadata.get("source_id", ""),
+        answer=metadata["answer"].strip(),
+        score=score,
+        margin=score - max(others, default=0.0),
+    )
+
+
+def match_faq(docs: List[Dict[str, Any]], min_score: float, min_margin: float) -> FaqMatch | None:
+    match = faq_candidate(docs)
+    if match is None or match.score < min_score or match.margin < min_margin:
+        return None
+    return match
+
+
+# ---------- калибровка ----------
+
+def collect(pipeline, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows = []
+    for query in queries:
+        match = faq_candidate(pipeline.retrieve(query["question"]))
+        rows.append({
+            "id": query["id"],
+            "gold_source_id": query["gold_source_id"],
+            "faq_source_id": match.source_id if match else None,
+            "score": match.score if match else None,
+            "margin": match.margin if match else None,
+            "correct": match is not None and match.source_id == query["gold_source_id"],
+        })
+    return rows
+
+
+def threshold_table(rows: List[Dict[str, Any]], min_margin: float) -> List[Dict[str, Any]]:
+    """
+    Для каждого возможного порога (оценки кандидатов) — сколько вопросов
+    получили бы экстрактивный ответ и сколько из них верно.
+    """
+    eligible = [r for r in rows if r["score"] is not None and r["margin"] >= min_margin]
+    table = []
+    for threshold in sorted({r["score"] for r in eligible}):
+        fired = [r for r in eligible if r["score"] >= threshold]
+        correct = sum(r["correct"] for r in fired)
+        table.append({
+            "threshold": threshold,
+            "fired": len(fired),
+            "hit_rate": len(fired) / len(rows),
+            "precision": correct / len(fired),
+        })
+    return table
+
+
+def pick_threshold(table: List[Dict[str, Any]], min_precision: float) -> float | None:
+    """
+    Наименьший порог с precision >= min_precision: при нём быстрый путь срабатывает чаще всего.
+    """
+    for row in table:
+        if row["precision"] >= min_precision:
+            # вниз до 4 знаков, чтобы порог не отсёк сам калибровочный вопрос
+            return math.floor(row["threshold"] * 10_000) / 10_000
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Калибровка порога экстрактивных ответов из FAQ")
+    parser.add_argument("--queries", default=str(ROOT_DIR / "data" / "eval" / "queries.json"))
+    parser.add_argument("--min-margin", type=float, default=settings.faq_fastpath_min_margin)
+    parser.add_argument("--min-precision", type=float, default=1.0)
+    parser.add_argument("--json", dest="json_path", default=None, help="куда сохранить отчёт")
+    args = parser.parse_args()
+
+    # импорт здесь: rag_pipeline сам импортирует этот модуль
+    from .rag_pipeline import RAGPipeline
+
+    queries = json.loads(Path(args.queries).read_text(encoding="utf-8"))
+    rows = collect(RAGPipeline(top_k=4), queries)
+    table = threshold_table(rows, args.min_margin)
+
+    print(f"\n=== FAQ fast path calibration ({len(rows)} queries, min margin {args.min_margin}) ===")
+    print(f"{'threshold':>10}{'fired':>7}{'hit rate':>10}{'precision':>11}")
+    for row in table:
+        print(f"{row['threshold']:>10.4f}{row['fired']:>7}{row['hit_rate']:>10.1%}{row['precision']:>11.3f}")
+
+    threshold = pick_threshold(table, args.min_precision)
+    if threshold is None:
+        print(f"No threshold reaches precision {args.min_precision}, keep FAQ_FASTPATH_ENABLED=false")
+    else:
+        row = next(r for r in table if r["threshold"] >= threshold)
+        print(
+            f"Recommended: FAQ_FASTPATH_ENABLED=true FAQ_FASTPATH_MIN_SCORE={threshold:.4f} "
+            f"FAQ_FASTPATH_MIN_MARGIN={args.min_margin} "
+            f"(hit rate {row['hit_rate']:.1%}, precision {row['precision']:.3f})"
+        )
+
+    if args.json_path:
+        report = {"min_margin": args.min_margin, "threshold": threshold, "table": table, "queries": rows}
+        with Path(args.json_path).open("w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Saved report to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
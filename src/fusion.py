@@ -0,0 +1,17 @@
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]],
+    k: int = 60,
+) -> List[Tuple[Hashable, float]]:
+    """
+    Reciprocal Rank Fusion: score(d) = sum(1 / (k + rank_i(d))), rank с 1.
+    Не зависит от шкалы score отдельных ранжировщиков (косинус vs BM25).
+    Возвращает [(ключ, score)] по убыванию score.
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,66 +1,393 @@
+import argparse
+import hashlib
 import json
+import os
+import queue
+import threading
+import time
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Tuple
 
 from tqdm import tqdm
 
+from .category_router import build_centroids
 from .config import settings
-from .embeddings_client import EmbeddingsClient
-from .vector_db_client import VectorDBClient
+from .embeddings_client import EmbeddingsClient, create_embeddings_client
+from .text_utils import estimate_tokens
+from .vector_backend import INGEST_RUN_KEY, VectorBackend
+from .vector_db_client import create_vector_client
 
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 CHUNKS_PATH = ROOT_DIR / "data" / "processed" / "chunks.jsonl"
+CHECKPOINT_PATH = ROOT_DIR / "data" / "processed" / "ingest_checkpoint.json"
 
+# Фиксированное пространство имён для UUIDv5: один и тот же чанк
+# с тем же содержимым всегда получает один и тот же ID точки в Qdrant.
+POINT_ID_NAMESPACE = uuid.UUID("5b0f7a52-3c1e-4d8e-9a63-2f4c1d7e9b10")
 
-def load_chunks() -> List[Dict[str, Any]]:
-    chunks: List[Dict[str, Any]] = []
-    with CHUNKS_PATH.open("r", encoding="utf-8") as f:
-        for line in f:
+
+def iter_chunks(
+    path: Path = CHUNKS_PATH,
+    start_offset: int = 0,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Потоково читает chunks.jsonl, начиная с байтового смещения start_offset.
+    Отдаёт пары (offset_после_строки, chunk) — по смещению можно продолжить чтение.
+    """
+    with path.open("rb") as f:
+        f.seek(start_offset)
+        while True:
+            line = f.readline()
+            if not line:
+                break
             if line.strip():
-                chunks.append(json.loads(line))
-    return chunks
+                yield f.tell(), json.loads(line)
+
+
+def load_chunks() -> List[Dict[str, Any]]:
+    return [chunk for _, chunk in iter_chunks()]
+
+
+def _file_signature(path: Path) -> Dict[str, int]:
+    stat = path.stat()
+    return {"file_size": stat.st_size, "file_mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(path: Path = CHUNKS_PATH) -> Dict[str, Any] | None:
+    """
+    Возвращает checkpoint, если он относится к текущей версии файла чанков
+    (и записан версией ingest с run_id: без него уже записанные точки
+    не отличить от устаревших).
+    """
+    if not CHECKPOINT_PATH.exists():
+        return None
+    with CHECKPOINT_PATH.open("r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("chunks_path") != str(path) or any(
+        checkpoint.get(k) != v for k, v in _file_signature(path).items()
+    ) or "run_id" not in checkpoint:
+        print("Checkpoint does not match current chunks file, ignoring it.")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    # пишем во временный файл и атомарно подменяем, чтобы сбой не оставил битый JSON
+    tmp_path = CHECKPOINT_PATH.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def content_hash(chunk: Dict[str, Any]) -> str:
+    """
+    Хэш содержимого чанка: текст + метаданные (смена категории/заголовка
+    тоже должна приводить к переиндексации).
+    """
+    data = json.dumps(
+        {"text": chunk["text"], "metadata": chunk.get("metadata", {})},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def point_id_for_chunk(chunk: Dict[str, Any], chunk_hash: str | None = None) -> str:
+    """
+    Детерминированный ID точки: UUIDv5(chunk_id + content hash).
+    """
+    chunk_hash = chunk_hash or content_hash(chunk)
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{chunk['id']}:{chunk_hash}"))
+
+
+def token_batches(
+    items: Iterable[Dict[str, Any]],
+    max_tokens: int,
+    max_items: int,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Нарезает поток элементов на батчи по оценочному числу токенов.
+    Чанк, который сам по себе больше бюджета, уходит отдельным батчем.
+    """
+    batch: List[Dict[str, Any]] = []
+    batch_tokens = 0
+    for item in items:
+        tokens = estimate_tokens(item["chunk"]["text"])
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def _to_payloads(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # в payload кладём:
+    # - исходные метаданные
+    # - текст
+    # - оригинальный chunk id (faq_wifi_001_chunk_000)
+    # - хэш содержимого (для инкрементального обновления)
+    # - ID запуска ingest (по нему удаляются устаревшие точки)
+    return [
+        item["chunk"]["metadata"]
+        | {
+            "text": item["chunk"]["text"],
+            "chunk_id": item["chunk"]["id"],
+            "content_hash": item["content_hash"],
+            INGEST_RUN_KEY: item["run_id"],
+        }
+        for item in batch
+    ]
+
+
+def skip_unchanged(
+    items: Iterable[Dict[str, Any]],
+    vec_client: VectorBackend,
+    run_id: str,
+    page_size: int = 1024,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Delta-режим: пропускает чанки, точки которых уже есть в коллекции
+    (ID точки включает хэш содержимого, значит, чанк не менялся).
+    Существование проверяется страницами по page_size ID, пропущенные точки
+    помечаются run_id без переэмбеддинга — иначе они считались бы устаревшими.
+    """
+    page: List[Dict[str, Any]] = []
 
+    def flush_page() -> Iterator[Dict[str, Any]]:
+        existing = vec_client.existing_point_ids([item["point_id"] for item in page])
+        if existing:
+            vec_client.set_payload(sorted(existing), {INGEST_RUN_KEY: run_id})
+        return (item for item in page if item["point_id"] not in existing)
 
-def ingest(batch_size: int = 16) -> None:
-    print("Loading chunks...")
-    chunks = load_chunks()
-    print(f"Total chunks: {len(chunks)}")
+    for item in items:
+        page.append(item)
+        if len(page) >= page_size:
+            yield from flush_page()
+            page = []
+    if page:
+        yield from flush_page()
 
-    emb_client = EmbeddingsClient()
-    vec_client = VectorDBClient(vector_size=1536)
+
+def run_pipeline(
+    batches: Iterable[List[Dict[str, Any]]],
+    emb_client: EmbeddingsClient,
+    vec_client: VectorBackend,
+    concurrency: int,
+    on_commit: Callable[[int, List[Dict[str, Any]]], None] | None = None,
+) -> int:
+    """
+    Конвейер ingest:
+    - до `concurrency` запросов эмбеддингов выполняются параллельно в пуле потоков;
+    - отдельный поток-потребитель пишет готовые батчи в Qdrant,
+      пока следующие батчи ещё эмбеддятся.
+
+    Батчи уходят в Qdrant в исходном порядке. Очереди ограничены,
+    поэтому в памяти одновременно не больше ~2 * concurrency батчей.
+    on_commit(batch_no, batch) вызывается после успешной записи каждого батча.
+    Возвращает число записанных чанков.
+    """
+    concurrency = max(1, concurrency)
+    upsert_queue: "queue.Queue[tuple | None]" = queue.Queue(maxsize=concurrency)
+    consumer_error: List[BaseException] = []
+    written = 0
+    committed_batches = 0
+
+    def consume() -> None:
+        nonlocal written, committed_batches
+        while True:
+            job = upsert_queue.get()
+            if job is None:
+                return
+            if consumer_error:
+                # после ошибки просто вычитываем очередь, чтобы не заблокировать producer
+                continue
+            batch, vectors = job
+            try:
+                vec_client.upsert_points(
+                    ids=[item["point_id"] for item in batch],
+                    vectors=vectors,
+                    payloads=_to_payloads(batch),
+                )
+                written += len(batch)
+                committed_batches += 1
+                if on_commit is not None:
+                    on_commit(committed_batches, batch)
+            except BaseException as e:  # noqa: BLE001 — пробрасываем в основной поток
+                consumer_error.append(e)
+
+    consumer = threading.Thread(target=consume, name="ingest-upsert", daemon=True)
+    consumer.start()
+
+    def hand_over(in_flight: deque) -> None:
+        batch, future = in_flight.popleft()
+        upsert_queue.put((batch, future.result()))
+        if consumer_error:
+            raise consumer_error[0]
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ingest-embed") as pool:
+            in_flight: deque = deque()
+            for batch in batches:
+                if len(in_flight) >= concurrency:
+                    hand_over(in_flight)
+                texts = [item["chunk"]["text"] for item in batch]
+                in_flight.append((batch, pool.submit(emb_client.embed_batch, texts)))
+            while in_flight:
+                hand_over(in_flight)
+    finally:
+        upsert_queue.put(None)
+        consumer.join()
+
+    if consumer_error:
+        raise consumer_error[0]
+    return written
+
+
+def ingest(
+    delta: bool = False,
+    concurrency: int | None = None,
+    batch_tokens: int | None = None,
+    resume: bool = False,
+) -> None:
+    """
+    Потоково загружает чанки из chunks.jsonl в Qdrant.
+
+    ID точек детерминированы, поэтому повторный запуск не создаёт дублей.
+    delta=False — переэмбеддить и перезаписать все чанки;
+    delta=True  — отправить только новые/изменённые чанки.
+    В обоих режимах точки, чанков которых больше нет, удаляются.
+
+    Файл читается лениво: в памяти одновременно только окно из ~2 * concurrency
+    батчей, память не растёт с размером корпуса. Каждая записанная (или в delta-режиме
+    подтверждённая) точка получает в payload ID запуска; после загрузки точки
+    с другим ID удаляются одним запросом с фильтром — множества ID не строятся.
+    Каждые settings.ingest_checkpoint_every батчей сохраняется checkpoint
+    (байтовое смещение, номер батча, ID запуска), с которого продолжает resume=True.
+    """
+    concurrency = concurrency or settings.ingest_concurrency
+    batch_tokens = batch_tokens or settings.ingest_batch_tokens
+
+    checkpoint = load_checkpoint(CHUNKS_PATH) if resume else None
+    if resume and checkpoint is None:
+        print("No valid checkpoint found, starting from the beginning.")
+    start_offset = checkpoint["offset"] if checkpoint else 0
+    start_batch = checkpoint["batch"] if checkpoint else 0
+    # продолжение — тот же запуск: уже записанная часть помечена этим run_id
+    run_id = checkpoint["run_id"] if checkpoint else uuid.uuid4().hex
+    signature = _file_signature(CHUNKS_PATH)
+
+    emb_client = create_embeddings_client()
+    vec_client = create_vector_client()
 
     # создаём коллекцию, если её ещё нет
     vec_client.create_collection_if_not_exists()
+    if start_offset:
+        print(f"Resuming from byte {start_offset} (after batch {start_batch})")
 
-    # батчами создаём вектора и отправляем в Qdrant
-    for i in tqdm(range(0, len(chunks), batch_size), desc="Ingesting"):
-        batch = chunks[i: i + batch_size]
+    def pending_items() -> Iterator[Dict[str, Any]]:
+        for offset, chunk in iter_chunks(CHUNKS_PATH, start_offset):
+            chunk_hash = content_hash(chunk)
+            yield {
+                "point_id": point_id_for_chunk(chunk, chunk_hash),
+                "content_hash": chunk_hash,
+                "chunk": chunk,
+                "offset": offset,
+                "run_id": run_id,
+            }
 
-        # ID для Qdrant — UUID (строкой), чтобы пройти валидацию
-        ids = [str(uuid.uuid4()) for _ in batch]
+    items = skip_unchanged(pending_items(), vec_client, run_id) if delta else pending_items()
 
-        texts = [item["text"] for item in batch]
+    progress = tqdm(
+        total=signature["file_size"],
+        initial=start_offset,
+        desc="Ingesting",
+        unit="B",
+        unit_scale=True,
+    )
+    last_offset = start_offset
 
-        # в payload кладём:
-        # - исходные метаданные
-        # - текст
-        # - оригинальный chunk id (faq_wifi_001_chunk_000)
-        payloads = [
-            item["metadata"]
-            | {
-                "text": item["text"],
-                "chunk_id": item["id"],
+    def on_commit(batch_no: int, batch: List[Dict[str, Any]]) -> None:
+        nonlocal last_offset
+        offset = batch[-1]["offset"]
+        progress.update(offset - last_offset)
+        last_offset = offset
+        if batch_no % settings.ingest_checkpoint_every:
+            return
+        # checkpoint пишем только после того, как данные надёжно сохранены
+        vec_client.flush()
+        save_checkpoint(
+            {
+                "chunks_path": str(CHUNKS_PATH),
+                **signature,
+                "offset": offset,
+                "batch": start_batch + batch_no,
+                "run_id": run_id,
+                "last_chunk_id": batch[-1]["chunk"]["id"],
             }
-            for item in batch
-        ]
+        )
+
+    started = time.perf_counter()
+    with progress:
+        written = run_pipeline(
+            token_batches(items, batch_tokens, settings.ingest_batch_max_items),
+            emb_client=emb_client,
+            vec_client=vec_client,
+            concurrency=concurrency,
+            on_commit=on_commit,
+        )
+        progress.update(signature["file_size"] - last_offset)
+    elapsed = time.perf_counter() - started
+
+    # удаляем точки устаревших/изменённых чанков: их не записал и не подтвердил этот запуск
+    deleted = vec_client.delete_points_except(INGEST_RUN_KEY, run_id)
+
+    # центроиды категорий для маршрутизации запросов (CategoryRouter)
+    if written or deleted or not vec_client.get_centroids():
+        build_centroids(vec_client)
+
+    # новая версия базы знаний — по ней сбрасываются кэши ответов
+    if written or deleted:
+        vec_client.set_kb_version(uuid.uuid4().hex)
+    vec_client.flush()
+
+    # всё записано — checkpoint больше не нужен
+    CHECKPOINT_PATH.unlink(missing_ok=True)
+
+    rate = written / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Ingestion completed: upserted {written}, deleted {deleted}, "
+        f"{elapsed:.2f}s ({rate:.1f} chunks/s, concurrency={concurrency}, batch_tokens={batch_tokens})"
+    )
 
-        vectors = emb_client.embed_batch(texts)
-        vec_client.upsert_points(ids=ids, vectors=vectors, payloads=payloads)
 
-    print("Ingestion completed.")
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Загрузка чанков в Qdrant")
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="отправлять только новые/изменённые чанки",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="продолжить с последнего checkpoint после сбоя",
+    )
+    parser.add_argument("--concurrency", type=int, default=None, help="запросов эмбеддингов одновременно")
+    parser.add_argument("--batch-tokens", type=int, default=None, help="бюджет токенов на один запрос")
+    args = parser.parse_args()
+    ingest(
+        delta=args.delta,
+        concurrency=args.concurrency,
+        batch_tokens=args.batch_tokens,
+        resume=args.resume,
+    )
 
 
 if __name__ == "__main__":
-    ingest()
+    main()
@@ -1,7 +1,11 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 import os
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from .clients import get_async_openai_client, get_openai_client
+from .config import settings
+from .metrics import record_tokens
 
 
 class LLMClient:
@@ -12,6 +16,8 @@ class LLMClient:
 
     Основной метод:
     - generate_answer(question, context_chunks) -> str
+    - agenerate_answer(...) — то же самое через AsyncOpenAI
+    - generate_answer_stream(...) -> Iterator[str] — ответ по мере генерации
     """
 
     def __init__(self) -> None:
@@ -20,7 +26,8 @@ class LLMClient:
 
         # ----- Режим 1: прямой OpenAI -----
         if openai_key:
-            self.client = OpenAI(api_key=openai_key)
+            self.client = get_openai_client(openai_key)
+            self._async_credentials = (openai_key, None)
             # можно поменять на gpt-4o, если доступен
             self.model = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
             print(f"[LLMClient] Using direct OpenAI ({self.model}).")
@@ -30,10 +37,8 @@ class LLMClient:
             endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "https://ai-proxy.lab.epam.com")
             deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-4o-mini-1")
 
-            self.client = OpenAI(
-                api_key=azure_key,
-                base_url=f"{endpoint}/v1",
-            )
+            self.client = get_openai_client(azure_key, base_url=f"{endpoint}/v1")
+            self._async_credentials = (azure_key, f"{endpoint}/v1")
             self.model = deployment
             print(f"[LLMClient] Using AI proxy: {endpoint}, deployment={deployment}")
 
@@ -43,15 +48,18 @@ class LLMClient:
                 "Set OPENAI_API_KEY for direct OpenAI or AZURE_OPENAI_API_KEY for ai-proxy."
             )
 
-    def generate_answer(
-        self,
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # AsyncOpenAI привязан к event loop: берём клиент текущего loop (clients.py)
+        return get_async_openai_client(*self._async_credentials)
+
+    @staticmethod
+    def build_messages(
         question: str,
         context_chunks: List[Dict[str, Any]],
-        temperature: float = 0.1,
-        max_tokens: int = 512,
-    ) -> str:
+    ) -> List[Dict[str, str]]:
         """
-        Генерирует ответ на вопрос, используя переданные чанки как контекст.
+        Собирает сообщения для chat.completions.
 
         context_chunks: список словарей вида:
         {
@@ -87,18 +95,96 @@ class LLMClient:
             "If there are several possible solutions, list them as steps."
         )
 
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content},
+        ]
+
+    def generate_answer(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        temperature: float = 0.1,
+        max_tokens: int = 512,
+    ) -> str:
+        """
+        Генерирует ответ на вопрос, используя переданные чанки как контекст
+        (формат чанков — см. build_messages).
+        """
         response = self.client.chat.completions.create(
             model=self.model,
             temperature=temperature,
             max_tokens=max_tokens,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content},
-            ],
+            messages=self.build_messages(question, context_chunks),
         )
+        record_tokens("llm", response.usage)
 
         return response.choices[0].message.content.strip()
 
+    def generate_answer_stream(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        temperature: float = 0.1,
+        max_tokens: int = 512,
+    ) -> Iterator[str]:
+        """
+        Потоковая генерация: отдаёт фрагменты ответа по мере того,
+        как их выдаёт модель (stream=True).
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            messages=self.build_messages(question, context_chunks),
+            stream=True,
+            # последний фрагмент потока содержит usage (без choices)
+            stream_options={"include_usage": True},
+        )
+
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                record_tokens("llm", chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def agenerate_answer(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        temperature: float = 0.1,
+        max_tokens: int = 512,
+    ) -> str:
+        """
+        Асинхронный вариант generate_answer (не блокирует поток на время генерации).
+        """
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            messages=self.build_messages(question, context_chunks),
+        )
+        record_tokens("llm", response.usage)
+
+        return response.choices[0].message.content.strip()
+
+def create_llm_client():
+    """
+    LLM по settings.llm_backend: "openai" — LLMClient, "stub" — StubLLMClient.
+    """
+    backend = settings.llm_backend.lower()
+    if backend == "openai":
+        return LLMClient()
+    if backend == "stub":
+        from .stubs import StubLLMClient
+
+        print(f"[LLMClient] Using stub LLM (latency={settings.stub_llm_latency_s}s).")
+        return StubLLMClient(latency_s=settings.stub_llm_latency_s)
+    raise ValueError(f"Unknown LLM_BACKEND '{backend}', expected 'openai' or 'stub'")
+
 
 if __name__ == "__main__":
     # Мини-тест: без RAG, просто проверяем, что LLM работает.
@@ -0,0 +1,288 @@
+"""
+Нагрузочный тест RAGPipeline: воспроизводит вопросы из data/eval/*.json
+или из журнала запросов (REQUEST_LOG_PATH, JSONL) и смотрит, сколько
+одновременных пользователей выдерживает один общий пайплайн — как в
+app_streamlit, где get_pipeline() кэширует его на процесс и каждая сессия
+вызывает его из своего потока.
+
+Запуск:
+    python -m src.loadgen --mode closed --concurrency 1 4 16 64
+    python -m src.loadgen --mode open --qps 10 50 100 --duration 20
+    python -m src.loadgen --source data/processed/requests.jsonl --backend config
+
+Режимы:
+- closed — N пользователей, каждый отправляет следующий вопрос сразу после ответа;
+- open   — запросы приходят с заданной частотой (равномерно или --poisson)
+  независимо от того, успевает ли система; задержка считается от
+  запланированного момента прихода, так что очередь тоже попадает в p95/p99.
+
+Бэкенды:
+- stub   — локальные заглушки (StubEmbeddingsClient, StubVectorDBClient,
+  StubLLMClient) с задержками из аргументов; сеть не нужна;
+- config — RAGPipeline как в приложении (EMBEDDING_BACKEND, LLM_BACKEND,
+  VECTOR_BACKEND из настроек).
+
+Отчёт на каждый уровень нагрузки: пропускная способность, доля ошибок,
+исходы (ok / cache_hit / extractive / error), перцентили общей задержки и каждой стадии
+из result["timings"]. --json сохраняет все уровни в файл.
+
+Семантический кэш по умолчанию выключен: вопросов немного, и с кэшем почти
+все запросы были бы попаданиями. --cache включает его и очищает перед каждым уровнем.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .bench_async import build_stub_pipeline
+from .config import ROOT_DIR, settings
+from .embedding_batcher import BatchingEmbeddings
+from .rag_pipeline import RAGPipeline
+from .semantic_cache import SemanticCache
+
+
+EVAL_DIR = ROOT_DIR / "data" / "eval"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_questions(source: str | None = None) -> List[str]:
+    """
+    source: None — все data/eval/*.json; файл .json — список {"question": ...};
+    файл .jsonl — журнал запросов (строки с полем "question").
+    """
+    paths = sorted(EVAL_DIR.glob("*.json")) if source is None else [Path(source)]
+    questions: List[str] = []
+    for path in paths:
+        if path.suffix == ".jsonl":
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if record.get("question"):
+                            questions.append(record["question"])
+        else:
+            with path.open("r", encoding="utf-8") as f:
+                questions.extend(item["question"] for item in json.load(f))
+    if not questions:
+        raise ValueError(f"No questions found in {source or EVAL_DIR}")
+    return questions
+
+
+class LevelStats:
+    """
+    Результаты одного уровня нагрузки; record() вызывается из рабочих потоков.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.outcomes: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def record(self, latency_s: float, result: Dict[str, Any] | None, error: Exception | None = None) -> None:
+        with self._lock:
+            self.latencies.append(latency_s)
+            if error is not None:
+                self.outcomes["error"] += 1
+                self.errors[type(error).__name__] += 1
+                return
+            if result.get("cache_hit"):
+                self.outcomes["cache_hit"] += 1
+            else:
+                self.outcomes["extractive" if result.get("extractive") else "ok"] += 1
+            for name, value in (result.get("timings") or {}).items():
+                if name.endswith("_s") and name != "total_s":
+                    self.stages.setdefault(name[:-2], []).append(value)
+
+    def summary(self, elapsed_s: float) -> Dict[str, Any]:
+        total = len(self.latencies)
+        errors = self.outcomes["error"]
+        return {
+            "requests": total,
+            "elapsed_s": elapsed_s,
+            "throughput_rps": (total - errors) / elapsed_s if elapsed_s > 0 else 0.0,
+            "error_rate": errors / total if total else 0.0,
+            "outcomes": dict(self.outcomes),
+            "errors": dict(self.errors),
+            "latency_ms": _percentiles(self.latencies),
+            "stages_ms": {name: _percentiles(values) for name, values in self.stages.items()},
+        }
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ms = np.array(values) * 1000
+    return {f"p{p}": float(np.percentile(ms, p)) for p in PERCENTILES} | {"mean": float(ms.mean())}
+
+
+def _ask(pipeline: RAGPipeline, question: str, stats: LevelStats, started: float) -> None:
+    try:
+        result = pipeline.answer_question(question)
+    except Exception as e:
+        stats.record(time.perf_counter() - started, None, e)
+        return
+    stats.record(time.perf_counter() - started, result)
+
+
+def run_closed(pipeline: RAGPipeline, questions: List[str], users: int, duration_s: float, max_requests: int) -> Dict[str, Any]:
+    """
+    users потоков-пользователей, каждый задаёт вопросы подряд, пока не
+    истечёт duration_s или не будет отправлено max_requests запросов.
+    """
+    stats = LevelStats()
+    counter = iter(range(max_requests))
+    counter_lock = threading.Lock()
+    deadline = time.perf_counter() + duration_s
+
+    def user() -> None:
+        while time.perf_counter() < deadline:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            _ask(pipeline, questions[i % len(questions)], stats, time.perf_counter())
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, name=f"loadgen-user-{n}") for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary(time.perf_counter() - started) | {"mode": "closed", "concurrency": users}
+
+
+def run_open(
+    pipeline: RAGPipeline,
+    questions: List[str],
+    qps: float,
+    duration_s: float,
+    max_requests: int,
+    max_inflight: int,
+    poisson: bool,
+    seed: int,
+) -> Dict[str, Any]:
+    """
+    Запросы приходят с частотой qps независимо от ответов. Задержка
+    отсчитывается от запланированного момента прихода: если пул из
+    max_inflight потоков занят, ожидание в очереди входит в задержку.
+    """
+    stats = LevelStats()
+    rng = random.Random(seed)
+    total = min(max_requests, int(qps * duration_s))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="loadgen") as pool:
+        arrival = started
+        for i in range(total):
+            arrival += rng.expovariate(qps) if poisson else 1.0 / qps
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_ask, pipeline, questions[i % len(questions)], stats, arrival)
+    return stats.summary(time.perf_counter() - started) | {"mode": "open", "target_qps": qps}
+
+
+def build_pipeline(args: argparse.Namespace) -> RAGPipeline:
+    if args.backend == "stub":
+        # build_stub_pipeline выключает кэш; --cache включает его с настройками SEMANTIC_CACHE_*
+        pipeline = build_stub_pipeline(args.embed_latency, args.search_latency, args.llm_latency)
+        if args.cache:
+            pipeline.semantic_cache = SemanticCache(
+                threshold=settings.semantic_cache_threshold,
+                max_size=settings.semantic_cache_max_size,
+                ttl_s=settings.semantic_cache_ttl_s,
+            )
+    else:
+        pipeline = RAGPipeline(top_k=4)
+        if not args.cache:
+            pipeline.semantic_cache = None
+    if args.embed_batching and not isinstance(pipeline.emb_client, BatchingEmbeddings):
+        pipeline.emb_client = BatchingEmbeddings(pipeline.emb_client)
+    return pipeline
+
+
+def print_level(report: Dict[str, Any]) -> None:
+    level = f"concurrency={report['concurrency']}" if report["mode"] == "closed" else f"qps={report['target_qps']:g}"
+    lat = report["latency_ms"]
+    print(
+        f"\n=== {report['mode']} {level}: {report['requests']} requests in {report['elapsed_s']:.1f}s, "
+        f"{report['throughput_rps']:.1f} req/s, errors {report['error_rate']:.1%} ==="
+    )
+    print(f"outcomes: {report['outcomes']}" + (f"  errors: {report['errors']}" if report["errors"] else ""))
+    if report.get("embed_requests") is not None:
+        print(f"embedding API calls: {report['embed_requests']} for {report['requests']} requests")
+    header = f"{'stage':<12}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES)
+    print(header)
+    rows = list(report["stages_ms"].items()) + [("total", lat)]
+    for name, values in rows:
+        if values:
+            print(f"{name:<12}" + "".join(f"{values[f'p{p}']:>10.1f}" for p in PERCENTILES))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест RAGPipeline")
+    parser.add_argument("--source", default=None, help="файл вопросов (.json) или журнал запросов (.jsonl)")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="closed: число одновременных пользователей (по уровню на значение)")
+    parser.add_argument("--qps", type=float, nargs="+", default=[5.0, 20.0],
+                        help="open: целевая частота запросов (по уровню на значение)")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на уровень")
+    parser.add_argument("--max-requests", type=int, default=10_000, help="предел запросов на уровень")
+    parser.add_argument("--max-inflight", type=int, default=256, help="open: потоков на одновременные запросы")
+    parser.add_argument("--poisson", action="store_true", help="open: пуассоновский поток вместо равномерного")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["stub", "config"], default="stub")
+    parser.add_argument("--cache", action="store_true",
+                        help="включить семантический кэш (очищается перед каждым уровнем)")
+    parser.add_argument("--embed-batching", action="store_true",
+                        help="микробатчинг embed_text (BatchingEmbeddings, EMBED_BATCH_* из настроек)")
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--search-latency", type=float, default=0.005)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--json", dest="json_path", default=None, help="куда сохранить отчёт")
+    args = parser.parse_args()
+
+    questions = load_questions(args.source)
+    pipeline = build_pipeline(args)
+    print(f"Loaded {len(questions)} questions, backend={args.backend}, mode={args.mode}")
+
+    def embed_requests() -> int | None:
+        # число запросов к API эмбеддингов знают заглушки (StubEmbeddingsClient.requests)
+        return getattr(pipeline.emb_client, "requests", None)
+
+    reports: List[Dict[str, Any]] = []
+    levels = args.concurrency if args.mode == "closed" else args.qps
+    for level in levels:
+        if pipeline.semantic_cache is not None:
+            # уровни не должны наследовать кэш, прогретый предыдущими
+            pipeline.semantic_cache.clear()
+        calls_before = embed_requests()
+        if args.mode == "closed":
+            report = run_closed(pipeline, questions, level, args.duration, args.max_requests)
+        else:
+            report = run_open(pipeline, questions, level, args.duration, args.max_requests,
+                              args.max_inflight, args.poisson, args.seed)
+        if calls_before is not None:
+            report["embed_requests"] = embed_requests() - calls_before
+        reports.append(report)
+        print_level(report)
+
+    if args.json_path:
+        with Path(args.json_path).open("w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "questions": len(questions), "levels": reports},
+                      f, ensure_ascii=False, indent=2)
+        print(f"Saved report to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from .vector_backend import ScoredHit, VectorBackend
+
+
+class LocalVectorIndex(VectorBackend):
+    """
+    Векторный индекс в процессе (без Qdrant).
+
+    - векторы хранятся нормализованными в матрице float32 (N x dim);
+      на диске это vectors.npy, который открывается через mmap;
+    - payload и ID точек — в боковой таблице points.jsonl (строка i = строка матрицы i);
+    - поиск: одно произведение матрица-вектор + argpartition (косинус = скалярное
+      произведение нормализованных векторов);
+    - фильтр по категории — заранее посчитанные булевы маски строк.
+
+    Изменения копятся в памяти и пишутся на диск в flush().
+    index_dir=None — индекс только в памяти.
+    """
+
+    # сколько запросов search_batch умножаем на матрицу за раз (ограничивает память B x N)
+    BATCH_ROWS = 256
+
+    def __init__(self, index_dir: str | Path | None, vector_size: int = 1536) -> None:
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.vector_size = vector_size
+
+        self._lock = threading.RLock()
+        self._buffer = np.zeros((0, vector_size), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._category_masks: Dict[str, np.ndarray] | None = None
+        self._kb_version: str | None = None
+        self._centroids: Dict[str, List[float]] = {}
+        self._dirty = False
+
+        if self.index_dir is not None and (self.index_dir / "vectors.npy").exists():
+            self._load()
+
+    # ---------- хранение ----------
+
+    def _load(self) -> None:
+        matrix = np.load(self.index_dir / "vectors.npy", mmap_mode="r")
+        if matrix.shape[1] != self.vector_size:
+            raise ValueError(
+                f"Local index {self.index_dir} has dim {matrix.shape[1]}, expected {self.vector_size}"
+            )
+        with (self.index_dir / "points.jsonl").open("r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self._ids.append(record["id"])
+                self._payloads.append(record["payload"])
+        with (self.index_dir / "meta.json").open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._kb_version = meta.get("kb_version")
+        centroids_path = self.index_dir / "centroids.json"
+        if centroids_path.exists():
+            with centroids_path.open("r", encoding="utf-8") as f:
+                self._centroids = json.load(f)
+
+        self._buffer = matrix
+        self._size = matrix.shape[0]
+        self._row_by_id = {point_id: i for i, point_id in enumerate(self._ids)}
+        print(f"[LocalVectorIndex] Loaded {self._size} points from {self.index_dir}")
+
+    def _replace_file(self, name: str, write) -> None:
+        # пишем во временный файл и атомарно подменяем
+        tmp_path = self.index_dir / f"{name}.tmp"
+        with tmp_path.open("wb") as f:
+            write(f)
+        os.replace(tmp_path, self.index_dir / name)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self.index_dir is None or not self._dirty:
+                return
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+
+            matrix = np.ascontiguousarray(self._buffer[: self._size])
+            self._replace_file("vectors.npy", lambda f: np.save(f, matrix))
+            self._replace_file(
+                "points.jsonl",
+                lambda f: f.writelines(
+                    (json.dumps({"id": i, "payload": p}, ensure_ascii=False) + "\n").encode("utf-8")
+                    for i, p in zip(self._ids, self._payloads)
+                ),
+            )
+            self._replace_file(
+                "centroids.json", lambda f: f.write(json.dumps(self._centroids, ensure_ascii=False).encode("utf-8"))
+            )
+            self._write_meta()
+            self._dirty = False
+
+    def _write_meta(self) -> None:
+        meta = {
+            "vector_size": self.vector_size,
+            "points": self._size,
+            "kb_version": self._kb_version,
+        }
+        self._replace_file("meta.json", lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+    def _writable(self, extra_rows: int) -> None:
+        """
+        Гарантирует, что буфер доступен на запись и вмещает extra_rows новых строк
+        (ёмкость растёт удвоением, как у list).
+        """
+        needed = self._size + extra_rows
+        if isinstance(self._buffer, np.memmap) or needed > self._buffer.shape[0]:
+            capacity = max(needed, 2 * self._buffer.shape[0], 64)
+            buffer = np.zeros((capacity, self.vector_size), dtype=np.float32)
+            buffer[: self._size] = self._buffer[: self._size]
+            self._buffer = buffer
+
+    # ---------- VectorBackend ----------
+
+    def create_collection_if_not_exists(self) -> None:
+        if self.index_dir is not None:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+
+    def upsert_points(
+        self,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+
+        with self._lock:
+            self._writable(len(ids))
+            for point_id, vector, payload in zip(ids, matrix, payloads):
+                row = self._row_by_id.get(point_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(point_id)
+                    self._payloads.append(payload)
+                    self._row_by_id[point_id] = row
+                else:
+                    self._payloads[row] = payload
+                self._buffer[row] = vector
+            self._category_masks = None
+            self._dirty = True
+
+    def delete_points(self, ids: List[str]) -> None:
+        with self._lock:
+            drop = {self._row_by_id[i] for i in ids if i in self._row_by_id}
+            if not drop:
+                return
+            keep = np.ones(self._size, dtype=bool)
+            keep[list(drop)] = False
+
+            self._buffer = np.ascontiguousarray(self._buffer[: self._size][keep])
+            self._ids = [i for row, i in enumerate(self._ids) if keep[row]]
+            self._payloads = [p for row, p in enumerate(self._payloads) if keep[row]]
+            self._size = len(self._ids)
+            self._row_by_id = {point_id: i for i, point_id in enumerate(self._ids)}
+            self._category_masks = None
+            self._dirty = True
+
+    def delete_points_except(self, key: str, value: str) -> int:
+        with self._lock:
+            stale = [i for i, p in zip(self._ids, self._payloads) if p.get(key) != value]
+            self.delete_points(stale)
+        return len(stale)
+
+    def existing_point_ids(self, ids: List[str]) -> Set[str]:
+        with self._lock:
+            return {i for i in ids if i in self._row_by_id}
+
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        with self._lock:
+            for point_id in ids:
+                row = self._row_by_id.get(point_id)
+                if row is not None:
+                    self._payloads[row] = self._payloads[row] | payload
+            self._category_masks = None
+            self._dirty = True
+
+    def get_kb_version(self) -> str | None:
+        return self._kb_version
+
+    def set_kb_version(self, kb_version: str) -> None:
+        with self._lock:
+            self._kb_version = kb_version
+            self._dirty = True
+        self.flush()
+
+    def get_centroids(self) -> Dict[str, List[float]]:
+        return dict(self._centroids)
+
+    def set_centroids(self, centroids: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._centroids = dict(centroids)
+            self._dirty = True
+        self.flush()
+
+    def scroll_vectors(
+        self,
+        batch_size: int = 1024,
+        payload_keys: List[str] | None = None,
+    ) -> Iterator[Tuple[List[List[float]], List[Dict[str, Any]]]]:
+        with self._lock:
+            matrix = self._buffer[: self._size]
+            payloads = list(self._payloads)
+        if payload_keys is not None:
+            payloads = [{k: p.get(k) for k in payload_keys} for p in payloads]
+        for start in range(0, matrix.shape[0], batch_size):
+            yield matrix[start: start + batch_size].tolist(), payloads[start: start + batch_size]
+
+    def _masks(self) -> Dict[str, np.ndarray]:
+        """
+        Маски строк по категориям; пересчитываются один раз после изменений.
+        """
+        if self._category_masks is None:
+            categories = np.array([p.get("category") or "" for p in self._payloads], dtype=object)
+            self._category_masks = {
+                category: categories == category for category in set(categories.tolist())
+            }
+        return self._category_masks
+
+    def _top_k(
+        self,
+        query_vector: List[float],
+        category: str | None,
+        limit: int,
+        with_payload: bool,
+        with_vectors: bool = False,
+    ) -> List[ScoredHit]:
+        return self._top_k_batch([query_vector], category, limit, with_payload, with_vectors)[0]
+
+    def _top_k_batch(
+        self,
+        query_vectors: List[List[float]],
+        category: str | None,
+        limit: int,
+        with_payload: bool,
+        with_vectors: bool = False,
+    ) -> List[List[ScoredHit]]:
+        """
+        Top-k для пачки запросов: одно произведение матриц (B x dim) @ (dim x N)
+        на блок из BATCH_ROWS запросов, затем argpartition по строкам.
+        """
+        with self._lock:
+            if self._size == 0 or limit <= 0 or not query_vectors:
+                return [[] for _ in query_vectors]
+
+            queries = np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms > 0, norms, 1.0)
+
+            matrix = self._buffer[: self._size]
+            rows = None
+            if category:
+                mask = self._masks().get(category)
+                if mask is None:
+                    return [[] for _ in query_vectors]
+                rows = np.flatnonzero(mask)
+                matrix = matrix[rows]
+
+            k = min(limit, matrix.shape[0])
+            results: List[List[ScoredHit]] = []
+            for start in range(0, queries.shape[0], self.BATCH_ROWS):
+                scores = queries[start: start + self.BATCH_ROWS] @ matrix.T
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+                top = np.take_along_axis(top, order, axis=1)
+
+                for query_scores, query_top in zip(scores, top):
+                    hits: List[ScoredHit] = []
+                    for i in query_top:
+                        row = int(rows[i]) if rows is not None else int(i)
+                        hits.append(
+                            ScoredHit(
+                                id=self._ids[row],
+                                score=float(query_scores[i]),
+                                payload=self._payloads[row] if with_payload else {},
+                                vector=self._buffer[row].copy() if with_vectors else None,
+                            )
+                        )
+                    results.append(hits)
+            return results
+
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        return self._top_k(query_vector, None, limit, with_payload, with_vectors)
+
+    def search_with_category(
+        self,
+        query_vector: List[float],
+        category: str | None,
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        return self._top_k(query_vector, category, limit, with_payload, with_vectors)
+
+    def search_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int = 5,
+        with_payload: bool = True,
+        categories: List[str | None] | None = None,
+        with_vectors: bool = False,
+    ) -> List[List[ScoredHit]]:
+        """
+        Пачка запросов; запросы с одинаковой категорией считаются одним умножением матриц.
+        """
+        if categories is None:
+            return self._top_k_batch(query_vectors, None, limit, with_payload, with_vectors)
+
+        results: List[List[ScoredHit]] = [[] for _ in query_vectors]
+        groups: Dict[str | None, List[int]] = {}
+        for i, category in enumerate(categories):
+            groups.setdefault(category or None, []).append(i)
+        for category, positions in groups.items():
+            hits = self._top_k_batch(
+                [query_vectors[i] for i in positions], category, limit, with_payload, with_vectors
+            )
+            for i, query_hits in zip(positions, hits):
+                results[i] = query_hits
+        return results
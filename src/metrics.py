@@ -0,0 +1,285 @@
+"""
+Лёгкая инструментация запросов без внешних зависимостей.
+
+- RequestTrace — таймеры стадий одного запроса (normalize, embed, cache, search,
+  context, llm, ...) и токены из response.usage; результат — секция "timings"
+  в ответе RAGPipeline;
+- в процессе копятся гистограммы длительностей стадий и счётчики токенов,
+  их текстовое представление в формате Prometheus — render_prometheus();
+  при METRICS_PORT > 0 оно отдаётся по HTTP на /metrics;
+- REQUEST_LOG_PATH — по строке JSONL на каждый запрос (timings + токены).
+
+Клиенты (EmbeddingsClient, LLMClient) сообщают токены через record_tokens():
+они попадают и в общий счётчик, и в трассу текущего запроса (contextvars,
+поэтому параллельные asyncio-запросы не смешиваются).
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .config import settings
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Tuple[str, str] | None = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """
+    Кумулятивная гистограмма в стиле Prometheus (bucket/sum/count) по наборам меток.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[Labels, List[float]] = {}  # [counts по bucket..., sum, count]
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', str(bound)))} {int(count)}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {int(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {int(series[-1])}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, value: float = 1.0, labels: Labels = ()) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            text = str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+            lines.append(f"{self.name}{_format_labels(labels)} {text}")
+        return lines
+
+
+_lock = threading.Lock()
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Duration of RAG pipeline stages.")
+REQUEST_SECONDS = Histogram("rag_request_duration_seconds", "End-to-end duration of RAG requests.")
+REQUESTS = Counter("rag_requests_total", "RAG requests by outcome.")
+TOKENS = Counter("rag_tokens_total", "Tokens reported by API usage.")
+ROUTES = Counter("rag_category_routes_total", "Query routing decisions (category=\"none\" - unfiltered search).")
+EMBED_BATCH_SIZE = Histogram(
+    "rag_embed_batch_size", "Texts per coalesced embedding request.", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+EMBED_MERGED = Counter("rag_embed_merged_total", "embed_text calls served by an identical in-flight request.")
+FAQ_ANSWERS = Counter("rag_faq_fastpath_total", "Extractive FAQ answers returned without an LLM call.")
+FAQ_SAVED_SECONDS = Counter(
+    "rag_faq_fastpath_saved_seconds_total", "LLM time saved by the FAQ fast path (moving average of the llm stage)."
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    with _lock:
+        STAGE_SECONDS.observe(seconds, (("stage", stage),))
+
+
+def record_route(category: str | None) -> None:
+    with _lock:
+        ROUTES.inc(1, (("category", category or "none"),))
+
+
+def record_embed_batch(size: int) -> None:
+    with _lock:
+        EMBED_BATCH_SIZE.observe(size)
+
+
+def record_embed_merged() -> None:
+    with _lock:
+        EMBED_MERGED.inc(1)
+
+
+def record_faq_answer(saved_s: float) -> None:
+    with _lock:
+        FAQ_ANSWERS.inc(1)
+        FAQ_SAVED_SECONDS.inc(saved_s)
+
+
+def render_prometheus() -> str:
+    with _lock:
+        lines: List[str] = []
+        for metric in (
+            STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, TOKENS, ROUTES,
+            EMBED_BATCH_SIZE, EMBED_MERGED, FAQ_ANSWERS, FAQ_SAVED_SECONDS,
+        ):
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- трасса одного запроса ----------
+
+_current_trace: ContextVar["RequestTrace | None"] = ContextVar("rag_request_trace", default=None)
+
+
+class RequestTrace:
+    """
+    Таймеры стадий и токены одного запроса.
+    timings: {"<stage>_s": секунды}, tokens: {"<client>_<kind>": число}.
+    """
+
+    def __init__(self, kind: str = "answer") -> None:
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}
+        # в answer_batch токены приходят из нескольких потоков
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        key = f"{name}_s"
+        with self._lock:
+            self.timings[key] = self.timings.get(key, 0.0) + seconds
+        observe_stage(name, seconds)
+
+    def mark(self, name: str) -> None:
+        """
+        Время от начала запроса до события (например, ttft) — без гистограммы стадий.
+        """
+        self.timings.setdefault(f"{name}_s", time.perf_counter() - self.started)
+
+    def add_tokens(self, key: str, count: int) -> None:
+        with self._lock:
+            self.tokens[key] = self.tokens.get(key, 0) + count
+
+    def finish(self, outcome: str = "ok", **fields: Any) -> Dict[str, Any]:
+        """
+        Закрывает трассу: total_s, метрики запроса, строка в JSONL-логе.
+        Возвращает секцию "timings" для результата.
+        """
+        total_s = time.perf_counter() - self.started
+        self.timings["total_s"] = total_s
+        with _lock:
+            REQUEST_SECONDS.observe(total_s, (("kind", self.kind), ("outcome", outcome)))
+            REQUESTS.inc(1, (("kind", self.kind), ("outcome", outcome)))
+
+        timings: Dict[str, Any] = dict(self.timings)
+        timings["tokens"] = dict(self.tokens)
+        if settings.request_log_path:
+            _write_request_log({"ts": time.time(), "kind": self.kind, "outcome": outcome, **fields, "timings": timings})
+        return timings
+
+
+@contextmanager
+def use_trace(trace: RequestTrace) -> Iterator[RequestTrace]:
+    """
+    Делает трассу текущей для record_tokens() внутри блока
+    (например, на время чтения потокового ответа LLM).
+    """
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def trace_request(kind: str = "answer"):
+    """
+    Новая трасса, текущая внутри блока: with trace_request() as trace: ...
+    """
+    return use_trace(RequestTrace(kind))
+
+
+def record_tokens(client: str, usage: Any) -> None:
+    """
+    Учитывает response.usage (OpenAI-совместимый объект или None).
+    """
+    if usage is None:
+        return
+    trace = _current_trace.get()
+    for kind in ("prompt_tokens", "completion_tokens"):
+        count = getattr(usage, kind, None)
+        if not count:
+            continue
+        with _lock:
+            TOKENS.inc(count, (("client", client), ("type", kind.split("_")[0])))
+        if trace is not None:
+            trace.add_tokens(f"{client}_{kind}", count)
+
+
+_log_lock = threading.Lock()
+
+
+def _write_request_log(record: Dict[str, Any]) -> None:
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _log_lock, open(settings.request_log_path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+# ---------- HTTP /metrics ----------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        return None
+
+
+_server: ThreadingHTTPServer | None = None
+
+
+def start_metrics_server(port: int | None = None) -> bool:
+    """
+    Поднимает /metrics в фоновом потоке (один раз на процесс).
+    port=None — settings.metrics_port; 0 — не запускать.
+    """
+    global _server
+    port = settings.metrics_port if port is None else port
+    if not port or _server is not None:
+        return False
+    try:
+        _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    except OSError as e:
+        print(f"[metrics] Cannot listen on :{port}: {e}")
+        return False
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[metrics] Serving Prometheus metrics on :{port}/metrics")
+    return True
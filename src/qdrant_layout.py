@@ -0,0 +1,226 @@
+"""
+Раскладка коллекции Qdrant: просмотр, миграция и бенчмарк.
+
+Запуск:
+    python -m src.qdrant_layout show
+    QDRANT_QUANTIZATION=int8 QDRANT_ON_DISK_VECTORS=true python -m src.qdrant_layout migrate
+    python -m src.qdrant_layout bench --layouts none int8 binary int8:ondisk --ef 16 64 128
+
+- show    — текущие параметры коллекции и payload-индексы;
+- migrate — приводит коллекцию к раскладке из Settings (CollectionLayout)
+  на месте и ждёт, пока Qdrant перестроит индекс (статус green);
+- bench   — копирует точки коллекции во временные коллекции с разными
+  раскладками и для каждого ef меряет recall@k относительно точного поиска
+  (exact=True по исходной коллекции), задержку запроса p50/p95
+  и оценку памяти (CollectionLayout.estimate_memory).
+  Запросы — вопросы из data/eval (эмбеддинги через EMBEDDING_BACKEND)
+  или, с --queries points, случайные точки самой коллекции.
+"""
+import argparse
+import json
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from qdrant_client.http import models as qm
+
+from .config import ROOT_DIR
+from .embeddings_client import create_embeddings_client
+from .vector_db_client import CollectionLayout, VectorDBClient
+
+
+def parse_layout(spec: str) -> CollectionLayout:
+    """
+    "none", "int8", "binary" и модификатор ":ondisk", например "int8:ondisk".
+    Остальные параметры — из Settings.
+    """
+    quantization, _, modifier = spec.partition(":")
+    return CollectionLayout(quantization=quantization, on_disk=modifier == "ondisk")
+
+
+def wait_until_green(client: VectorDBClient, timeout_s: float = 600.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while True:
+        info = client.client.get_collection(client.collection_name)
+        if info.status == qm.CollectionStatus.GREEN:
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Collection '{client.collection_name}' is still {info.status} after {timeout_s}s")
+        time.sleep(1.0)
+
+
+def show(client: VectorDBClient) -> None:
+    info = client.client.get_collection(client.collection_name)
+    params = info.config.params
+    print(f"Collection '{client.collection_name}': {info.points_count} points, status {info.status}")
+    print(f"vectors:      {params.vectors}")
+    print(f"hnsw:         {info.config.hnsw_config}")
+    print(f"quantization: {info.config.quantization_config}")
+    print(f"payload idx:  {sorted((info.payload_schema or {}).keys())}")
+
+
+def migrate(client: VectorDBClient) -> None:
+    print(f"Applying layout to '{client.collection_name}': {asdict(client.layout)}")
+    started = time.perf_counter()
+    client.apply_layout()
+    wait_until_green(client)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    show(client)
+
+
+# ---------- бенчмарк ----------
+
+def read_points(client: VectorDBClient, max_points: int, page_size: int = 512) -> List[qm.Record]:
+    points: List[qm.Record] = []
+    offset = None
+    while len(points) < max_points:
+        records, offset = client.client.scroll(
+            collection_name=client.collection_name,
+            limit=min(page_size, max_points - len(points)),
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        points.extend(records)
+        if offset is None:
+            break
+    return points
+
+
+def load_query_vectors(source: str, points: List[qm.Record], n: int, seed: int) -> List[List[float]]:
+    if source == "points":
+        rng = np.random.default_rng(seed)
+        picks = rng.choice(len(points), size=min(n, len(points)), replace=False)
+        return [list(points[i].vector) for i in picks]
+
+    questions = [
+        item["question"]
+        for name in ("queries.json", "queries_typos.json")
+        for item in json.loads((ROOT_DIR / "data" / "eval" / name).read_text(encoding="utf-8"))
+    ][:n]
+    return create_embeddings_client(vector_size=len(points[0].vector)).embed_batch(questions)
+
+
+def exact_neighbours(client: VectorDBClient, queries: List[List[float]], k: int) -> List[List[str]]:
+    exact = qm.SearchParams(exact=True)
+    return [
+        [str(p.id) for p in client.client.query_points(
+            collection_name=client.collection_name, query=q, search_params=exact, limit=k, with_payload=False,
+        ).points]
+        for q in queries
+    ]
+
+
+def bench_layout(
+    source: VectorDBClient,
+    spec: str,
+    points: List[qm.Record],
+    queries: List[List[float]],
+    truth: List[List[str]],
+    ef_values: List[int],
+    k: int,
+    keep: bool,
+) -> List[Dict[str, Any]]:
+    layout = parse_layout(spec)
+    target = VectorDBClient(
+        collection_name=f"{source.collection_name}__layout_{spec.replace(':', '_')}",
+        vector_size=source.vector_size,
+        layout=layout,
+    )
+    target.client.delete_collection(target.collection_name)
+    target.create_collection_if_not_exists()
+    for i in range(0, len(points), 256):
+        batch = points[i: i + 256]
+        target.upsert_points(
+            ids=[str(p.id) for p in batch],
+            vectors=[list(p.vector) for p in batch],
+            payloads=[p.payload or {} for p in batch],
+        )
+    wait_until_green(target)
+
+    rows = []
+    try:
+        for ef in ef_values:
+            layout.search_ef = ef
+            target.search_params = layout.search_params()
+            latencies, recalls = [], []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                hits = target.search(query_vector=query, limit=k, with_payload=False)
+                latencies.append(time.perf_counter() - started)
+                recalls.append(len({str(h.id) for h in hits} & set(expected)) / max(len(expected), 1))
+            lat_ms = np.array(latencies) * 1000
+            rows.append({
+                "layout": spec,
+                "ef": ef,
+                f"recall@{k}": float(np.mean(recalls)),
+                "p50_ms": float(np.percentile(lat_ms, 50)),
+                "p95_ms": float(np.percentile(lat_ms, 95)),
+                **layout.estimate_memory(len(points), source.vector_size),
+            })
+    finally:
+        if not keep:
+            target.client.delete_collection(target.collection_name)
+    return rows
+
+
+def bench(args: argparse.Namespace) -> None:
+    source = VectorDBClient()
+    points = read_points(source, args.max_points)
+    if not points:
+        raise SystemExit(f"Collection '{source.collection_name}' is empty, run ingest first")
+    source.vector_size = len(points[0].vector)
+
+    queries = load_query_vectors(args.queries, points, args.num_queries, args.seed)
+    truth = exact_neighbours(source, queries, args.k)
+    print(f"{len(points)} points, {len(queries)} queries, dim={source.vector_size}")
+
+    rows: List[Dict[str, Any]] = []
+    for spec in args.layouts:
+        rows.extend(bench_layout(source, spec, points, queries, truth, args.ef, args.k, args.keep))
+
+    print(f"\n{'layout':<14}{'ef':>6}{f'recall@{args.k}':>11}{'p50 ms':>9}{'p95 ms':>9}{'RAM MB':>9}{'disk MB':>9}")
+    for row in rows:
+        print(
+            f"{row['layout']:<14}{row['ef']:>6}{row[f'recall@{args.k}']:>11.3f}"
+            f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+            f"{row['ram_bytes'] / 2**20:>9.1f}{row['disk_bytes'] / 2**20:>9.1f}"
+        )
+    if args.json_path:
+        with Path(args.json_path).open("w", encoding="utf-8") as f:
+            json.dump({"points": len(points), "queries": len(queries), "rows": rows}, f, indent=2)
+        print(f"Saved report to {args.json_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Раскладка коллекции Qdrant")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="текущие параметры коллекции")
+    sub.add_parser("migrate", help="применить раскладку из Settings к коллекции")
+
+    bench_parser = sub.add_parser("bench", help="recall / задержка / память для разных раскладок")
+    bench_parser.add_argument("--layouts", nargs="+", default=["none", "int8", "binary"])
+    bench_parser.add_argument("--ef", type=int, nargs="+", default=[16, 64, 128])
+    bench_parser.add_argument("--k", type=int, default=10)
+    bench_parser.add_argument("--queries", choices=["eval", "points"], default="eval")
+    bench_parser.add_argument("--num-queries", type=int, default=200)
+    bench_parser.add_argument("--max-points", type=int, default=100_000)
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.add_argument("--keep", action="store_true", help="не удалять временные коллекции")
+    bench_parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args)
+        return
+    client = VectorDBClient()
+    if args.command == "show":
+        show(client)
+    else:
+        migrate(client)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,25 @@
-from typing import List, Dict, Any
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Tuple
 
-from .embeddings_client import EmbeddingsClient
-from .vector_db_client import VectorDBClient
-from .llm_client import LLMClient
-from .text_utils import normalize_question
+from .bm25_index import BM25Index
+from .category_router import CategoryRouter
+from .config import settings
+from .context_packing import pack_context
+from .diversify import mmr_select
+from .embeddings_client import EmbeddingsClient, create_embeddings_client
+from .faq_fastpath import FaqMatch, match_faq
+from .vector_backend import VectorBackend
+from .vector_db_client import create_vector_client
+from .fusion import reciprocal_rank_fusion
+from .llm_client import LLMClient, create_llm_client
+from .metrics import RequestTrace, record_faq_answer, record_route, trace_request, use_trace
+from .semantic_cache import SemanticCache
+from .text_utils import estimate_tokens, normalize_question
 
 
 class RAGPipeline:
@@ -11,15 +27,98 @@ class RAGPipeline:
     Основной RAG-пайплайн:
     - embed запроса,
     - поиск по Qdrant,
+    - сборка контекста (склейка соседних чанков, дедупликация, бюджет токенов),
     - генерация ответа с использованием контекста.
+
+    Есть синхронный (retrieve / answer_question) и асинхронный
+    (aretrieve / aanswer_question) API; оба используют одни и те же
+    шаги подготовки запроса и разбора результатов.
+    Клиенты можно передать явно (например, локальные заглушки для тестов и бенчмарков).
+
+    Режим поиска (settings.retrieval_mode):
+    - "dense"   — только векторный поиск;
+    - "lexical" — только BM25 по тексту чанков;
+    - "hybrid"  — оба поиска параллельно, слияние через Reciprocal Rank Fusion.
+
+    Маршрутизация (settings.category_router_enabled): по вектору запроса
+    CategoryRouter выбирает категорию, и векторный поиск идёт с фильтром
+    по ней; если роутер не уверен или фильтр ничего не нашёл — без фильтра.
+
+    Диверсификация (settings.mmr_enabled): векторный поиск берёт
+    mmr_candidates кандидатов вместе с векторами, и top_k выбирается MMR
+    с ограничением числа чанков одного source_id (см. diversify.py).
+
+    answer_question / aanswer_question сначала проверяют семантический кэш:
+    если похожий вопрос уже задавался (при той же версии базы знаний),
+    возвращается сохранённый ответ без поиска и вызова LLM.
+
+    Быстрый путь FAQ (settings.faq_fastpath_enabled): если первый найденный
+    документ — FAQ с высоким косинусом и отрывом от остальных, ответ — сохранённый
+    ответ FAQ без вызова LLM (result["extractive"] = True, см. faq_fastpath.py).
     """
 
-    def __init__(self, top_k: int = 5):
-        self.emb_client = EmbeddingsClient()
-        self.vec_client = VectorDBClient(vector_size=1536)
-        self.llm_client = LLMClient()
+    def __init__(
+        self,
+        top_k: int = 5,
+        emb_client: EmbeddingsClient | None = None,
+        vec_client: VectorBackend | None = None,
+        llm_client: LLMClient | None = None,
+        bm25: BM25Index | None = None,
+    ):
+        self.emb_client = emb_client or create_embeddings_client()
+        self.vec_client = vec_client or create_vector_client()
+        self.llm_client = llm_client or create_llm_client()
         self.top_k = top_k
 
+        self.retrieval_mode = settings.retrieval_mode
+        self.bm25: BM25Index | None = None
+        if self.retrieval_mode != "dense":
+            # bm25 — готовый индекс (бенчмарки на своём корпусе), иначе data/processed
+            self.bm25 = bm25 or BM25Index.load_if_exists()
+            if self.bm25 is None:
+                print("[RAGPipeline] BM25 index not found, falling back to dense retrieval.")
+                self.retrieval_mode = "dense"
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-retrieve")
+
+        # центроиды категорий считает ingest; без них поиск всегда без фильтра
+        self.router: CategoryRouter | None = None
+        if settings.category_router_enabled:
+            self.router = CategoryRouter.from_backend(self.vec_client)
+        self.mmr_enabled = settings.mmr_enabled
+
+        self.semantic_cache: SemanticCache | None = None
+        if settings.semantic_cache_enabled:
+            self.semantic_cache = SemanticCache(
+                threshold=settings.semantic_cache_threshold,
+                max_size=settings.semantic_cache_max_size,
+                ttl_s=settings.semantic_cache_ttl_s,
+            )
+        self._kb_version_checked_at = float("-inf")
+
+        self.faq_fastpath = settings.faq_fastpath_enabled
+        # скользящее среднее стадии llm — оценка времени, сэкономленного быстрым путём FAQ
+        self._llm_latency_s: float | None = None
+
+    @staticmethod
+    def _hits_to_docs(results) -> List[Dict[str, Any]]:
+        """
+        Приводит результаты поиска к удобному формату.
+        """
+        docs: List[Dict[str, Any]] = []
+        for hit in results:
+            payload = hit.payload or {}
+            text = payload.get("text", "")
+            doc = {
+                "text": text,
+                "metadata": payload,
+                "score": hit.score,
+            }
+            # векторы кандидатов нужны только MMR (см. _diversify)
+            if hit.vector is not None:
+                doc["vector"] = hit.vector
+            docs.append(doc)
+        return docs
+
     def retrieve(self, question: str) -> List[Dict[str, Any]]:
         """
         Возвращает top_k чанков из Qdrant в формате:
@@ -39,26 +138,312 @@ class RAGPipeline:
         # 2. Делаем эмбеддинг уже нормализованного текста
         query_vector = self.emb_client.embed_text(normalized_question)
 
-        # 3. Ищем похожие вектора в Qdrant
-        results = self.vec_client.search(
-            query_vector=query_vector,
-            limit=self.top_k,
+        # 3-4. Ищем похожие вектора в Qdrant и приводим к удобному формату
+        return self.retrieve_by_vector(query_vector, normalized_question, self.route(query_vector))
+
+    def route(self, query_vector: List[float]) -> str | None:
+        """
+        Категория запроса по CategoryRouter; None — роутера нет или он не уверен.
+        """
+        if self.router is None:
+            return None
+        category = self.router.route(query_vector).category
+        record_route(category)
+        return category
+
+    def _dense_limit(self, mode: str) -> int:
+        """
+        Сколько кандидатов брать из векторного поиска: top_k, больше — для RRF и MMR.
+        """
+        limit = self.top_k
+        if mode == "hybrid":
+            limit = max(limit, settings.hybrid_candidates)
+        if self.mmr_enabled:
+            limit = max(limit, settings.mmr_candidates)
+        return limit
+
+    def _diversify(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Итоговые top_k документов из кандидатов (по убыванию score):
+        при mmr_enabled — выбор MMR по векторам кандидатов с ограничением
+        чанков на source_id, иначе первые top_k. Векторы в результат не попадают.
+        """
+        if not self.mmr_enabled:
+            return docs[: self.top_k]
+        order = mmr_select(
+            relevance=[d["score"] for d in docs],
+            vectors=[d.get("vector") for d in docs],
+            k=self.top_k,
+            lambda_mult=settings.mmr_lambda,
+            groups=[d["metadata"].get("source_id") for d in docs],
+            max_per_group=settings.mmr_max_per_source,
         )
+        return [{k: v for k, v in docs[i].items() if k != "vector"} for i in order]
 
-        # 4. Приводим результаты к удобному формату
-        docs: List[Dict[str, Any]] = []
-        for hit in results:
-            payload = hit.payload or {}
-            text = payload.get("text", "")
-            docs.append(
-                {
-                    "text": text,
-                    "metadata": payload,
-                    "score": hit.score,
-                }
+    def _dense_hits(self, query_vector: List[float], limit: int, category: str | None):
+        if category:
+            hits = self.vec_client.search_with_category(
+                query_vector=query_vector, category=category, limit=limit, with_vectors=self.mmr_enabled
             )
+            if hits:
+                return hits
+        return self.vec_client.search(query_vector=query_vector, limit=limit, with_vectors=self.mmr_enabled)
 
-        return docs
+    def retrieve_by_vector(
+        self,
+        query_vector: List[float],
+        normalized_question: str | None = None,
+        category: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Поиск по уже посчитанному вектору запроса.
+        Для lexical/hybrid режимов нужен ещё нормализованный текст вопроса;
+        category — фильтр векторного поиска (см. route()).
+        """
+        mode = self.retrieval_mode if normalized_question is not None else "dense"
+
+        if mode == "lexical":
+            return self._lexical_docs(normalized_question, self.top_k)
+
+        if mode == "hybrid":
+            # BM25 считается в пуле потоков, пока идёт запрос к векторной БД
+            limit = max(self.top_k, settings.hybrid_candidates)
+            lexical = self._executor.submit(self._lexical_docs, normalized_question, limit)
+            dense = self._hits_to_docs(self._dense_hits(query_vector, self._dense_limit(mode), category))
+            return self._diversify(self._fuse(dense, lexical.result()))
+
+        hits = self._dense_hits(query_vector, self._dense_limit(mode), category)
+        return self._diversify(self._hits_to_docs(hits))
+
+    def _dense_hits_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int,
+        categories: List[str | None] | None,
+    ) -> List[List[Any]]:
+        if not categories or not any(categories):
+            return self.vec_client.search_batch(
+                query_vectors=query_vectors, limit=limit, with_vectors=self.mmr_enabled
+            )
+        hits = self.vec_client.search_batch(
+            query_vectors=query_vectors, limit=limit, categories=categories, with_vectors=self.mmr_enabled
+        )
+        # фильтр ничего не нашёл — повторяем эти запросы без фильтра
+        empty = [i for i, query_hits in enumerate(hits) if not query_hits]
+        if empty:
+            retry = self.vec_client.search_batch(
+                query_vectors=[query_vectors[i] for i in empty], limit=limit, with_vectors=self.mmr_enabled
+            )
+            for i, query_hits in zip(empty, retry):
+                hits[i] = query_hits
+        return hits
+
+    def retrieve_batch_by_vectors(
+        self,
+        query_vectors: List[List[float]],
+        normalized_questions: List[str],
+        categories: List[str | None] | None = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Поиск для пачки запросов: векторный поиск — одним search_batch
+        (Qdrant query_batch_points / одно умножение матриц в локальном индексе),
+        BM25 для hybrid считается в пуле потоков параллельно с ним.
+        """
+        if self.retrieval_mode == "lexical":
+            return [self._lexical_docs(q, self.top_k) for q in normalized_questions]
+
+        if self.retrieval_mode == "hybrid":
+            limit = max(self.top_k, settings.hybrid_candidates)
+            lexical = self._executor.submit(
+                lambda: [self._lexical_docs(q, limit) for q in normalized_questions]
+            )
+            dense = self._dense_hits_batch(query_vectors, self._dense_limit("hybrid"), categories)
+            return [
+                self._diversify(self._fuse(self._hits_to_docs(hits), lexical_docs))
+                for hits, lexical_docs in zip(dense, lexical.result())
+            ]
+
+        dense = self._dense_hits_batch(query_vectors, self._dense_limit("dense"), categories)
+        return [self._diversify(self._hits_to_docs(hits)) for hits in dense]
+
+    async def aretrieve(self, question: str) -> List[Dict[str, Any]]:
+        """
+        Асинхронный вариант retrieve(): эмбеддинг и поиск не блокируют event loop.
+        """
+        normalized_question = normalize_question(question)
+        query_vector = await self.emb_client.aembed_text(normalized_question)
+        return await self.aretrieve_by_vector(query_vector, normalized_question, self.route(query_vector))
+
+    async def _adense_hits(self, query_vector: List[float], limit: int, category: str | None):
+        if category:
+            hits = await self.vec_client.asearch_with_category(
+                query_vector=query_vector, category=category, limit=limit, with_vectors=self.mmr_enabled
+            )
+            if hits:
+                return hits
+        return await self.vec_client.asearch(query_vector=query_vector, limit=limit, with_vectors=self.mmr_enabled)
+
+    async def aretrieve_by_vector(
+        self,
+        query_vector: List[float],
+        normalized_question: str | None = None,
+        category: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        mode = self.retrieval_mode if normalized_question is not None else "dense"
+
+        if mode == "lexical":
+            return self._lexical_docs(normalized_question, self.top_k)
+
+        if mode == "hybrid":
+            limit = max(self.top_k, settings.hybrid_candidates)
+            dense_task = asyncio.ensure_future(self._adense_hits(query_vector, self._dense_limit(mode), category))
+            # BM25 (доли миллисекунды) считаем, пока ждём ответ векторной БД
+            lexical = self._lexical_docs(normalized_question, limit)
+            return self._diversify(self._fuse(self._hits_to_docs(await dense_task), lexical))
+
+        hits = await self._adense_hits(query_vector, self._dense_limit(mode), category)
+        return self._diversify(self._hits_to_docs(hits))
+
+    def _lexical_docs(self, normalized_question: str, limit: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "text": self.bm25.docs[doc_no]["text"],
+                "metadata": self.bm25.docs[doc_no],
+                "score": score,
+            }
+            for doc_no, score in self.bm25.search(normalized_question, limit=limit)
+        ]
+
+    def _fuse(
+        self,
+        dense: List[Dict[str, Any]],
+        lexical: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Объединяет выдачу dense и BM25 через RRF (все кандидаты, top_k выбирает _diversify).
+        score документа — RRF-score, исходные оценки — в doc["scores"].
+        """
+        def key(doc: Dict[str, Any]) -> str:
+            return doc["metadata"].get("chunk_id") or doc["text"]
+
+        by_key: Dict[str, Dict[str, Any]] = {}
+        for source, docs in (("dense", dense), ("lexical", lexical)):
+            for doc in docs:
+                merged = by_key.setdefault(key(doc), doc | {"scores": {}})
+                merged["scores"][source] = doc["score"]
+
+        fused = reciprocal_rank_fusion(
+            [[key(d) for d in dense], [key(d) for d in lexical]],
+            k=settings.rrf_k,
+        )
+        return [by_key[k] | {"score": score} for k, score in fused]
+
+    @staticmethod
+    def build_context(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Фрагменты, которые уходят в промпт (см. context_packing.pack_context).
+        """
+        return pack_context(
+            docs,
+            max_tokens=settings.context_max_tokens,
+            dedup_threshold=settings.context_dedup_threshold,
+        )
+
+    def _kb_version(self) -> str | None:
+        """
+        Версия базы знаний для семантического кэша. С Qdrant сверяем не чаще,
+        чем раз в semantic_cache_version_check_s (0 — каждый раз); запрос
+        передаёт полученную версию и в _cache_lookup, и в _cache_store.
+        """
+        if self.semantic_cache is None:
+            return None
+        now = time.monotonic()
+        if now - self._kb_version_checked_at >= settings.semantic_cache_version_check_s:
+            self._kb_version_checked_at = now
+            self.semantic_cache.sync_version(self.vec_client.get_kb_version())
+        return self.semantic_cache.kb_version
+
+    async def _akb_version(self) -> str | None:
+        if self.semantic_cache is None:
+            return None
+        now = time.monotonic()
+        if now - self._kb_version_checked_at >= settings.semantic_cache_version_check_s:
+            self._kb_version_checked_at = now
+            self.semantic_cache.sync_version(await self.vec_client.aget_kb_version())
+        return self.semantic_cache.kb_version
+
+    def _cache_lookup(
+        self, question: str, query_vector: List[float], kb_version: str | None
+    ) -> Dict[str, Any] | None:
+        """
+        Ищет похожий вопрос в семантическом кэше.
+        """
+        if self.semantic_cache is None:
+            return None
+        return self._cached_result(question, self.semantic_cache.lookup(query_vector, kb_version))
+
+    def _cache_lookup_batch(
+        self, questions: List[str], query_vectors: List[List[float]], kb_version: str | None
+    ) -> List[Dict[str, Any] | None]:
+        if self.semantic_cache is None:
+            return [None] * len(questions)
+        hits = self.semantic_cache.lookup_batch(query_vectors, kb_version)
+        return [self._cached_result(question, hit) for question, hit in zip(questions, hits)]
+
+    def _cached_result(self, question: str, hit: Dict[str, Any] | None) -> Dict[str, Any] | None:
+        # ответ, собранный для другого top_k, не переиспользуем
+        if hit is None or hit["entry"]["top_k"] != self.top_k:
+            return None
+        cached = hit["entry"]["result"]
+        return cached | {
+            "question": question,
+            "cache_hit": True,
+            "cached_question": cached["question"],
+            "cache_similarity": hit["similarity"],
+        }
+
+    def _cache_store(self, query_vector: List[float], result: Dict[str, Any], kb_version: str | None) -> None:
+        if self.semantic_cache is not None:
+            # тайминги и генератор относятся к конкретному запросу, в кэш не кладём
+            stored = {k: v for k, v in result.items() if k not in ("answer_stream", "timings")}
+            self.semantic_cache.store(query_vector, {"top_k": self.top_k, "result": stored}, kb_version)
+
+    def _faq_match(self, docs: List[Dict[str, Any]]) -> FaqMatch | None:
+        if not self.faq_fastpath or self.retrieval_mode == "lexical":
+            return None
+        return match_faq(docs, settings.faq_fastpath_min_score, settings.faq_fastpath_min_margin)
+
+    def _observe_llm(self, seconds: float) -> None:
+        if self._llm_latency_s is None:
+            self._llm_latency_s = seconds
+        else:
+            self._llm_latency_s += 0.1 * (seconds - self._llm_latency_s)
+
+    def _extractive_result(
+        self,
+        question: str,
+        normalized_question: str,
+        docs: List[Dict[str, Any]],
+        match: FaqMatch,
+        routed_category: str | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Ответ быстрого пути FAQ: сохранённый ответ, в промпт ничего не уходило.
+        """
+        saved_s = self._llm_latency_s or 0.0
+        record_faq_answer(saved_s)
+        return self._build_result(question, normalized_question, match.answer, docs, [], routed_category) | {
+            "extractive": True,
+            "faq_source_id": match.source_id,
+            "faq_score": match.score,
+            "llm_saved_s": saved_s,
+        }
+
+    @staticmethod
+    def _outcome(result: Dict[str, Any]) -> str:
+        if result["cache_hit"]:
+            return "cache_hit"
+        return "extractive" if result["extractive"] else "ok"
 
     def answer_question(self, question: str, temperature: float = 0.1) -> Dict[str, Any]:
         """
@@ -67,28 +452,379 @@ class RAGPipeline:
         - ищем top_k релевантных чанков,
         - отправляем нормализованный вопрос и список чанков в LLM,
         - возвращаем ответ + использованный контекст.
+
+        result["timings"] — длительность каждой стадии (normalize_s, embed_s,
+        cache_s, search_s, context_s, llm_s, total_s) и токены API (см. metrics.py).
         """
+        with trace_request("answer") as trace:
+            try:
+                result = self._answer_question(question, temperature, trace)
+            except Exception:
+                trace.finish("error", question=question)
+                raise
+            result["timings"] = trace.finish(self._outcome(result), question=question)
+            return result
 
-        # 1. Нормализуем вопрос (для поиска и для LLM)
-        normalized_question = normalize_question(question)
+    def _answer_question(self, question: str, temperature: float, trace: RequestTrace) -> Dict[str, Any]:
+        # 1. Нормализуем вопрос (один раз — для поиска и для LLM) и считаем его эмбеддинг
+        with trace.stage("normalize"):
+            normalized_question = normalize_question(question)
+        with trace.stage("embed"):
+            query_vector = self.emb_client.embed_text(normalized_question)
 
-        # 2. Получаем документы из Qdrant (retrieve уже собирает их в нужный формат)
-        docs: List[Dict[str, Any]] = self.retrieve(question)
+        # 2. Похожий вопрос уже задавали — отдаём готовый ответ
+        with trace.stage("cache"):
+            kb_version = self._kb_version()
+            cached = self._cache_lookup(question, query_vector, kb_version)
+        if cached is not None:
+            return cached
 
-        # 3. Генерируем ответ, используя НОРМАЛИЗОВАННЫЙ вопрос и чанки как контекст
-        answer = self.llm_client.generate_answer(
-            question=normalized_question,
-            context_chunks=docs,
-            temperature=temperature,
-        )
+        # 3. Получаем документы из Qdrant (уже в нужном формате), с фильтром по категории запроса
+        with trace.stage("route"):
+            category = self.route(query_vector)
+        with trace.stage("search"):
+            docs: List[Dict[str, Any]] = self.retrieve_by_vector(query_vector, normalized_question, category)
+
+        # 4. Вопрос почти дословно из FAQ — отдаём сохранённый ответ без LLM
+        match = self._faq_match(docs)
+        if match is not None:
+            return self._extractive_result(question, normalized_question, docs, match, category)
+
+        # 5. Собираем контекст и генерируем ответ, используя НОРМАЛИЗОВАННЫЙ вопрос
+        with trace.stage("context"):
+            context = self.build_context(docs)
+        with trace.stage("llm"):
+            answer = self.llm_client.generate_answer(
+                question=normalized_question,
+                context_chunks=context,
+                temperature=temperature,
+            )
+        self._observe_llm(trace.timings["llm_s"])
+
+        # 6. Возвращаем всё, что нужно UI
+        result = self._build_result(question, normalized_question, answer, docs, context, category)
+        self._cache_store(query_vector, result, kb_version)
+        return result
+
+    def answer_question_stream(self, question: str, temperature: float = 0.1) -> Dict[str, Any]:
+        """
+        Потоковый вариант answer_question.
+
+        Поиск выполняется сразу, поэтому "documents" доступны до первого токена.
+        Ответ отдаётся генератором result["answer_stream"]; после его исчерпания
+        в result появляются полный "answer" и "timings"
+        (стадии как в answer_question плюс ttft_s — время до первого токена).
+        llm_s — от запроса к LLM до последнего фрагмента, без времени, которое
+        потребитель тратит на чтение после него. Ошибка поиска или генерации
+        закрывает трассу исходом "error", брошенный недочитанным генератор —
+        исходом "abandoned".
+        """
+        trace = RequestTrace("stream")
+        try:
+            with use_trace(trace):
+                with trace.stage("normalize"):
+                    normalized_question = normalize_question(question)
+                with trace.stage("embed"):
+                    query_vector = self.emb_client.embed_text(normalized_question)
+
+                with trace.stage("cache"):
+                    kb_version = self._kb_version()
+                    cached = self._cache_lookup(question, query_vector, kb_version)
+                if cached is not None:
+                    # готовый ответ из семантического кэша отдаём одним фрагментом
+                    trace.mark("ttft")
+                    cached["timings"] = trace.finish("cache_hit", question=question)
+                    cached["answer_stream"] = iter([cached["answer"]])
+                    return cached
+
+                with trace.stage("route"):
+                    category = self.route(query_vector)
+                with trace.stage("search"):
+                    docs = self.retrieve_by_vector(query_vector, normalized_question, category)
+
+                match = self._faq_match(docs)
+                if match is not None:
+                    # ответ FAQ отдаём одним фрагментом, как ответ из кэша
+                    trace.mark("ttft")
+                    result = self._extractive_result(question, normalized_question, docs, match, category)
+                    result["timings"] = trace.finish("extractive", question=question)
+                    result["answer_stream"] = iter([result["answer"]])
+                    return result
+
+                with trace.stage("context"):
+                    context = self.build_context(docs)
+        except Exception:
+            trace.finish("error", question=question)
+            raise
+
+        result = self._build_result(question, normalized_question, "", docs, context, category)
+        unfinished = threading.Lock()
+
+        def finish(outcome: str) -> Dict[str, Any] | None:
+            # трасса закрывается ровно один раз: генератором или финализатором
+            if not unfinished.acquire(blocking=False):
+                return None
+            return trace.finish(outcome, question=question)
+
+        def stream() -> Iterator[str]:
+            parts: List[str] = []
+            llm_started = last_chunk_at = time.perf_counter()
+            try:
+                # токены потокового ответа приходят, пока UI читает генератор
+                with use_trace(trace):
+                    for token in self.llm_client.generate_answer_stream(
+                        question=normalized_question,
+                        context_chunks=context,
+                        temperature=temperature,
+                    ):
+                        last_chunk_at = time.perf_counter()
+                        trace.mark("ttft")
+                        parts.append(token)
+                        yield token
+                if not parts:
+                    last_chunk_at = time.perf_counter()
+            except GeneratorExit:
+                # потребитель перестал читать ответ (close() или сборка мусора)
+                trace.add_stage("llm", last_chunk_at - llm_started)
+                finish("abandoned")
+                raise
+            except Exception:
+                trace.add_stage("llm", time.perf_counter() - llm_started)
+                finish("error")
+                raise
+
+            trace.add_stage("llm", last_chunk_at - llm_started)
+            trace.mark("ttft")
+            self._observe_llm(trace.timings["llm_s"])
+
+            result["answer"] = "".join(parts).strip()
+            result["timings"] = finish("ok")
+            print(
+                "[RAGPipeline] "
+                + " ".join(f"{k[:-2]}={v:.3f}s" for k, v in result["timings"].items() if k.endswith("_s"))
+            )
+            self._cache_store(query_vector, result, kb_version)
+
+        answer_stream = stream()
+        # генератор, который так и не начали читать, не получает GeneratorExit
+        weakref.finalize(answer_stream, finish, "abandoned").atexit = False
+        result["answer_stream"] = answer_stream
+        return result
+
+    def answer_batch(
+        self,
+        questions: List[str],
+        temperature: float = 0.1,
+        concurrency: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ответы на пачку вопросов (офлайн-задачи: разбор очереди тикетов и т.п.).
+
+        - одинаковые после нормализации вопросы обрабатываются один раз;
+        - эмбеддинги — embed_batch по settings.answer_batch_embed_size вопросов;
+        - семантический кэш: версия базы сверяется один раз на пачку,
+          поиск по кэшу — одно матричное произведение на все вопросы;
+        - поиск — retrieve_batch_by_vectors (один запрос к векторной БД на пачку);
+        - вопросы, для которых сработал быстрый путь FAQ, в LLM не уходят;
+        - генерации LLM идут параллельно, не больше concurrency
+          (по умолчанию settings.answer_batch_concurrency).
+
+        Результаты — в порядке questions, формат как у answer_question.
+        Ошибка генерации для одного вопроса не прерывает пачку: у такого
+        результата пустой answer и поле "error".
+        result["timings"] — общие тайминги стадий всей пачки.
+        """
+        if not questions:
+            return []
+        concurrency = concurrency or settings.answer_batch_concurrency
+
+        with trace_request("batch") as trace:
+            with trace.stage("normalize"):
+                normalized = [normalize_question(q) for q in questions]
+                unique = list(dict.fromkeys(normalized))
+
+            with trace.stage("embed"):
+                step = settings.answer_batch_embed_size
+                vectors: List[List[float]] = []
+                for i in range(0, len(unique), step):
+                    vectors.extend(self.emb_client.embed_batch(unique[i: i + step]))
+                vector_by_question = dict(zip(unique, vectors))
+
+            with trace.stage("cache"):
+                # версию базы сверяем один раз на пачку, дальше — только матрица кэша
+                kb_version = self._kb_version()
+                cached = self._cache_lookup_batch(questions, [vector_by_question[n] for n in normalized], kb_version)
+                to_answer = list(dict.fromkeys(
+                    norm for norm, hit in zip(normalized, cached) if hit is None
+                ))
+
+            with trace.stage("route"):
+                categories: List[str | None] = [None] * len(to_answer)
+                if self.router is not None:
+                    routes = self.router.route_batch([vector_by_question[q] for q in to_answer])
+                    categories = [r.category for r in routes]
+                    for category in categories:
+                        record_route(category)
+            with trace.stage("search"):
+                docs_batch = self.retrieve_batch_by_vectors(
+                    [vector_by_question[q] for q in to_answer], to_answer, categories
+                )
+            matches = [self._faq_match(docs) for docs in docs_batch]
+            with trace.stage("context"):
+                contexts = [
+                    self.build_context(docs) if match is None else []
+                    for docs, match in zip(docs_batch, matches)
+                ]
+
+            def generate(question: str, context: List[Dict[str, Any]]) -> Tuple[str, str | None]:
+                try:
+                    return self.llm_client.generate_answer(
+                        question=question,
+                        context_chunks=context,
+                        temperature=temperature,
+                    ), None
+                except Exception as e:
+                    return "", f"{type(e).__name__}: {e}"
+
+            with trace.stage("llm"):
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rag-batch-llm") as pool:
+                    # copy_context — чтобы токены из потоков попали в трассу пачки
+                    futures = {
+                        i: pool.submit(contextvars.copy_context().run, generate, q, context)
+                        for i, (q, context, match) in enumerate(zip(to_answer, contexts, matches))
+                        if match is None
+                    }
+                    answers = [
+                        futures[i].result() if i in futures else (matches[i].answer, None)
+                        for i in range(len(to_answer))
+                    ]
+
+            answered: Dict[str, Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]], str | None, str | None]] = {}
+            for norm, docs, context, (answer, error), category in zip(
+                to_answer, docs_batch, contexts, answers, categories
+            ):
+                answered[norm] = (answer, docs, context, error, category)
+            match_by_question = dict(zip(to_answer, matches))
+
+            results: List[Dict[str, Any]] = []
+            stored = set()
+            for question, norm, hit in zip(questions, normalized, cached):
+                if hit is not None:
+                    results.append(hit)
+                    continue
+                answer, docs, context, error, category = answered[norm]
+                if match_by_question[norm] is not None:
+                    results.append(
+                        self._extractive_result(question, norm, docs, match_by_question[norm], category)
+                    )
+                    continue
+                result = self._build_result(question, norm, answer, docs, context, category)
+                if error is not None:
+                    result["error"] = error
+                elif norm not in stored:
+                    self._cache_store(vector_by_question[norm], result, kb_version)
+                    stored.add(norm)
+                results.append(result)
+
+            errors = sum(1 for r in results if "error" in r)
+            timings = trace.finish(
+                "error" if errors else "ok",
+                questions=len(questions),
+                generated=len(to_answer),
+                errors=errors,
+            )
+            for result in results:
+                result["timings"] = timings
+            return results
+
+    async def aanswer_question(
+        self,
+        question: str,
+        temperature: float = 0.1,
+        timeout: float | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Асинхронный полный цикл RAG.
+
+        timeout — лимит на весь запрос в секундах (по умолчанию settings.request_timeout_s,
+        0 — без лимита). При превышении бросается asyncio.TimeoutError,
+        а незавершённые запросы к бэкендам отменяются.
+        Отмена внешней задачи (task.cancel()) также прерывает запрос.
+        """
+        if timeout is None:
+            timeout = settings.request_timeout_s
+        with trace_request("async_answer") as trace:
+            try:
+                result = await asyncio.wait_for(
+                    self._aanswer_question(question, temperature, trace),
+                    timeout=timeout or None,
+                )
+            except asyncio.TimeoutError:
+                trace.finish("timeout", question=question)
+                raise
+            except Exception:
+                trace.finish("error", question=question)
+                raise
+            result["timings"] = trace.finish(self._outcome(result), question=question)
+            return result
+
+    async def _aanswer_question(self, question: str, temperature: float, trace: RequestTrace) -> Dict[str, Any]:
+        with trace.stage("normalize"):
+            normalized_question = normalize_question(question)
+        with trace.stage("embed"):
+            query_vector = await self.emb_client.aembed_text(normalized_question)
+
+        with trace.stage("cache"):
+            kb_version = await self._akb_version()
+            cached = self._cache_lookup(question, query_vector, kb_version)
+        if cached is not None:
+            return cached
+
+        with trace.stage("route"):
+            category = self.route(query_vector)
+        with trace.stage("search"):
+            docs = await self.aretrieve_by_vector(query_vector, normalized_question, category)
+
+        match = self._faq_match(docs)
+        if match is not None:
+            return self._extractive_result(question, normalized_question, docs, match, category)
+
+        with trace.stage("context"):
+            context = self.build_context(docs)
+        with trace.stage("llm"):
+            answer = await self.llm_client.agenerate_answer(
+                question=normalized_question,
+                context_chunks=context,
+                temperature=temperature,
+            )
+        self._observe_llm(trace.timings["llm_s"])
+        result = self._build_result(question, normalized_question, answer, docs, context, category)
+        self._cache_store(query_vector, result, kb_version)
+        return result
 
-        # 4. Возвращаем всё, что нужно UI
+    @staticmethod
+    def _build_result(
+        question: str,
+        normalized_question: str,
+        answer: str,
+        docs: List[Dict[str, Any]],
+        context: List[Dict[str, Any]],
+        routed_category: str | None = None,
+    ) -> Dict[str, Any]:
         return {
             "answer": answer,
             "question": question,
             "normalized_question": normalized_question,
             "documents": docs,  # 🔹 для совместимости со Streamlit
             "docs": docs,
+            # то, что реально ушло в промпт
+            "context": context,
+            "context_tokens": sum(estimate_tokens(c["text"]) for c in context),
+            # категория, по которой фильтровался поиск (None — без фильтра)
+            "routed_category": routed_category,
+            "cache_hit": False,
+            # ответ взят из FAQ как есть, без LLM (см. faq_fastpath.py)
+            "extractive": False,
         }
 
 
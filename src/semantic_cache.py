@@ -0,0 +1,134 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Семантический кэш ответов.
+
+    Хранит нормализованные векторы вопросов в предвыделенной матрице
+    (max_size x dim). Поиск — одно матрично-векторное произведение:
+    если косинусная близость к сохранённому вопросу >= threshold,
+    возвращается сохранённый ответ.
+
+    Вытеснение: записи старше ttl_s не находятся и переиспользуются первыми,
+    при заполнении вытесняется давно не использованная запись (LRU).
+    При смене версии базы знаний (kb_version) кэш полностью сбрасывается.
+    lookup и store получают версию, которую запрос видел в начале: ответ,
+    собранный по старой базе, не сохраняется после sync_version на новую
+    (его мог начать считать запрос до ingest), а запрос со старой версией
+    не получает записи новой.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_size: int = 1000, ttl_s: float = 3600.0) -> None:
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+
+        self._lock = threading.Lock()
+        self._matrix: np.ndarray | None = None  # размерность узнаём по первому вектору
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_size
+        self._created = np.zeros(max_size, dtype=np.float64)
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._valid = np.zeros(max_size, dtype=bool)
+        self.kb_version: str | None = None
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    def _live_mask(self, now: float) -> np.ndarray:
+        return self._valid & (now - self._created <= self.ttl_s)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = [None] * self.max_size
+            self._valid[:] = False
+
+    def sync_version(self, kb_version: str | None) -> None:
+        """
+        Сбрасывает кэш, если версия базы знаний изменилась.
+        """
+        with self._lock:
+            if kb_version == self.kb_version:
+                return
+            self.kb_version = kb_version
+            self._entries = [None] * self.max_size
+            self._valid[:] = False
+
+    def lookup(self, vector: List[float], kb_version: str | None) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает {"entry": ..., "similarity": ...} для ближайшего
+        сохранённого вопроса или None, если он дальше порога
+        или kb_version уже не текущая версия кэша.
+        """
+        return self.lookup_batch([vector], kb_version)[0]
+
+    def lookup_batch(
+        self, vectors: List[List[float]], kb_version: str | None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        lookup для пачки вопросов: одно матричное произведение (Q x dim) на матрицу кэша.
+        """
+        with self._lock:
+            now = time.monotonic()
+            live = self._live_mask(now)
+            if self._matrix is None or kb_version != self.kb_version or not live.any():
+                self.misses += len(vectors)
+                return [None] * len(vectors)
+
+            queries = np.stack([self._normalize(v) for v in vectors])
+            sims = np.where(live, queries @ self._matrix.T, -np.inf)
+            best = np.argmax(sims, axis=1)
+            hits: List[Optional[Dict[str, Any]]] = []
+            for row, slot in zip(sims, best.tolist()):
+                if row[slot] < self.threshold:
+                    self.misses += 1
+                    hits.append(None)
+                    continue
+                self._last_used[slot] = now
+                self.hits += 1
+                hits.append({"entry": self._entries[slot], "similarity": float(row[slot])})
+            return hits
+
+    def store(self, vector: List[float], entry: Dict[str, Any], kb_version: str | None) -> None:
+        """
+        Сохраняет ответ, собранный по базе версии kb_version;
+        если кэш с тех пор перешёл на другую версию, запись отбрасывается.
+        """
+        with self._lock:
+            if kb_version != self.kb_version:
+                return
+            vec = self._normalize(vector)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, vec.shape[0]), dtype=np.float32)
+
+            now = time.monotonic()
+            free = np.flatnonzero(~self._live_mask(now))
+            if free.size:
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._matrix[slot] = vec
+            self._entries[slot] = entry
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._valid[slot] = True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": int(self._live_mask(time.monotonic()).sum()),
+                "kb_version": self.kb_version,
+            }
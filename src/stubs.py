@@ -0,0 +1,241 @@
+"""
+Локальные заглушки бэкендов (эмбеддинги, LLM, векторная БД).
+
+Работают без сети и API-ключей, детерминированы и умеют имитировать
+задержку ответа. Используются в бенчмарках и для воспроизводимых прогонов.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from .local_vector_index import LocalVectorIndex
+from .metrics import record_tokens
+from .text_utils import estimate_tokens
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class StubEmbeddingsClient:
+    """
+    Эмбеддинги "hashed bag-of-words": каждый токен хэшируется в одну
+    из vector_size координат со знаком ±1, вектор нормализуется.
+    Похожие по словам тексты получают близкие векторы.
+    """
+
+    def __init__(self, vector_size: int = 1536, latency_s: float = 0.0) -> None:
+        self.vector_size = vector_size
+        self.latency_s = latency_s
+        self.model = f"stub-hash-bow-{vector_size}"
+        self.dimensions: int | None = None
+        self.requests = 0
+
+    def _embed_one(self, text: str) -> List[float]:
+        vec = np.zeros(self.vector_size, dtype=np.float32)
+        for token in _TOKEN_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self.vector_size] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = float(np.linalg.norm(vec))
+        if norm > 0:
+            vec /= norm
+        return vec.tolist()
+
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    @staticmethod
+    def _record_usage(texts: List[str]) -> None:
+        record_tokens("embedding", SimpleNamespace(prompt_tokens=sum(estimate_tokens(t) for t in texts)))
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        self._record_usage(texts)
+        return [self._embed_one(t) for t in texts]
+
+    async def aembed_text(self, text: str) -> List[float]:
+        return (await self.aembed_batch([text]))[0]
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        self._record_usage(texts)
+        return [self._embed_one(t) for t in texts]
+
+
+class StubLLMClient:
+    """
+    "LLM", который собирает ответ по шаблону из первого документа контекста.
+    """
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.latency_s = latency_s
+        self.model = "stub-echo"
+
+    @staticmethod
+    def _render(question: str, context_chunks: List[Dict[str, Any]]) -> str:
+        if not context_chunks:
+            return "I don't know. Please contact IT Support."
+        top = context_chunks[0]
+        title = (top.get("metadata") or {}).get("title", "")
+        return f"Answer to: {question}\nBased on: {title}\n\n{top['text'][:300]}"
+
+    @staticmethod
+    def _record_usage(question: str, context_chunks: List[Dict[str, Any]], answer: str) -> None:
+        # оценка вместо response.usage, чтобы тайминги заглушек были похожи на настоящие
+        prompt = question + "".join(c["text"] for c in context_chunks)
+        record_tokens(
+            "llm",
+            SimpleNamespace(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(answer)),
+        )
+
+    def generate_answer(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        temperature: float = 0.1,
+        max_tokens: int = 512,
+    ) -> str:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        answer = self._render(question, context_chunks)
+        self._record_usage(question, context_chunks, answer)
+        return answer
+
+    def generate_answer_stream(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        temperature: float = 0.1,
+        max_tokens: int = 512,
+    ) -> Iterator[str]:
+        """
+        Отдаёт ответ по словам; latency_s делится между "токенами".
+        """
+        answer = self._render(question, context_chunks)
+        tokens = re.findall(r"\S+\s*", answer)
+        delay = self.latency_s / max(len(tokens), 1)
+        for token in tokens:
+            if delay:
+                time.sleep(delay)
+            yield token
+        self._record_usage(question, context_chunks, answer)
+
+    async def agenerate_answer(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        temperature: float = 0.1,
+        max_tokens: int = 512,
+    ) -> str:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        answer = self._render(question, context_chunks)
+        self._record_usage(question, context_chunks, answer)
+        return answer
+
+
+class StubVectorDBClient(LocalVectorIndex):
+    """
+    Векторная "БД" в памяти (LocalVectorIndex без диска) с имитацией сетевой задержки.
+    kb_version — счётчик изменений: растёт при любой записи в индекс,
+    чтобы семантический кэш сбрасывался так же, как после ingest в Qdrant.
+    """
+
+    def __init__(self, vector_size: int = 1536, latency_s: float = 0.0) -> None:
+        super().__init__(index_dir=None, vector_size=vector_size)
+        self.latency_s = latency_s
+        self._version = 0
+
+    def get_kb_version(self) -> str | None:
+        return str(self._version)
+
+    def upsert_points(
+        self,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        super().upsert_points(ids, vectors, payloads)
+        self._version += 1
+
+    def delete_points(self, ids: List[str]) -> None:
+        # delete_points_except удаляет через этот же метод
+        super().delete_points(ids)
+        self._version += 1
+
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        super().set_payload(ids, payload)
+        self._version += 1
+
+    def set_kb_version(self, kb_version: str) -> None:
+        super().set_kb_version(kb_version)
+        self._version += 1
+
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return super().search(query_vector, limit, with_payload, with_vectors)
+
+    def search_with_category(
+        self,
+        query_vector: List[float],
+        category: str | None,
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return super().search_with_category(query_vector, category, limit, with_payload, with_vectors)
+
+    async def asearch(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return LocalVectorIndex.search(self, query_vector, limit, with_payload, with_vectors)
+
+    async def asearch_with_category(
+        self,
+        query_vector: List[float],
+        category: str | None,
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return LocalVectorIndex.search_with_category(
+            self, query_vector, category, limit, with_payload, with_vectors
+        )
+
+    def search_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int = 5,
+        with_payload: bool = True,
+        categories: List[str | None] | None = None,
+        with_vectors: bool = False,
+    ):
+        # один "сетевой" запрос на всю пачку, как query_batch_points
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return super().search_batch(query_vectors, limit, with_payload, categories, with_vectors)
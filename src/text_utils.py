@@ -1,38 +1,32 @@
 # src/text_utils.py
-from typing import Dict
+import threading
 
+from .typo_normalizer import TypoNormalizer, build_normalizer
 
-COMMON_TYPO_MAP: Dict[str, str] = {
-    # printers
-    "preinter": "printer",
-    "preinters": "printers",
-    "prnter": "printer",
-    "prnters": "printers",
 
-    # wifi
-    "wfi": "wifi",
-    "wi fi": "wifi",
-
-    # vpn
-    "vnp": "vpn",
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка числа токенов (~4 символа на токен для английского текста).
+    Достаточно для нарезки батчей и бюджетов, без зависимости от токенизатора.
+    """
+    return max(1, (len(text) + 3) // 4)
 
-    # email
-    "eamil": "email",
-    "maill": "mail",
 
-    # password
-    "passwrod": "password",
-    "pasword": "password",
-}
+_normalizer: TypoNormalizer | None = None
+# сборка с SymSpell читает весь chunks.jsonl: сессии Streamlit не должны строить его параллельно
+_normalizer_lock = threading.Lock()
 
 
 def normalize_question(text: str) -> str:
     """
     Простейшая нормализация вопроса:
     - приведение к lower
-    - замена частых опечаток доменных слов
+    - замена частых опечаток доменных слов (по целым словам, за один проход;
+      словарь и SymSpell — см. typo_normalizer.py)
     """
-    q = text.lower()
-    for typo, correct in COMMON_TYPO_MAP.items():
-        q = q.replace(typo, correct)
-    return q
+    global _normalizer
+    if _normalizer is None:
+        with _normalizer_lock:
+            if _normalizer is None:
+                _normalizer = build_normalizer()
+    return _normalizer.normalize(text)
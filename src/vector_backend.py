@@ -0,0 +1,198 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Sequence, Set, Tuple
+
+# поле payload с ID запуска ingest, который последним записал или подтвердил точку:
+# точки без текущего ID — устаревшие (delete_points_except)
+INGEST_RUN_KEY = "ingest_run"
+
+
+@dataclass
+class ScoredHit:
+    """
+    Результат поиска локальных бэкендов.
+    Повторяет поля qdrant ScoredPoint, которыми пользуется пайплайн.
+    """
+    id: str
+    score: float
+    payload: Dict[str, Any] = field(default_factory=dict)
+    # у локальных бэкендов — строка np.ndarray (без дорогого tolist())
+    vector: Sequence[float] | None = None
+
+
+class VectorBackend(ABC):
+    """
+    Интерфейс векторного хранилища, которым пользуются ingest,
+    RAGPipeline и eval-скрипты.
+
+    Реализации:
+    - VectorDBClient — Qdrant (vector_db_client.py);
+    - LocalVectorIndex — NumPy-матрица в памяти / mmap (local_vector_index.py).
+
+    Результаты поиска — объекты с полями id, score, payload
+    (и vector, если запрошен with_vectors=True).
+    Асинхронные методы по умолчанию вызывают синхронные
+    (для локальных бэкендов поиск занимает доли миллисекунды).
+    """
+
+    vector_size: int
+
+    @abstractmethod
+    def create_collection_if_not_exists(self) -> None:
+        ...
+
+    @abstractmethod
+    def upsert_points(
+        self,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        ...
+
+    @abstractmethod
+    def search_with_category(
+        self,
+        query_vector: List[float],
+        category: str | None,
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        ...
+
+    @abstractmethod
+    def existing_point_ids(self, ids: List[str]) -> Set[str]:
+        """
+        Какие из переданных ID уже есть в коллекции.
+        """
+        ...
+
+    @abstractmethod
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        """
+        Дописывает поля payload в существующие точки (векторы не трогаются).
+        """
+        ...
+
+    @abstractmethod
+    def delete_points(self, ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def delete_points_except(self, key: str, value: str) -> int:
+        """
+        Удаляет точки, у которых payload[key] != value (или поля нет);
+        возвращает число удалённых.
+        """
+        ...
+
+    @abstractmethod
+    def get_kb_version(self) -> str | None:
+        ...
+
+    @abstractmethod
+    def set_kb_version(self, kb_version: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_centroids(self) -> Dict[str, List[float]]:
+        """
+        Центроиды категорий (CategoryRouter); {} — не посчитаны.
+        Хранятся отдельно от метаданных коллекции: те приходят с каждым
+        get_collection (в том числе при проверке kb_version).
+        """
+        ...
+
+    @abstractmethod
+    def set_centroids(self, centroids: Dict[str, List[float]]) -> None:
+        """
+        Заменяет все сохранённые центроиды.
+        """
+        ...
+
+    @abstractmethod
+    def scroll_vectors(
+        self,
+        batch_size: int = 1024,
+        payload_keys: List[str] | None = None,
+    ) -> Iterator[Tuple[List[List[float]], List[Dict[str, Any]]]]:
+        """
+        Все векторы коллекции пачками: (векторы, payload'ы);
+        payload_keys — какие поля payload вернуть (None — все).
+        """
+        ...
+
+    def search_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int = 5,
+        with_payload: bool = True,
+        categories: List[str | None] | None = None,
+        with_vectors: bool = False,
+    ) -> List[List[Any]]:
+        """
+        Поиск для пачки запросов (categories[i] — фильтр для запроса i или None).
+        По умолчанию — цикл по search_with_category; бэкенды переопределяют
+        его одним запросом / одним умножением матриц.
+        """
+        categories = categories or [None] * len(query_vectors)
+        return [
+            self.search_with_category(
+                query_vector=vector,
+                category=category,
+                limit=limit,
+                with_payload=with_payload,
+                with_vectors=with_vectors,
+            )
+            for vector, category in zip(query_vectors, categories)
+        ]
+
+    def flush(self) -> None:
+        """
+        Сохраняет изменения на диск (для бэкендов с отложенной записью).
+        """
+        return None
+
+    async def asearch(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        return self.search(
+            query_vector=query_vector,
+            limit=limit,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+        )
+
+    async def asearch_with_category(
+        self,
+        query_vector: List[float],
+        category: str | None,
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        return self.search_with_category(
+            query_vector=query_vector,
+            category=category,
+            limit=limit,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+        )
+
+    async def aget_kb_version(self) -> str | None:
+        return self.get_kb_version()
@@ -1,15 +1,86 @@
-from typing import List, Dict, Any
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Iterator, Set, Tuple
 
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models as qm
 
+from .clients import get_async_qdrant_client, get_qdrant_client
 from .config import settings
+from .local_vector_index import LocalVectorIndex
+from .vector_backend import INGEST_RUN_KEY, VectorBackend
 
 
-class VectorDBClient:
+@dataclass
+class CollectionLayout:
+    """
+    Раскладка коллекции Qdrant: HNSW, квантизация, хранение векторов
+    и payload-индексы. По умолчанию — из Settings (QDRANT_HNSW_*, QDRANT_QUANTIZATION*, ...).
+
+    quantization:
+    - "none"   — только float32-векторы;
+    - "int8"   — скалярная квантизация (в 4 раза меньше памяти);
+    - "binary" — бинарная (в 32 раза меньше, имеет смысл для больших размерностей).
+    При квантизации поиск идёт по сжатым векторам с oversampling,
+    а кандидаты пересчитываются по исходным (rescore).
+    """
+    hnsw_m: int = field(default_factory=lambda: settings.qdrant_hnsw_m)
+    hnsw_ef_construct: int = field(default_factory=lambda: settings.qdrant_hnsw_ef_construct)
+    search_ef: int = field(default_factory=lambda: settings.qdrant_search_ef)
+    quantization: str = field(default_factory=lambda: settings.qdrant_quantization.lower())
+    oversampling: float = field(default_factory=lambda: settings.qdrant_quantization_oversampling)
+    rescore: bool = field(default_factory=lambda: settings.qdrant_quantization_rescore)
+    on_disk: bool = field(default_factory=lambda: settings.qdrant_on_disk_vectors)
+    payload_indexes: List[str] = field(
+        default_factory=lambda: [f.strip() for f in settings.qdrant_payload_indexes.split(",") if f.strip()]
+    )
+
+    def __post_init__(self) -> None:
+        if self.quantization not in ("none", "int8", "binary"):
+            raise ValueError(f"Unknown quantization '{self.quantization}', expected 'none', 'int8' or 'binary'")
+
+    def vectors_config(self, vector_size: int, distance: qm.Distance) -> qm.VectorParams:
+        return qm.VectorParams(size=vector_size, distance=distance, on_disk=self.on_disk)
+
+    def hnsw_config(self) -> qm.HnswConfigDiff:
+        return qm.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self) -> qm.ScalarQuantization | qm.BinaryQuantization | None:
+        # сжатые векторы всегда в RAM: по ним идёт обход графа
+        if self.quantization == "int8":
+            return qm.ScalarQuantization(
+                scalar=qm.ScalarQuantizationConfig(type=qm.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return qm.BinaryQuantization(binary=qm.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self) -> qm.SearchParams | None:
+        quantization = None
+        if self.quantization != "none":
+            quantization = qm.QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        if not self.search_ef and quantization is None:
+            return None
+        return qm.SearchParams(hnsw_ef=self.search_ef or None, quantization=quantization)
+
+    def estimate_memory(self, points: int, vector_size: int) -> Dict[str, int]:
+        """
+        Грубая оценка (байты): float32-векторы, сжатые векторы
+        и связи нулевого уровня HNSW (2 * m соседей по 4 байта на точку).
+        """
+        raw = points * vector_size * 4
+        quantized = {"none": 0, "int8": points * vector_size, "binary": points * ((vector_size + 7) // 8)}
+        graph = points * self.hnsw_m * 2 * 4
+        return {
+            "ram_bytes": (0 if self.on_disk else raw) + quantized[self.quantization] + graph,
+            "disk_bytes": raw + quantized[self.quantization] + graph,
+        }
+
+
+class VectorDBClient(VectorBackend):
     """
     Обёртка над Qdrant:
-    - создание коллекции;
+    - создание коллекции (раскладка — CollectionLayout);
     - добавление точек;
     - поиск.
     """
@@ -18,15 +89,24 @@ class VectorDBClient:
                  host: str | None = None,
                  port: int | None = None,
                  collection_name: str | None = None,
-                 vector_size: int = 1536,
-                 distance: qm.Distance = qm.Distance.COSINE):
+                 vector_size: int | None = None,
+                 distance: qm.Distance = qm.Distance.COSINE,
+                 layout: CollectionLayout | None = None):
         self.host = host or settings.qdrant_host
         self.port = port or settings.qdrant_port
         self.collection_name = collection_name or settings.collection_name
-        self.vector_size = vector_size
+        self.vector_size = vector_size or settings.embedding_dim
         self.distance = distance
+        self.layout = layout or CollectionLayout()
+        self.search_params = self.layout.search_params()
 
-        self.client = QdrantClient(host=self.host, port=self.port)
+        # клиенты общие на процесс (clients.py): REST или gRPC по QDRANT_PREFER_GRPC
+        self.client = get_qdrant_client(self.host, self.port)
+
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        # асинхронный клиент для aretrieve/aanswer_question — свой на каждый event loop
+        return get_async_qdrant_client(self.host, self.port)
 
     def create_collection_if_not_exists(self) -> None:
         collections = self.client.get_collections().collections
@@ -34,17 +114,52 @@ class VectorDBClient:
 
         if self.collection_name in existing_names:
             print(f"Collection '{self.collection_name}' already exists")
-            return
+            size = self.client.get_collection(self.collection_name).config.params.vectors.size
+            if size != self.vector_size:
+                raise ValueError(
+                    f"Collection '{self.collection_name}' has dim {size}, expected {self.vector_size} "
+                    "(EMBEDDING_DIM changed: use another QDRANT_COLLECTION or recreate it)"
+                )
+        else:
+            print(f"Creating collection '{self.collection_name}'...")
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=self.layout.vectors_config(self.vector_size, self.distance),
+                hnsw_config=self.layout.hnsw_config(),
+                quantization_config=self.layout.quantization_config(),
+            )
+            print("Collection created.")
+        self.ensure_payload_indexes()
+
+    def ensure_payload_indexes(self) -> None:
+        """
+        Создаёт недостающие keyword-индексы по полям layout.payload_indexes
+        (category, source_id) и по INGEST_RUN_KEY (удаление устаревших точек):
+        без них фильтр проверяется перебором точек.
+        """
+        info = self.client.get_collection(self.collection_name)
+        existing = set((info.payload_schema or {}).keys())
+        for field_name in dict.fromkeys([*self.layout.payload_indexes, INGEST_RUN_KEY]):
+            if field_name not in existing:
+                print(f"Creating payload index on '{field_name}'")
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=qm.PayloadSchemaType.KEYWORD,
+                )
 
-        print(f"Creating collection '{self.collection_name}'...")
-        self.client.recreate_collection(
+    def apply_layout(self) -> None:
+        """
+        Приводит существующую коллекцию к self.layout на месте: Qdrant
+        перестраивает граф и сжатые векторы в фоне, точки не переливаются.
+        """
+        self.client.update_collection(
             collection_name=self.collection_name,
-            vectors_config=qm.VectorParams(
-                size=self.vector_size,
-                distance=self.distance,
-            ),
+            vectors_config={"": qm.VectorParamsDiff(on_disk=self.layout.on_disk)},
+            hnsw_config=self.layout.hnsw_config(),
+            quantization_config=self.layout.quantization_config() or qm.Disabled.DISABLED,
         )
-        print("Collection created.")
+        self.ensure_payload_indexes()
 
     def upsert_points(
         self,
@@ -64,11 +179,137 @@ class VectorDBClient:
             ),
         )
 
+    def existing_point_ids(self, ids: List[str]) -> Set[str]:
+        """
+        Какие из ids уже есть в коллекции (без payload и векторов).
+        Используется для инкрементального ingest.
+        """
+        records = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=False,
+            with_vectors=False,
+        )
+        return {str(r.id) for r in records}
+
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        self.client.set_payload(
+            collection_name=self.collection_name,
+            payload=payload,
+            points=qm.PointIdsList(points=ids),
+        )
+
+    def get_kb_version(self) -> str | None:
+        """
+        Версия содержимого базы знаний (metadata коллекции "kb_version",
+        её обновляет ingest). None — коллекции нет или версия не задана.
+        Метаданные коллекции есть с Qdrant / qdrant-client 1.16.
+        """
+        try:
+            info = self.client.get_collection(self.collection_name)
+        except Exception:
+            return None
+        return (info.config.metadata or {}).get("kb_version")
+
+    async def aget_kb_version(self) -> str | None:
+        try:
+            info = await self.async_client.get_collection(self.collection_name)
+        except Exception:
+            return None
+        return (info.config.metadata or {}).get("kb_version")
+
+    def set_kb_version(self, kb_version: str) -> None:
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            metadata={"kb_version": kb_version},
+        )
+
+    @property
+    def centroids_collection(self) -> str:
+        return f"{self.collection_name}_centroids"
+
+    def get_centroids(self) -> Dict[str, List[float]]:
+        """
+        Центроиды — точки маленькой коллекции "<collection>_centroids"
+        (по одной на категорию, категория в payload).
+        """
+        try:
+            records, _ = self.client.scroll(
+                collection_name=self.centroids_collection,
+                limit=10_000,
+                with_payload=["category"],
+                with_vectors=True,
+            )
+        except Exception:
+            return {}
+        return {r.payload["category"]: list(r.vector) for r in sorted(records, key=lambda r: r.payload["category"])}
+
+    def set_centroids(self, centroids: Dict[str, List[float]]) -> None:
+        # категории могли исчезнуть: коллекцию пересоздаём целиком (точек — десятки)
+        if self.client.collection_exists(self.centroids_collection):
+            self.client.delete_collection(self.centroids_collection)
+        self.client.create_collection(
+            collection_name=self.centroids_collection,
+            vectors_config=qm.VectorParams(size=self.vector_size, distance=self.distance),
+        )
+        if centroids:
+            self.client.upsert(
+                collection_name=self.centroids_collection,
+                points=qm.Batch(
+                    ids=[str(uuid.uuid5(uuid.NAMESPACE_URL, category)) for category in centroids],
+                    vectors=list(centroids.values()),
+                    payloads=[{"category": category} for category in centroids],
+                ),
+            )
+        # прежние версии хранили центроиды в метаданных коллекции: убираем ключ (null удаляет его)
+        self.client.update_collection(collection_name=self.collection_name, metadata={"category_centroids": None})
+
+    def scroll_vectors(
+        self,
+        batch_size: int = 1024,
+        payload_keys: List[str] | None = None,
+    ) -> Iterator[Tuple[List[List[float]], List[Dict[str, Any]]]]:
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=payload_keys if payload_keys is not None else True,
+                with_vectors=True,
+            )
+            if records:
+                yield [list(r.vector) for r in records], [r.payload or {} for r in records]
+            if offset is None:
+                break
+
+    def delete_points(self, ids: List[str], batch_size: int = 1024) -> None:
+        """
+        Удаляет точки по ID (батчами, чтобы не упираться в размер запроса).
+        """
+        for i in range(0, len(ids), batch_size):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=qm.PointIdsList(points=ids[i: i + batch_size]),
+            )
+
+    def delete_points_except(self, key: str, value: str) -> int:
+        """
+        Удаляет точки с payload[key] != value одним запросом с фильтром:
+        список ID на стороне клиента не нужен.
+        """
+        stale = qm.Filter(must_not=[qm.FieldCondition(key=key, match=qm.MatchValue(value=value))])
+        count = self.client.count(collection_name=self.collection_name, count_filter=stale, exact=True).count
+        if count:
+            self.client.delete(collection_name=self.collection_name, points_selector=qm.FilterSelector(filter=stale))
+        return count
+
     def search(
         self,
         query_vector: List[float],
         limit: int = 5,
         with_payload: bool = True,
+        with_vectors: bool = False,
     ):
         """
         Выполняет поиск ближайших векторов.
@@ -84,6 +325,8 @@ class VectorDBClient:
             collection_name=self.collection_name,
             query=query_vector,
             with_payload=with_payload,
+            with_vectors=with_vectors,
+            search_params=self.search_params,
             limit=limit,
         )
 
@@ -96,6 +339,7 @@ class VectorDBClient:
         category: str | None,
         limit: int = 5,
         with_payload: bool = True,
+        with_vectors: bool = False,
     ):
         """
         Поиск с фильтром по категории (payload['category']).
@@ -108,9 +352,59 @@ class VectorDBClient:
                 query_vector=query_vector,
                 limit=limit,
                 with_payload=with_payload,
+                with_vectors=with_vectors,
             )
 
-        qfilter = qm.Filter(
+        res = self.client.query_points(
+            collection_name=self.collection_name,
+            query=query_vector,
+            query_filter=self._category_filter(category),
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            search_params=self.search_params,
+            limit=limit,
+        )
+
+        return res.points
+
+    def search_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int = 5,
+        with_payload: bool = True,
+        categories: List[str | None] | None = None,
+        with_vectors: bool = False,
+        requests_per_call: int = 256,
+    ):
+        """
+        Пачка запросов через query_batch_points: один HTTP-запрос
+        на requests_per_call векторов вместо запроса на каждый.
+        """
+        categories = categories or [None] * len(query_vectors)
+        requests = [
+            qm.QueryRequest(
+                query=vector,
+                filter=self._category_filter(category) if category else None,
+                params=self.search_params,
+                with_payload=with_payload,
+                with_vector=with_vectors,
+                limit=limit,
+            )
+            for vector, category in zip(query_vectors, categories)
+        ]
+
+        results = []
+        for i in range(0, len(requests), requests_per_call):
+            responses = self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests[i: i + requests_per_call],
+            )
+            results.extend(res.points for res in responses)
+        return results
+
+    @staticmethod
+    def _category_filter(category: str) -> qm.Filter:
+        return qm.Filter(
             must=[
                 qm.FieldCondition(
                     key="category",
@@ -119,15 +413,77 @@ class VectorDBClient:
             ]
         )
 
-        res = self.client.query_points(
+    async def asearch(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        """
+        Асинхронный вариант search() (AsyncQdrantClient).
+        """
+        res = await self.async_client.query_points(
             collection_name=self.collection_name,
             query=query_vector,
-            query_filter=qfilter,
             with_payload=with_payload,
+            with_vectors=with_vectors,
+            search_params=self.search_params,
             limit=limit,
         )
+        return res.points
 
+    async def asearch_with_category(
+        self,
+        query_vector: List[float],
+        category: str | None,
+        limit: int = 5,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+    ):
+        """
+        Асинхронный вариант search_with_category().
+        """
+        if not category:
+            return await self.asearch(
+                query_vector=query_vector,
+                limit=limit,
+                with_payload=with_payload,
+                with_vectors=with_vectors,
+            )
+
+        res = await self.async_client.query_points(
+            collection_name=self.collection_name,
+            query=query_vector,
+            query_filter=self._category_filter(category),
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            search_params=self.search_params,
+            limit=limit,
+        )
         return res.points
 
 
+def create_vector_client(vector_size: int | None = None, backend: str | None = None) -> VectorBackend:
+    """
+    Создаёт векторное хранилище по settings.vector_backend:
+    - "qdrant" — Qdrant (по умолчанию);
+    - "local"  — LocalVectorIndex в settings.local_index_dir/<collection>;
+    - "memory" — StubVectorDBClient: тот же индекс только в памяти
+      (с задержкой settings.stub_search_latency_s).
+    Размерность — vector_size или settings.embedding_dim.
+    """
+    vector_size = vector_size or settings.embedding_dim
+    backend = (backend or settings.vector_backend).lower()
+    if backend == "qdrant":
+        return VectorDBClient(vector_size=vector_size)
+    if backend == "local":
+        index_dir = f"{settings.local_index_dir}/{settings.collection_name}"
+        print(f"[VectorDB] Using local NumPy index: {index_dir}")
+        return LocalVectorIndex(index_dir=index_dir, vector_size=vector_size)
+    if backend == "memory":
+        from .stubs import StubVectorDBClient
 
+        print("[VectorDB] Using in-memory vector index.")
+        return StubVectorDBClient(vector_size=vector_size, latency_s=settings.stub_search_latency_s)
+    raise ValueError(f"Unknown VECTOR_BACKEND '{backend}', expected 'qdrant', 'local' or 'memory'")
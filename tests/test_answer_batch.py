@@ -0,0 +1,63 @@
+import pytest
+
+from src.config import settings
+from src.rag_pipeline import RAGPipeline
+from src.stubs import StubEmbeddingsClient, StubLLMClient, StubVectorDBClient
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_mode", "dense")
+    monkeypatch.setattr(settings, "category_router_enabled", False)
+    monkeypatch.setattr(settings, "faq_fastpath_enabled", False)
+    monkeypatch.setattr(settings, "semantic_cache_enabled", True)
+    monkeypatch.setattr(settings, "semantic_cache_version_check_s", 0)
+
+    emb_client = StubEmbeddingsClient(vector_size=32)
+    vec_client = StubVectorDBClient(vector_size=32)
+    texts = ["Reconnect the VPN client", "Forget the Wi-Fi network and join again", "Replace the toner"]
+    vec_client.upsert_points(
+        ids=[f"p{i}" for i in range(len(texts))],
+        vectors=emb_client.embed_batch(texts),
+        payloads=[{"text": t, "source_id": f"doc_{i}"} for i, t in enumerate(texts)],
+    )
+    return RAGPipeline(top_k=2, emb_client=emb_client, vec_client=vec_client, llm_client=StubLLMClient())
+
+
+def _count_calls(monkeypatch, obj, name):
+    calls = []
+    method = getattr(obj, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(kwargs)
+        return method(*args, **kwargs)
+
+    monkeypatch.setattr(obj, name, wrapper)
+    return calls
+
+
+def test_batch_uses_one_search_and_one_version_check(pipeline, monkeypatch):
+    searches = _count_calls(monkeypatch, pipeline.vec_client, "search_batch")
+    versions = _count_calls(monkeypatch, pipeline.vec_client, "get_kb_version")
+
+    results = pipeline.answer_batch(["vpn drops", "wifi is slow", "VPN drops", "printer toner"])
+
+    assert len(searches) == 1
+    assert len(versions) == 1
+    assert [r["question"] for r in results] == ["vpn drops", "wifi is slow", "VPN drops", "printer toner"]
+    assert all(r["answer"] and not r["cache_hit"] for r in results)
+
+
+def test_batch_serves_cached_questions_and_searches_the_rest(pipeline, monkeypatch):
+    pipeline.answer_question("vpn drops")
+    searches = _count_calls(monkeypatch, pipeline.vec_client, "search_batch")
+
+    results = pipeline.answer_batch(["wifi is slow", "vpn drops", "printer toner"])
+
+    assert [r["cache_hit"] for r in results] == [False, True, False]
+    assert results[1]["question"] == "vpn drops"
+    [search] = searches
+    assert len(search["query_vectors"]) == 2  # в поиск ушли только вопросы без ответа в кэше
+
+    again = pipeline.answer_batch(["wifi is slow", "printer toner"])
+    assert [r["cache_hit"] for r in again] == [True, True]
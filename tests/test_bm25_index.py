@@ -0,0 +1,65 @@
+import pytest
+
+from src.bm25_index import BM25Index, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("Ticket INC-00123 on vpn.company.com") == [
+        "ticket", "inc-00123", "inc", "00123", "vpn.company.com", "vpn", "company", "com",
+    ]
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("How do I connect to the corp-wifi?") == ["connect", "corp-wifi", "corp", "wifi"]
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build([
+        {"text": "Incident INC-00123: VPN drops every hour"},
+        {"text": "Connect to corp-wifi with your domain account"},
+        {"text": "VPN client settings for vpn.company.com"},
+        {"text": "Printer on floor 3 is offline"},
+    ])
+
+
+def test_exact_identifier_ranks_first(index):
+    assert index.search("status of inc-00123")[0][0] == 0
+    assert index.search("vpn.company.com")[0][0] == 2
+
+
+def test_identifier_parts_match_plain_words(index):
+    assert index.search("wifi")[0][0] == 1
+
+
+def test_search_orders_by_score_and_respects_limit(index):
+    hits = index.search("vpn", limit=5)
+    assert {doc for doc, _ in hits} == {0, 2}
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert len(index.search("vpn", limit=1)) == 1
+
+
+def test_no_match_returns_empty(index):
+    assert index.search("keyboard") == []
+    assert index.search("the and of") == []
+
+
+def test_save_load_round_trip(index, tmp_path):
+    index.save(tmp_path / "bm25.npz", tmp_path / "bm25.json")
+    loaded = BM25Index.load(tmp_path / "bm25.npz", tmp_path / "bm25.json")
+    assert loaded.search("corp-wifi account") == index.search("corp-wifi account")
+
+
+def test_tokenize_handles_cyrillic_words_and_identifiers():
+    assert tokenize("Не работает VPN-клиент на ноутбуке") == [
+        "не", "работает", "vpn-клиент", "vpn", "клиент", "на", "ноутбуке",
+    ]
+    assert tokenize("snake_case, «кавычки»") == ["snake_case", "snake", "case", "кавычки"]
+
+
+def test_cyrillic_query_finds_cyrillic_document():
+    index = BM25Index.build([
+        {"text": "VPN drops every hour"},
+        {"text": "Принтер на третьем этаже не печатает"},
+    ])
+    assert index.search("принтер не печатает")[0][0] == 1
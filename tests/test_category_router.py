@@ -0,0 +1,40 @@
+from src.category_router import CategoryRouter, build_centroids
+from src.local_vector_index import LocalVectorIndex
+
+
+def _index(tmp_path, categories):
+    index = LocalVectorIndex(tmp_path / "idx", vector_size=2)
+    vectors = {"network": [1.0, 0.0], "printers": [0.0, 1.0]}
+    index.upsert_points(
+        [f"p{i}" for i in range(len(categories))],
+        [vectors[c] for c in categories],
+        [{"category": c} for c in categories],
+    )
+    return index
+
+
+def test_no_stored_centroids_disables_routing(tmp_path):
+    index = _index(tmp_path, ["network", "printers"])
+    assert index.get_centroids() == {}
+    assert CategoryRouter.from_backend(index) is None
+
+
+def test_single_category_or_wrong_dim_disables_routing(tmp_path):
+    index = _index(tmp_path, ["network", "network"])
+    build_centroids(index)
+    assert CategoryRouter.from_backend(index) is None
+
+    index.set_centroids({"network": [1.0, 0.0, 0.0], "printers": [0.0, 1.0, 0.0]})
+    assert CategoryRouter.from_backend(index) is None
+
+
+def test_centroids_survive_reload_and_stay_out_of_meta(tmp_path):
+    index = _index(tmp_path, ["network", "printers", "network"])
+    build_centroids(index)
+
+    reloaded = LocalVectorIndex(tmp_path / "idx", vector_size=2)
+    router = CategoryRouter.from_backend(reloaded)
+
+    assert router is not None and router.categories == ["network", "printers"]
+    assert router.route([0.9, 0.1]).category == "network"
+    assert "centroids" not in (tmp_path / "idx" / "meta.json").read_text()
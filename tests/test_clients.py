@@ -0,0 +1,35 @@
+import asyncio
+
+from src import clients
+
+
+def test_async_clients_are_per_loop_and_closed_by_aclose():
+    async def use_and_close():
+        client = clients.get_async_http_client()
+        assert clients.get_async_http_client() is client
+        await clients.aclose_async_clients()
+        return client
+
+    first = asyncio.run(use_and_close())
+    second = asyncio.run(use_and_close())
+
+    assert first is not second
+    assert first.is_closed and second.is_closed
+    assert not clients._async_http_clients
+
+
+def test_aclose_keeps_clients_of_other_loops(monkeypatch):
+    monkeypatch.setattr(clients, "_async_http_clients", {})
+
+    async def open_client():
+        return clients.get_async_http_client()
+
+    loop = asyncio.new_event_loop()
+    try:
+        other = loop.run_until_complete(open_client())
+        asyncio.run(clients.aclose_async_clients())
+        assert not other.is_closed
+        loop.run_until_complete(clients.aclose_async_clients())
+        assert other.is_closed
+    finally:
+        loop.close()
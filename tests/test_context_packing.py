@@ -0,0 +1,79 @@
+from src.context_packing import merge_adjacent, pack_context
+from src.text_utils import estimate_tokens
+
+
+def _doc(source_id: str, idx: int, text: str, score: float):
+    return {
+        "text": text,
+        "score": score,
+        "metadata": {"source_id": source_id, "chunk_id": f"{source_id}_chunk_{idx:03d}"},
+    }
+
+
+def test_adjacent_chunks_merge_without_repeated_header_and_overlap():
+    docs = [
+        _doc("ticket_1", 1, "Ticket: VPN drops\nthe tunnel restarts. Fix: update client", 0.7),
+        _doc("ticket_1", 0, "Ticket: VPN drops\nUser reports that the tunnel restarts.", 0.9),
+    ]
+
+    [merged] = merge_adjacent(docs)
+
+    assert merged["text"] == "Ticket: VPN drops\nUser reports that the tunnel restarts. Fix: update client"
+    assert merged["score"] == 0.9
+    assert merged["metadata"]["merged_chunk_ids"] == ["ticket_1_chunk_000", "ticket_1_chunk_001"]
+
+
+def test_non_adjacent_chunks_and_other_sources_stay_separate():
+    docs = [_doc("a", 0, "alpha one", 0.9), _doc("a", 2, "alpha three", 0.8), _doc("b", 1, "beta two", 0.7)]
+    assert merge_adjacent(docs) == docs
+
+
+def test_pack_drops_near_duplicates_and_contained_text():
+    base = "restart the vpn client and sign in again with your domain account"
+    docs = [
+        _doc("a", 0, base, 0.9),
+        _doc("b", 0, base + " please", 0.8),
+        _doc("c", 0, "sign in again", 0.7),
+        _doc("d", 0, "printer on floor three is offline", 0.6),
+    ]
+
+    packed = pack_context(docs, max_tokens=0, dedup_threshold=0.8)
+
+    assert [d["metadata"]["source_id"] for d in packed] == ["a", "d"]
+
+
+def test_pack_respects_budget_and_skips_to_shorter_docs():
+    docs = [
+        _doc("a", 0, "x" * 400, 0.9),
+        _doc("b", 0, "y" * 400, 0.8),
+        _doc("c", 0, "z" * 40, 0.7),
+    ]
+
+    packed = pack_context(docs, max_tokens=120)
+
+    assert [d["metadata"]["source_id"] for d in packed] == ["a", "c"]
+    assert sum(estimate_tokens(d["text"]) for d in packed) <= 120
+
+
+def test_first_doc_over_budget_is_truncated_by_lines():
+    text = "\n".join(f"line {i} " + "w" * 30 for i in range(20))
+    [packed] = pack_context([_doc("a", 0, text, 1.0)], max_tokens=30)
+
+    assert text.startswith(packed["text"])
+    assert 0 < estimate_tokens(packed["text"]) <= 30
+
+
+def test_single_oversized_line_is_cut_by_words():
+    text = " ".join(f"word{i}" for i in range(200))
+    [packed] = pack_context([_doc("a", 0, text, 1.0)], max_tokens=20)
+
+    assert text.startswith(packed["text"])
+    assert 0 < estimate_tokens(packed["text"]) <= 20
+    assert packed["text"].split()[-1] in text.split()  # последнее слово не разрезано
+
+
+def test_oversized_line_without_spaces_is_cut_by_characters():
+    [packed] = pack_context([_doc("a", 0, "x" * 500, 1.0)], max_tokens=10)
+
+    assert packed["text"] == "x" * len(packed["text"])
+    assert 0 < estimate_tokens(packed["text"]) <= 10
@@ -0,0 +1,50 @@
+import numpy as np
+
+from src.diversify import mmr_select
+
+
+def test_pure_relevance_keeps_score_order():
+    relevance = [0.2, 0.9, 0.5, 0.7]
+    vectors = [[1.0, 0.0]] * 4
+    assert mmr_select(relevance, vectors, k=3, lambda_mult=1.0) == [1, 3, 2]
+
+
+def test_near_duplicate_is_pushed_down():
+    relevance = [0.9, 0.89, 0.6]
+    vectors = [[1.0, 0.0], [0.999, 0.01], [0.0, 1.0]]
+    assert mmr_select(relevance, vectors, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_per_source_cap():
+    relevance = [0.95, 0.94, 0.93, 0.92, 0.5, 0.4]
+    rng = np.random.default_rng(0)
+    vectors = list(rng.standard_normal((6, 8)))
+    groups = ["doc_a", "doc_a", "doc_a", "doc_a", "doc_b", "doc_c"]
+
+    selected = mmr_select(relevance, vectors, k=4, lambda_mult=1.0, groups=groups, max_per_group=2)
+
+    assert selected == [0, 1, 4, 5]
+
+
+def test_cap_is_relaxed_when_no_other_source_is_left():
+    relevance = [0.9, 0.8, 0.7, 0.6]
+    vectors = [[1.0, 0.0]] * 4
+    groups = ["doc_a", "doc_a", "doc_a", "doc_b"]
+
+    selected = mmr_select(relevance, vectors, k=4, lambda_mult=1.0, groups=groups, max_per_group=1)
+
+    assert selected == [0, 3, 1, 2]
+
+
+def test_candidates_without_vectors_and_groups():
+    # найденные только BM25 (vector None) и без source_id не штрафуются и не ограничиваются
+    relevance = [1.0, 0.9, 0.8]
+    vectors = [[1.0, 0.0], None, [1.0, 0.0]]
+    groups = ["doc_a", None, None]
+
+    assert mmr_select(relevance, vectors, k=3, lambda_mult=0.5, groups=groups, max_per_group=1) == [0, 1, 2]
+
+
+def test_k_larger_than_candidates_and_empty_input():
+    assert sorted(mmr_select([0.3, 0.1], [[1.0], [1.0]], k=10)) == [0, 1]
+    assert mmr_select([], [], k=5) == []
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from src.embedding_batcher import BatchingEmbeddings
+
+
+class RecordingEmbeddings:
+    """
+    Клиент эмбеддингов, который запоминает пачки и может задержать ответ до release.
+    """
+
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.batches: List[List[str]] = []
+        self.sent = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.model = "recording"
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(list(texts))
+        self.sent.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("embeddings API is down")
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(client, **kwargs):
+        batcher = BatchingEmbeddings(client, **{"window_ms": 20, "max_items": 64, "concurrency": 2} | kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.close()
+
+
+def test_texts_within_window_share_one_request_and_identical_texts_merge(make_batcher):
+    client = RecordingEmbeddings()
+    batcher = make_batcher(client)
+    texts = ["vpn", "wifi", "vpn", "printer", "wifi", "vpn"]
+
+    futures = [batcher.submit(t) for t in texts]
+
+    assert [f.result(5) for f in futures] == [[float(len(t))] for t in texts]
+    assert client.batches == [["vpn", "wifi", "printer"]]
+    assert batcher.stats["merged"] == 3
+
+
+def test_threaded_callers_get_their_own_vectors(make_batcher):
+    client = RecordingEmbeddings()
+    batcher = make_batcher(client)
+    texts = [f"question {i % 7}" * (i % 3 + 1) for i in range(50)]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        vectors = list(pool.map(batcher.embed_text, texts))
+
+    assert vectors == [[float(len(t))] for t in texts]
+    assert len(client.batches) < len(texts)
+
+
+def test_text_in_flight_is_merged_with_sent_batch(make_batcher):
+    client = RecordingEmbeddings()
+    client.release.clear()
+    batcher = make_batcher(client, window_ms=0)
+
+    first = batcher.submit("vpn")
+    assert client.sent.wait(5)  # пачка ушла в API и ждёт ответа
+    second = batcher.submit("vpn")
+    client.release.set()
+
+    assert second is first
+    assert second.result(5) == [3.0]
+    assert client.batches == [["vpn"]]
+
+
+def test_max_items_splits_batches(make_batcher):
+    client = RecordingEmbeddings()
+    batcher = make_batcher(client, window_ms=50, max_items=2)
+
+    futures = [batcher.submit(f"text {i}") for i in range(5)]
+
+    assert [f.result(5) for f in futures] == [[6.0]] * 5
+    assert all(len(batch) <= 2 for batch in client.batches)
+
+
+def test_error_reaches_every_waiter_and_batcher_recovers(make_batcher):
+    client = RecordingEmbeddings(fail=True)
+    batcher = make_batcher(client)
+
+    futures = [batcher.submit(t) for t in ("vpn", "wifi", "vpn")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="API is down"):
+            future.result(5)
+
+    # упавший текст не остаётся "в полёте": следующий вызов уходит в API заново
+    client.fail = False
+    assert batcher.embed_text("vpn") == [3.0]
+
+
+def test_async_callers_are_batched_too(make_batcher):
+    client = RecordingEmbeddings()
+    batcher = make_batcher(client)
+
+    async def ask():
+        return await asyncio.gather(*(batcher.aembed_text(t) for t in ("a", "bb", "a")))
+
+    assert asyncio.run(ask()) == [[1.0], [2.0], [1.0]]
+    assert client.batches == [["a", "bb"]]
+
+
+def test_close_flushes_queue_and_rejects_new_texts():
+    client = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(client, window_ms=10_000, max_items=64, concurrency=1)
+
+    future = batcher.submit("vpn")
+    batcher.close()
+
+    assert future.result(5) == [3.0]
+    with pytest.raises(RuntimeError):
+        batcher.submit("wifi")
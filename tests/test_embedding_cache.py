@@ -0,0 +1,60 @@
+from typing import List
+
+import pytest
+
+from src.embedding_cache import EmbeddingCache
+from src.embeddings_client import EmbeddingsClient
+
+
+def _vector(text: str) -> List[float]:
+    return [float(len(text)), float(ord(text[0]))]
+
+
+def test_get_many_keeps_order_and_reports_misses():
+    cache = EmbeddingCache(path=None)
+    keys = [EmbeddingCache.make_key("m", None, t) for t in ("a", "bb", "ccc")]
+    cache.put_many([(keys[0], "m", None, [1.0]), (keys[2], "m", None, [3.0])])
+
+    assert cache.get_many([keys[2], keys[1], keys[0], keys[2]]) == [[3.0], None, [1.0], [3.0]]
+    assert cache.misses == 1
+
+
+def test_disk_cache_survives_restart_and_separates_dimensions(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = EmbeddingCache.make_key("m", 256, "text")
+    EmbeddingCache(path=path).put_many([(key, "m", 256, [0.5, 0.25])])
+
+    cache = EmbeddingCache(path=path)
+    assert cache.get_many([key, EmbeddingCache.make_key("m", 512, "text")]) == [[0.5, 0.25], None]
+    assert cache.disk_hits == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    client = EmbeddingsClient(cache=EmbeddingCache(path=None))
+    client.requests = []
+
+    def request(texts: List[str]) -> List[List[float]]:
+        client.requests.append(list(texts))
+        return [_vector(t) for t in texts]
+
+    monkeypatch.setattr(client, "_request_embeddings", request)
+    return client
+
+
+def test_embed_batch_requests_only_unique_misses_in_order(client):
+    client.embed_batch(["bb"])
+    client.requests.clear()
+
+    texts = ["a", "bb", "a", "ccc"]
+    assert client.embed_batch(texts) == [_vector(t) for t in texts]
+    assert client.requests == [["a", "ccc"]]
+
+
+def test_embed_batch_full_hit_skips_api(client):
+    client.embed_batch(["a", "bb"])
+    client.requests.clear()
+
+    assert client.embed_batch(["bb", "a"]) == [_vector("bb"), _vector("a")]
+    assert client.requests == []
@@ -0,0 +1,63 @@
+import pytest
+
+from src.faq_fastpath import match_faq, pick_threshold, threshold_table
+
+
+def _faq(source_id: str, score: float, answer: str = "Open Settings > Wi-Fi."):
+    return {"score": score, "metadata": {"source_type": "faq", "source_id": source_id, "answer": answer}}
+
+
+def _ticket(source_id: str, score: float):
+    return {"score": score, "metadata": {"source_type": "ticket", "source_id": source_id}}
+
+
+def test_match_when_score_and_margin_pass():
+    match = match_faq([_faq("faq_wifi_001", 0.91), _ticket("ticket_7", 0.80)], min_score=0.85, min_margin=0.05)
+
+    assert match is not None
+    assert match.source_id == "faq_wifi_001"
+    assert match.answer == "Open Settings > Wi-Fi."
+    assert match.margin == pytest.approx(0.11)
+
+
+@pytest.mark.parametrize(
+    "docs",
+    [
+        [_faq("faq_wifi_001", 0.84), _ticket("ticket_7", 0.50)],   # ниже порога
+        [_faq("faq_wifi_001", 0.91), _ticket("ticket_7", 0.88)],   # отрыв мал
+        [_ticket("ticket_7", 0.95), _faq("faq_wifi_001", 0.91)],   # первым не FAQ
+        [_faq("faq_wifi_001", 0.95, answer="")],                   # нет сохранённого ответа
+        [],
+    ],
+)
+def test_no_match(docs):
+    assert match_faq(docs, min_score=0.85, min_margin=0.05) is None
+
+
+def test_chunks_of_the_same_faq_do_not_count_as_competitors():
+    docs = [_faq("faq_wifi_001", 0.90), _faq("faq_wifi_001", 0.89), _ticket("ticket_7", 0.70)]
+    assert match_faq(docs, min_score=0.85, min_margin=0.05).margin == pytest.approx(0.20)
+
+
+def test_hybrid_mode_uses_dense_score_not_rrf():
+    docs = [
+        _faq("faq_wifi_001", 0.03) | {"scores": {"dense": 0.92, "lexical": 7.1}},
+        _ticket("ticket_7", 0.02) | {"scores": {"dense": None, "lexical": 9.0}},
+    ]
+    match = match_faq(docs, min_score=0.85, min_margin=0.05)
+    assert match is not None and match.score == pytest.approx(0.92)
+
+
+def test_calibration_picks_lowest_threshold_with_required_precision():
+    rows = [
+        {"score": 0.95, "margin": 0.2, "correct": True},
+        {"score": 0.90, "margin": 0.2, "correct": True},
+        {"score": 0.80, "margin": 0.2, "correct": False},
+        {"score": 0.70, "margin": 0.01, "correct": False},  # отсекается по отрыву
+        {"score": None, "margin": None, "correct": False},
+    ]
+    table = threshold_table(rows, min_margin=0.05)
+
+    assert [row["threshold"] for row in table] == [0.80, 0.90, 0.95]
+    assert pick_threshold(table, min_precision=1.0) == 0.90
+    assert pick_threshold(table, min_precision=0.6) == 0.80
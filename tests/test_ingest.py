@@ -0,0 +1,46 @@
+from src.ingest import content_hash, point_id_for_chunk, skip_unchanged
+from src.local_vector_index import LocalVectorIndex
+from src.vector_backend import INGEST_RUN_KEY
+
+
+def _chunk(chunk_id: str, text: str, category: str = "vpn"):
+    return {"id": chunk_id, "text": text, "metadata": {"category": category, "source_id": chunk_id}}
+
+
+def _item(chunk, run_id: str = "run"):
+    return {"point_id": point_id_for_chunk(chunk), "content_hash": content_hash(chunk), "chunk": chunk, "run_id": run_id}
+
+
+def test_point_id_is_deterministic_and_depends_on_content():
+    chunk = _chunk("faq_vpn_001_chunk_000", "Restart the VPN client.")
+    same = _chunk("faq_vpn_001_chunk_000", "Restart the VPN client.")
+
+    assert point_id_for_chunk(chunk) == point_id_for_chunk(same)
+    assert point_id_for_chunk(chunk) == point_id_for_chunk(chunk, content_hash(chunk))
+    assert point_id_for_chunk(chunk) != point_id_for_chunk(_chunk("faq_vpn_001_chunk_000", "Reinstall it."))
+    assert point_id_for_chunk(chunk) != point_id_for_chunk(_chunk("faq_vpn_001_chunk_000", "Restart the VPN client.", "wifi"))
+    assert point_id_for_chunk(chunk) != point_id_for_chunk(_chunk("faq_vpn_002_chunk_000", "Restart the VPN client."))
+
+
+def test_skip_unchanged_yields_only_new_points_and_tags_the_rest():
+    index = LocalVectorIndex(index_dir=None, vector_size=2)
+    old = [_chunk(f"c{i}", f"text {i}") for i in range(5)]
+    index.upsert_points(
+        ids=[point_id_for_chunk(c) for c in old],
+        vectors=[[1.0, 0.0]] * len(old),
+        payloads=[{INGEST_RUN_KEY: "previous"} for _ in old],
+    )
+
+    edited = _chunk("c1", "text 1, edited")
+    added = _chunk("c9", "text 9")
+    items = [_item(c, "current") for c in (old[0], edited, old[2], added)]
+
+    pending = list(skip_unchanged(items, index, "current", page_size=2))
+
+    assert [item["chunk"]["id"] for item in pending] == ["c1", "c9"]
+    runs = dict(zip(index._ids, (payload.get(INGEST_RUN_KEY) for payload in index._payloads)))
+    assert runs[point_id_for_chunk(old[0])] == "current"
+    assert runs[point_id_for_chunk(old[2])] == "current"
+    # не встретившиеся в файле точки остаются с прежним run_id — их удалит delete_points_except
+    assert runs[point_id_for_chunk(old[1])] == "previous"
+    assert index.delete_points_except(INGEST_RUN_KEY, "current") == 3
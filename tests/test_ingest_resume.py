@@ -0,0 +1,122 @@
+import json
+from typing import List
+
+import pytest
+
+from src import ingest
+from src.config import settings
+from src.local_vector_index import LocalVectorIndex
+from src.stubs import StubEmbeddingsClient
+from src.vector_backend import INGEST_RUN_KEY
+
+VECTOR_SIZE = 16
+CHUNKS = 10
+
+
+class FailingEmbeddings(StubEmbeddingsClient):
+    """
+    Заглушка, которая падает на запросе номер fail_on (с 1) и запоминает тексты.
+    """
+
+    def __init__(self, fail_on: int | None = None) -> None:
+        super().__init__(vector_size=VECTOR_SIZE)
+        self.fail_on = fail_on
+        self.texts: List[str] = []
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.fail_on is not None and self.requests + 1 == self.fail_on:
+            raise RuntimeError("embeddings API is down")
+        self.texts.extend(texts)
+        return super().embed_batch(texts)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    chunks_path = tmp_path / "chunks.jsonl"
+    with chunks_path.open("w", encoding="utf-8") as f:
+        for i in range(CHUNKS):
+            chunk = {
+                "id": f"doc_{i}_chunk_000",
+                "text": f"chunk number {i} about vpn and wifi",
+                "metadata": {"category": "vpn" if i % 2 else "wifi", "source_id": f"doc_{i}"},
+            }
+            f.write(json.dumps(chunk) + "\n")
+
+    monkeypatch.setattr(ingest, "CHUNKS_PATH", chunks_path)
+    monkeypatch.setattr(ingest, "CHECKPOINT_PATH", tmp_path / "checkpoint.json")
+    # по два чанка в батче, checkpoint после каждого
+    monkeypatch.setattr(settings, "ingest_batch_max_items", 2)
+    monkeypatch.setattr(settings, "ingest_checkpoint_every", 1)
+    # индекс на диске: каждый запуск открывает его заново, как отдельный процесс
+    index_dir = tmp_path / "index"
+    monkeypatch.setattr(ingest, "create_vector_client", lambda: LocalVectorIndex(index_dir, VECTOR_SIZE))
+    return tmp_path, index_dir
+
+
+def _run(monkeypatch, emb_client, **kwargs) -> None:
+    monkeypatch.setattr(ingest, "create_embeddings_client", lambda: emb_client)
+    ingest.ingest(concurrency=1, **kwargs)
+
+
+def test_resume_after_failure_embeds_only_the_rest(workspace, monkeypatch):
+    tmp_path, index_dir = workspace
+
+    failing = FailingEmbeddings(fail_on=3)
+    with pytest.raises(RuntimeError):
+        _run(monkeypatch, failing)
+
+    checkpoint = json.loads((tmp_path / "checkpoint.json").read_text())
+    assert checkpoint["batch"] == 2
+    assert checkpoint["last_chunk_id"] == "doc_3_chunk_000"
+    assert len(LocalVectorIndex(index_dir, VECTOR_SIZE)._ids) == 4
+
+    resumed = FailingEmbeddings()
+    _run(monkeypatch, resumed, resume=True)
+
+    assert resumed.texts == [f"chunk number {i} about vpn and wifi" for i in range(4, CHUNKS)]
+    index = LocalVectorIndex(index_dir, VECTOR_SIZE)
+    # точки первого запуска не приняты за устаревшие: у них тот же run_id
+    assert len(index._ids) == CHUNKS
+    assert {payload[INGEST_RUN_KEY] for payload in index._payloads} == {checkpoint["run_id"]}
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+def test_resume_ignores_checkpoint_of_another_file(workspace, monkeypatch):
+    tmp_path, index_dir = workspace
+
+    with pytest.raises(RuntimeError):
+        _run(monkeypatch, FailingEmbeddings(fail_on=2))
+    with ingest.CHUNKS_PATH.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "extra_chunk_000", "text": "extra", "metadata": {"category": "vpn"}}) + "\n")
+
+    resumed = FailingEmbeddings()
+    _run(monkeypatch, resumed, resume=True)
+
+    assert len(resumed.texts) == CHUNKS + 1
+    assert len(LocalVectorIndex(index_dir, VECTOR_SIZE)._ids) == CHUNKS + 1
+
+
+def test_delta_ingest_embeds_changes_and_removes_stale_points(workspace, monkeypatch):
+    tmp_path, index_dir = workspace
+    _run(monkeypatch, FailingEmbeddings())
+    before = LocalVectorIndex(index_dir, VECTOR_SIZE)
+    old_ids = set(before._ids)
+    assert before.get_centroids()
+
+    # doc_0 удалён из базы знаний, doc_1 изменён, остальные без изменений
+    lines = ingest.CHUNKS_PATH.read_text(encoding="utf-8").splitlines()[1:]
+    edited = json.loads(lines[0]) | {"text": "chunk number 1 rewritten"}
+    lines[0] = json.dumps(edited)
+    ingest.CHUNKS_PATH.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    delta = FailingEmbeddings()
+    _run(monkeypatch, delta, delta=True)
+
+    assert delta.texts == ["chunk number 1 rewritten"]
+    index = LocalVectorIndex(index_dir, VECTOR_SIZE)
+    assert len(index._ids) == CHUNKS - 1
+    assert {p["source_id"] for p in index._payloads} == {f"doc_{i}" for i in range(1, CHUNKS)}
+    assert "chunk number 1 rewritten" in {p["text"] for p in index._payloads}
+    # старая версия doc_1 и точка doc_0 удалены, неизменённые точки остались на месте
+    assert len(old_ids - set(index._ids)) == 2
+    assert len({p[INGEST_RUN_KEY] for p in index._payloads}) == 1
@@ -0,0 +1,126 @@
+import pytest
+
+from src.config import settings
+from src.rag_pipeline import RAGPipeline
+from src.semantic_cache import SemanticCache
+from src.stubs import StubEmbeddingsClient, StubLLMClient, StubVectorDBClient
+
+VPN = [1.0, 0.0, 0.0]
+WIFI = [0.0, 1.0, 0.0]
+
+
+def _cache(kb_version: str = "1") -> SemanticCache:
+    cache = SemanticCache(threshold=0.95, max_size=4, ttl_s=3600)
+    cache.sync_version(kb_version)
+    return cache
+
+
+def test_hit_above_threshold_only():
+    cache = _cache()
+    cache.store(VPN, {"answer": "vpn"}, "1")
+
+    assert cache.lookup([0.99, 0.05, 0.0], "1")["entry"] == {"answer": "vpn"}
+    assert cache.lookup(WIFI, "1") is None
+
+
+def test_version_change_clears_cache():
+    cache = _cache("1")
+    cache.store(VPN, {"answer": "vpn"}, "1")
+
+    cache.sync_version("2")
+
+    assert cache.lookup(VPN, "2") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_answer_computed_under_old_version_is_not_stored():
+    cache = _cache("1")
+    kb_version = cache.kb_version  # запрос начался до ingest
+    cache.sync_version("2")        # другой поток увидел новую версию и сбросил кэш
+
+    cache.store(VPN, {"answer": "stale"}, kb_version)
+
+    assert cache.lookup(VPN, "2") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lookup_with_old_version_misses():
+    cache = _cache("1")
+    cache.sync_version("2")
+    cache.store(VPN, {"answer": "fresh"}, "2")
+
+    assert cache.lookup(VPN, "1") is None
+    assert cache.lookup(VPN, "2")["entry"] == {"answer": "fresh"}
+
+
+def test_lru_eviction_when_full():
+    cache = _cache()
+    vectors = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+    for i, vector in enumerate(vectors):
+        cache.store(vector, {"i": i}, "1")
+    cache.lookup(vectors[0], "1")  # первая запись использована недавно
+
+    cache.store([0.6, 0.8, 0.0, 0.0], {"i": 4}, "1")
+
+    assert cache.lookup(vectors[0], "1")["entry"] == {"i": 0}
+    assert cache.lookup(vectors[1], "1") is None
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_mode", "dense")
+    monkeypatch.setattr(settings, "category_router_enabled", False)
+    monkeypatch.setattr(settings, "faq_fastpath_enabled", False)
+    monkeypatch.setattr(settings, "semantic_cache_enabled", True)
+    monkeypatch.setattr(settings, "semantic_cache_version_check_s", 0)
+
+    emb_client = StubEmbeddingsClient(vector_size=32)
+    vec_client = StubVectorDBClient(vector_size=32)
+    texts = ["Reconnect the VPN client", "Forget the Wi-Fi network and join again"]
+    vec_client.upsert_points(
+        ids=["p0", "p1"],
+        vectors=emb_client.embed_batch(texts),
+        payloads=[{"text": t, "source_id": f"doc_{i}"} for i, t in enumerate(texts)],
+    )
+    return RAGPipeline(top_k=2, emb_client=emb_client, vec_client=vec_client, llm_client=StubLLMClient())
+
+
+def test_pipeline_drops_cached_answers_after_ingest(pipeline):
+    assert pipeline.answer_question("vpn drops")["cache_hit"] is False
+    assert pipeline.answer_question("vpn drops")["cache_hit"] is True
+
+    # ingest меняет базу — версия растёт, старый ответ больше не отдаётся
+    pipeline.vec_client.upsert_points(ids=["p2"], vectors=[[1.0] * 32], payloads=[{"text": "new doc"}])
+
+    assert pipeline.answer_question("vpn drops")["cache_hit"] is False
+    assert pipeline.answer_question("vpn drops")["cache_hit"] is True
+
+
+def test_pipeline_checks_version_at_most_once_per_interval(pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "semantic_cache_version_check_s", 3600)
+    calls = []
+    get_kb_version = pipeline.vec_client.get_kb_version
+    monkeypatch.setattr(pipeline.vec_client, "get_kb_version", lambda: calls.append(1) or get_kb_version())
+
+    for _ in range(3):
+        pipeline.answer_question("vpn drops")
+
+    assert len(calls) == 1
+
+
+def test_stub_backend_version_changes_on_every_mutation():
+    backend = StubVectorDBClient(vector_size=2)
+    versions = [backend.get_kb_version()]
+
+    backend.upsert_points(["a", "b"], [[1.0, 0.0], [0.0, 1.0]], [{"run": "1"}, {"run": "1"}])
+    versions.append(backend.get_kb_version())
+    backend.set_payload(["a"], {"run": "2"})
+    versions.append(backend.get_kb_version())
+    assert backend.delete_points_except("run", "2") == 1
+    versions.append(backend.get_kb_version())
+    backend.delete_points(["a"])
+    versions.append(backend.get_kb_version())
+    backend.set_kb_version("v2")
+    versions.append(backend.get_kb_version())
+
+    assert len(set(versions)) == len(versions)
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import text_utils
+from src.typo_normalizer import SymSpellIndex, TypoNormalizer, load_typo_map, normalize_question_replace
+
+TYPOS = {"wfi": "wifi", "wi fi": "wifi", "vnp": "vpn", "prnter": "printer", "printer": "print device"}
+
+
+def test_replaces_whole_words_only():
+    normalizer = TypoNormalizer(TYPOS)
+    assert normalizer.normalize("Wfi and VNP") == "wifi and vpn"
+    # "vnp" внутри слова и латиница, приклеенная к кириллице, — не отдельные слова
+    assert normalizer.normalize("vnpclient wfiпароль") == "vnpclient wfiпароль"
+    assert normalizer.normalize("wfi, vnp.") == "wifi, vpn."
+
+
+def test_phrase_needs_whitespace_between_words():
+    normalizer = TypoNormalizer(TYPOS)
+    assert normalizer.normalize("my wi  fi is slow") == "my wifi is slow"
+    assert normalizer.normalize("wi-fi") == "wi-fi"
+
+
+def test_replacements_do_not_chain():
+    normalizer = TypoNormalizer(TYPOS)
+    # prnter -> printer, но printer -> print device к результату уже не применяется
+    assert normalizer.normalize("prnter jam") == "printer jam"
+    assert normalize_question_replace("prnter jam", {"prnter": "printer", "printer": "print device"}) != "printer jam"
+
+
+def test_symspell_corrects_unknown_typos_of_known_words():
+    symspell = SymSpellIndex.from_texts(["Reset your password in the portal", "пароль"], max_distance=1, min_length=5)
+    normalizer = TypoNormalizer({}, symspell)
+    assert normalizer.normalize("pasword reset") == "password reset"
+    assert normalizer.normalize("сбросить парол") == "сбросить пароль"
+    # короткие слова и слова с цифрами не трогаем
+    assert normalizer.normalize("pswd v2pn") == "pswd v2pn"
+
+
+def test_symspell_memo_is_bounded():
+    symspell = SymSpellIndex.from_texts(["password printer network"], max_distance=1, min_length=5, memo_size=2)
+    assert [symspell.correct(w) for w in ("pasword", "prnter", "netwrk")] == ["password", "printer", "network"]
+
+    assert list(symspell._memo) == ["prnter", "netwrk"]
+    assert symspell.correct("pasword") == "password"
+
+
+def test_repo_dictionary_loads():
+    typo_map = load_typo_map()
+    assert typo_map["wi fi"] == "wifi"
+    assert all(key == key.lower() for key in typo_map)
+
+
+def test_shared_normalizer_is_built_once_under_concurrency(monkeypatch):
+    builds = []
+
+    def slow_build():
+        builds.append(1)
+        time.sleep(0.05)
+        return TypoNormalizer(TYPOS)
+
+    monkeypatch.setattr(text_utils, "_normalizer", None)
+    monkeypatch.setattr(text_utils, "build_normalizer", slow_build)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(text_utils.normalize_question, ["wfi"] * 8))
+
+    assert results == ["wifi"] * 8
+    assert len(builds) == 1